@@ -14,7 +14,10 @@
 
 import unittest
 import sys
+import tempfile
 from inspect import stack
+from threading import Event, Lock, Thread
+from time import sleep
 from os.path import abspath, dirname, pardir, join
 
 # prevent python from writing *.pyc files / __pycache__ folders
@@ -28,7 +31,7 @@ if path_app not in sys.path:
     sys.path += [path_tests, path_app]
     
 import controller
-from PyQt5.QtWidgets import QApplication
+from PyQt5.QtWidgets import QApplication, QGraphicsPixmapItem
 from autonomous_system.AS_operations import ASCreation
 from graph_generation.graph_dimension import GraphDimensionWindow
 from graph_generation.multiple_nodes import MultipleNodes
@@ -37,6 +40,20 @@ from ip_networks.arp_table import ARPTable
 from ip_networks.configuration import RouterConfiguration
 from ip_networks.routing_table import RoutingTable
 from ip_networks.switching_table import SwitchingTable
+from miscellaneous.fib import FIB
+from miscellaneous.literals import parse_collection
+from miscellaneous.network_functions import toip
+from networks.loader import ProjectLoader
+from networks.network import Network
+from networks.snapshot import Snapshot
+from networks.yaml_stream import read_sections
+from objects.properties import property_classes, SetProperty
+from gis.shapefile_cache import ShapefileCache
+from views.geographical_view import Map
+from NAPALM.napalm_functions import commit_action, NapalmCollector
+from automation.session_manager import SessionManager
+from automation.script_push import ScriptPusher
+from automation.templates import TemplateCache
 # from ip_networks.troubleshooting import Troubleshooting
 
 def start_pyNMS(function):
@@ -75,7 +92,162 @@ class TestObjectCreation(unittest.TestCase):
  
     def test_object_creation(self):
         self.assertEqual(len(self.nk.nodes), 11)
-        self.assertEqual(len(list(self.nk.all_links())), 17)  
+        self.assertEqual(len(list(self.nk.all_links())), 17)
+
+    def test_subtype_index(self):
+        subtypes = {node.subtype for node in self.nk.nodes.values()}
+        self.assertEqual(len(list(self.nk.ftr('node', *subtypes))), 11)
+        plink = next(iter(self.nk.plinks.values()))
+        source = plink.source
+        self.assertIn(plink, dict(self.nk.gftr(source, 'plink', plink.subtype)).values())
+        self.nk.remove_link(plink)
+        self.assertNotIn(plink, self.nk.ftr('plink', plink.subtype))
+        self.assertNotIn(plink, dict(self.nk.gftr(source, 'plink', plink.subtype)).values())
+        self.assertNotIn(plink.interfaceS, self.nk.ftr('interface', 'ethernet interface'))
+
+class TestStageCache(unittest.TestCase):
+
+    @start_pyNMS_and_import_project('test_ospf.xls')
+    def setUp(self):
+        self.stages = tuple(self.nk.stage_inputs)
+        self.nk.run_stages(*self.stages)
+
+    def tearDown(self):
+        self.app.quit()
+
+    def test_stage_cache(self):
+        # nothing changed: all stages are skipped
+        self.assertEqual(self.nk.run_stages(*self.stages), [])
+        # a failure only invalidates the stages that depend on failures
+        self.nk.simulate_failure(*self.nk.plinks.values())
+        self.assertEqual(self.nk.run_stages(*self.stages), [
+                                                 'switching_table_creation',
+                                                 'routing_table_creation',
+                                                 'path_finder'
+                                                 ])
+        # a new node invalidates all stages
+        self.nk.nf(name='new router')
+        self.assertEqual(self.nk.run_stages(*self.stages), list(self.stages))
+
+class TestParallelRouting(unittest.TestCase):
+
+    @start_pyNMS_and_import_project('test_isis.xls')
+    def setUp(self):
+        self.nk.update_AS_topology()
+        self.nk.vc_creation()
+        self.nk.interface_configuration()
+
+    def tearDown(self):
+        self.app.quit()
+
+    def routing_tables(self):
+        self.nk.routing_table_creation()
+        return {
+                router.name: {
+                              subnetwork: set(routes)
+                              for subnetwork, routes in router.rt.items()
+                              }
+                for router in self.nk.ftr('node', 'router')
+                }
+
+    def test_parallel_routing(self):
+        serial_tables = self.routing_tables()
+        self.nk.routing_processes = 2
+        self.assertEqual(self.routing_tables(), serial_tables)
+
+class TestIncrementalSPF(unittest.TestCase):
+
+    @start_pyNMS_and_import_project('test_ospf.xls')
+    def setUp(self):
+        self.nk.update_AS_topology()
+        self.nk.vc_creation()
+        self.nk.interface_configuration()
+        self.nk.routing_table_creation()
+
+    def tearDown(self):
+        self.app.quit()
+
+    def routing_tables(self):
+        return {
+                router.name: {
+                              subnetwork: set(routes)
+                              for subnetwork, routes in router.rt.items()
+                              }
+                for router in self.nk.ftr('node', 'router')
+                }
+                
+    # the routing tables updated incrementally must be the same as the
+    # routing tables computed from scratch
+    def assertIncremental(self):
+        incremental_tables = self.routing_tables()
+        self.nk.routing_table_creation()
+        self.assertEqual(incremental_tables, self.routing_tables())
+
+    def test_incremental_SPF(self):
+        AS ,= self.nk.pnAS.values()
+        for plink in self.nk.plinks.values():
+            self.nk.fail_plink(plink)
+            self.assertIncremental()
+            self.nk.repair_plink(plink)
+            self.assertIncremental()
+            if plink in AS.links:
+                self.nk.set_plink_cost(plink, AS, 1)
+                self.assertIncremental()
+
+class TestFailureSweep(unittest.TestCase):
+
+    @start_pyNMS_and_import_project('test_ospf.xls')
+    def setUp(self):
+        self.nk.update_AS_topology()
+        self.nk.vc_creation()
+        self.nk.interface_configuration()
+        self.nk.switching_table_creation()
+        # the traffics are sent from and to the first interface of their 
+        # source and destination
+        for traffic in self.nk.traffics.values():
+            for end in ('source', 'destination'):
+                node = getattr(traffic, end)
+                _, plink = next(iter(self.nk.graph[node.id]['plink']))
+                setattr(traffic, end + '_IP', plink('ip_address', node))
+
+    def tearDown(self):
+        self.app.quit()
+        
+    def worst_case(self):
+        return {
+                plink.name: (plink.wctrafficSD, plink.wctrafficDS, plink.wcfailure)
+                for plink in self.nk.plinks.values()
+                }
+
+    # the failure sweep must give the same result as failing the physical
+    # links one by one and routing all traffics from scratch
+    def test_failure_sweep(self):
+        for failed_plink in self.nk.plinks.values():
+            self.nk.failed_obj = {failed_plink}
+            self.nk.routing_table_creation()
+            self.nk.path_finder()
+            for plink in self.nk.plinks.values():
+                for dir in ('SD', 'DS'):
+                    curr_traffic = getattr(plink, 'traffic' + dir)
+                    if curr_traffic > getattr(plink, 'wctraffic' + dir):
+                        setattr(plink, 'wctraffic' + dir, curr_traffic)
+                        setattr(plink, 'wcfailure', str(failed_plink))
+        self.nk.failed_obj = set()
+        worst_case = self.worst_case()
+        for plink in self.nk.plinks.values():
+            plink.wctrafficSD = plink.wctrafficDS = 0.
+            plink.wcfailure = None
+        self.nk.plink_dimensioning()
+        self.assertEqual(self.worst_case(), worst_case)
+        self.assertTrue(any(plink.wcfailure for plink in self.nk.plinks.values()))
+        
+    def test_SRLG(self):
+        srlg = tuple(self.nk.plinks.values())[:2]
+        self.nk.plink_dimensioning([srlg])
+        self.assertFalse(self.nk.failed_obj)
+        for plink in self.nk.plinks.values():
+            if plink.wcfailure:
+                self.assertEqual(plink.wcfailure, ', '.join(map(str, srlg)))
 
 # class TestExportImport(unittest.TestCase):
 #     
@@ -114,6 +286,879 @@ class TestObjectCreation(unittest.TestCase):
 #     def test_object_import_xls(self):
 #         self.object_import('xls')
 
+class TestFIB(unittest.TestCase):
+    
+    routes = (
+              ('0.0.0.0', 0),
+              ('10.0.0.0', 8),
+              ('10.1.0.0', 16),
+              ('10.1.2.0', 24),
+              ('10.1.2.128', 25),
+              ('10.1.2.129', 32),
+              ('192.168.0.0', 30)
+              )
+    
+    def setUp(self):
+        self.fib = FIB(
+                       (toip(prefix), length, (prefix, length))
+                       for prefix, length in self.routes
+                       )
+        
+    # the value of an address is the one of the longest prefix that 
+    # contains it
+    def test_longest_prefix_match(self):
+        expected = {
+                    '10.1.2.129': ('10.1.2.129', 32),
+                    '10.1.2.130': ('10.1.2.128', 25),
+                    '10.1.2.1': ('10.1.2.0', 24),
+                    '10.1.3.1': ('10.1.0.0', 16),
+                    '10.2.0.1': ('10.0.0.0', 8),
+                    '192.168.0.3': ('192.168.0.0', 30),
+                    '192.168.0.4': ('0.0.0.0', 0),
+                    '11.0.0.1': ('0.0.0.0', 0)
+                    }
+        self.assertEqual(len(self.fib), len(self.routes))
+        for address, route in expected.items():
+            self.assertEqual(self.fib.lookup(toip(address)), route)
+            
+    def test_no_default_route(self):
+        fib = FIB(((toip('10.0.0.0'), 8, 'A'),))
+        self.assertEqual(fib.lookup(toip('10.255.0.1')), 'A')
+        self.assertIsNone(fib.lookup(toip('11.0.0.1')))
+
+class TestBatchRouting(unittest.TestCase):
+
+    @start_pyNMS_and_import_project('test_ospf.xls')
+    def setUp(self):
+        self.nk.update_AS_topology()
+        self.nk.vc_creation()
+        self.nk.interface_configuration()
+        self.nk.switching_table_creation()
+        for traffic in self.nk.traffics.values():
+            for end in ('source', 'destination'):
+                node = getattr(traffic, end)
+                _, plink = next(iter(self.nk.graph[node.id]['plink']))
+                setattr(traffic, end + '_IP', plink('ip_address', node))
+        self.nk.routing_table_creation()
+
+    def tearDown(self):
+        self.app.quit()
+        
+    def traffic(self):
+        return {
+                (plink.name, dir): round(getattr(plink, 'traffic' + dir), 6)
+                for plink in self.nk.plinks.values()
+                for dir in ('SD', 'DS')
+                }
+        
+    # routing the traffics per destination must give the same paths and
+    # traffic loads as routing them one by one
+    def test_batch_routing(self):
+        self.nk.reset_traffic()
+        paths = {}
+        for traffic in self.nk.traffics.values():
+            path, path_str = self.nk.RFT_path_finder(traffic)
+            paths[traffic] = path
+            self.assertFalse(path_str)
+        traffic = self.traffic()
+        self.nk.path_finder()
+        self.assertEqual(self.traffic(), traffic)
+        for traffic, path in paths.items():
+            self.assertEqual(traffic.path, path)
+            
+    def test_trace(self):
+        traffic = next(iter(self.nk.traffics.values()))
+        _, path_str = self.nk.RFT_path_finder(traffic, trace=True)
+        self.assertTrue(path_str)
+
+class TestHeadless(unittest.TestCase):
+
+    @start_pyNMS_and_import_project('test_isis.xls')
+    def setUp(self):
+        self.headless = Network()
+        ProjectLoader(self.headless).import_file(join(path_tests, 'test_isis.xls'))
+        
+    def tearDown(self):
+        self.app.quit()
+        
+    def routing_tables(self, network):
+        network.run_stages(*network.stage_inputs)
+        return {
+                node.name: {
+                            subnetwork: {(route[0], str(route[-1])) for route in routes}
+                            for subnetwork, routes in node.rt.items()
+                            }
+                for node in network.ftr('node', 'router')
+                }
+        
+    # a network without view computes the same routing tables as the 
+    # network of a project, and its AS have no management window
+    def test_headless_network(self):
+        self.assertEqual(
+                         self.routing_tables(self.headless), 
+                         self.routing_tables(self.nk)
+                         )
+        self.assertTrue(self.headless.pnAS)
+        for AS in self.headless.pnAS.values():
+            self.assertIsNone(AS.management)
+        self.headless.plink_dimensioning()
+
+class TestStartup(unittest.TestCase):
+
+    @start_pyNMS
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        self.app.quit()
+        
+    # the permanent windows are only created when they are first used
+    def test_lazy_windows(self):
+        self.assertNotIn('shortest_path_window', vars(self.ct))
+        window = self.ct.shortest_path_window
+        self.assertIs(self.ct.shortest_path_window, window)
+        widgets = dict(self.ct.startup_report.timings['widget'])
+        self.assertIn('ShortestPathWindow', widgets)
+        self.assertIn('first project', widgets)
+        self.assertTrue(self.ct.startup_report.report())
+
+class TestShapefileCache(unittest.TestCase):
+    
+    shapefile = join(
+                     path_pynms, 
+                     'Shapefiles', 
+                     'World countries (low resolution).shp'
+                     )
+    
+    def polygons(self, cache):
+        return cache.polygons(
+                              self.shapefile, 
+                              'Mercator', 
+                              Map.projection('Mercator'), 
+                              1/1000
+                              )
+    
+    # the projected geometry stored on disk is the one computed on a miss
+    def test_shapefile_cache(self):
+        with tempfile.TemporaryDirectory() as path_cache:
+            points, offsets = self.polygons(ShapefileCache(path_cache))
+            cached_points, cached_offsets = self.polygons(ShapefileCache(path_cache))
+        self.assertEqual(offsets.tolist(), cached_offsets.tolist())
+        # coordinates are stored in single precision
+        self.assertLess(abs(points - cached_points).max(), 1e-6*abs(points).max())
+        self.assertEqual(offsets[-1], len(points))
+
+class TestGeographicalCoordinates(unittest.TestCase):
+    
+    @start_pyNMS_and_import_project('test_flow1.xls')
+    def setUp(self):
+        pass
+        
+    def tearDown(self):
+        self.app.quit()
+        
+    # the bulk conversion gives the same positions as the per-node 
+    # conversion, and the links follow the nodes
+    def test_bulk_coordinates(self):
+        world_map = self.vw.world_map
+        for index, node in enumerate(self.nk.pn['node'].values()):
+            node.longitude, node.latitude = 2 + index, 48 - index
+        self.vw.move_to_geographical_coordinates()
+        for node in self.nk.pn['node'].values():
+            x, y = world_map.to_canvas_coordinates(node.longitude, node.latitude)
+            self.assertAlmostEqual(node.gnode[self.vw].x, x)
+            self.assertAlmostEqual(node.gnode[self.vw].y, y)
+        for plink in self.nk.plinks.values():
+            line = plink.gobject[self.vw].line()
+            self.assertEqual(line.p1(), plink.source.gnode[self.vw].pos())
+            self.assertEqual(line.p2(), plink.destination.gnode[self.vw].pos())
+        self.vw.update_geographical_coordinates(*self.vw.all_gnodes())
+        for index, node in enumerate(self.nk.pn['node'].values()):
+            self.assertAlmostEqual(node.longitude, 2 + index)
+            self.assertAlmostEqual(node.latitude, 48 - index)
+
+class TestForceDirectedLayout(unittest.TestCase):
+    
+    @start_pyNMS_and_import_project('test_flow1.xls')
+    def setUp(self):
+        pass
+        
+    def tearDown(self):
+        self.vw.stop_layout()
+        self.app.quit()
+        
+    # the layout runs in a worker thread, and the view moves the nodes to 
+    # the positions it sends, until the layout is stopped
+    def test_layout_worker(self):
+        for drawing in ('Spring-based layout', 'Fruchterman-Reingold layout'):
+            self.vw.node_selection = set(self.vw.all_gnodes())
+            self.vw.random_layout()
+            gnodes = list(self.vw.all_gnodes())
+            positions = [gnode.pos() for gnode in gnodes]
+            self.vw.start_layout(drawing)
+            for _ in range(1000):
+                self.app.processEvents()
+                if [gnode.pos() for gnode in gnodes] != positions:
+                    break
+                self.vw.layout_worker.wait(1)
+            self.vw.stop_layout()
+            self.assertIsNone(self.vw.layout_worker)
+            self.assertNotEqual([gnode.pos() for gnode in gnodes], positions)
+            for plink in self.nk.plinks.values():
+                line = plink.gobject[self.vw].line()
+                self.assertEqual(line.p1(), plink.source.gnode[self.vw].pos())
+
+    # runs the event loop until the view has applied 'count' more batches
+    def wait_batches(self, count):
+        batches = []
+        self.vw.layout_worker.moved.connect(batches.append)
+        for _ in range(5000):
+            self.app.processEvents()
+            if len(batches) >= count:
+                break
+            self.vw.layout_worker.wait(1)
+        self.assertGreaterEqual(len(batches), count)
+
+    # a node moved by the user while the layout runs keeps its new position
+    # (a single node is never moved by the layout itself)
+    def test_layout_user_move(self):
+        gnode = next(iter(self.vw.all_gnodes()))
+        self.vw.node_selection = {gnode}
+        self.vw.start_layout('Fruchterman-Reingold layout')
+        self.wait_batches(1)
+        gnode.setPos(12345, 6789)
+        self.wait_batches(2)
+        self.assertEqual((gnode.x, gnode.y), (12345, 6789))
+        self.vw.stop_layout()
+
+    # the layout stops when one of its nodes is deleted from the network
+    def test_layout_deleted_node(self):
+        self.vw.node_selection = set(self.vw.all_gnodes())
+        self.vw.start_layout('Fruchterman-Reingold layout')
+        self.wait_batches(1)
+        list(self.nk.remove_node(self.vw.layout_gnodes[0].node))
+        self.vw.refresh_display()
+        self.assertIsNone(self.vw.layout_worker)
+
+class TestLevelOfDetail(unittest.TestCase):
+    
+    @start_pyNMS_and_import_project('test_flow1.xls')
+    def setUp(self):
+        pass
+        
+    def tearDown(self):
+        self.app.quit()
+        
+    # when zoomed out, nodes are points without label, and only one of the
+    # parallel links between two nodes is shown
+    def test_overview(self):
+        plink = next(iter(self.nk.plinks.values()))
+        parallel_plink = self.nk.lf(
+                                    source = plink.source, 
+                                    destination = plink.destination
+                                    )
+        self.vw.refresh_display()
+        gnodes = list(self.vw.all_gnodes())
+        while not self.vw.overview:
+            self.vw.zoom_out()
+        for gnode in gnodes:
+            self.assertFalse(gnode.label.isVisible())
+            self.assertEqual(QGraphicsPixmapItem.pixmap(gnode).width(), self.vw.point_size)
+        self.assertEqual(
+                         plink.gobject[self.vw].isVisible() + 
+                         parallel_plink.gobject[self.vw].isVisible(), 
+                         1
+                         )
+        while self.vw.overview:
+            self.vw.zoom_in()
+        for gnode in gnodes:
+            self.assertTrue(gnode.label.isVisible())
+            self.assertEqual(
+                             QGraphicsPixmapItem.pixmap(gnode).cacheKey(), 
+                             gnode.pixmap.cacheKey()
+                             )
+        self.assertTrue(parallel_plink.gobject[self.vw].isVisible())
+
+    # hiding the subtype of a node in overview mode hides all its links,
+    # including the ones that were aggregated
+    def test_overview_hidden_subtype(self):
+        plink = next(iter(self.nk.plinks.values()))
+        parallel_plink = self.nk.lf(
+                                    source = plink.source,
+                                    destination = plink.destination
+                                    )
+        self.vw.refresh_display()
+        while not self.vw.overview:
+            self.vw.zoom_out()
+        self.vw.per_subtype_display(plink.source.subtype)
+        self.assertFalse(plink.gobject[self.vw].isVisible())
+        self.assertFalse(parallel_plink.gobject[self.vw].isVisible())
+        self.vw.per_subtype_display(plink.source.subtype)
+        self.assertEqual(
+                         plink.gobject[self.vw].isVisible() +
+                         parallel_plink.gobject[self.vw].isVisible(),
+                         1
+                         )
+
+class TestIncrementalRedraw(unittest.TestCase):
+    
+    @start_pyNMS_and_import_project('test_flow1.xls')
+    def setUp(self):
+        pass
+        
+    def tearDown(self):
+        self.app.quit()
+        
+    # the view only redraws the objects created, deleted or modified since
+    # its last refresh
+    def test_dirty_objects(self):
+        self.assertFalse(any(self.nk.dirty.values()))
+        node = self.nk.nf(name='new router')
+        plink = next(iter(self.nk.plinks.values()))
+        self.nk.remove_link(plink)
+        self.assertEqual(self.nk.dirty['added'], {node})
+        self.assertEqual(self.nk.dirty['removed'], {plink})
+        self.vw.refresh_display()
+        self.assertIs(node.gnode[self.vw].scene(), self.vw.scene)
+        self.assertIsNone(plink.gobject[self.vw].scene())
+        self.assertFalse(any(self.nk.dirty.values()))
+        self.vw.refresh_label('router', property_classes['name'])
+        self.nk.nf(name='new router', longitude=2.)
+        node.name = 'renamed router'
+        self.vw.refresh_display()
+        self.assertEqual(node.gnode[self.vw].label.text(), 'renamed router')
+
+# NAPALM driver standing in for get_network_driver: the devices whose 
+# hostname starts with 'slow' never answer in time, and the ones whose 
+# hostname starts with 'down' cannot be reached
+# highest number of calls in flight at once, for the fake devices below
+class InFlight(object):
+    
+    def __init__(self):
+        self.lock = Lock()
+        self.current = self.highest = 0
+        
+    def __enter__(self):
+        with self.lock:
+            self.current += 1
+            self.highest = max(self.highest, self.current)
+            
+    def __exit__(self, *args):
+        with self.lock:
+            self.current -= 1
+    
+# NAPALM driver: the 'slow' devices do not answer until 'release' is set
+class FakeDevice(object):
+    
+    opened = []
+    delay = 0.05
+    calls = InFlight()
+    release = Event()
+    
+    def __init__(self, hostname, username, password, timeout, optional_args):
+        self.hostname = hostname
+        self.committed = False
+        
+    def open(self):
+        if self.hostname.startswith('down'):
+            raise ConnectionError(self.hostname)
+        self.opened.append(self.hostname)
+        
+    def close(self):
+        pass
+        
+    def get_facts(self):
+        with self.calls:
+            if self.hostname.startswith('slow'):
+                self.release.wait(10)
+            else:
+                sleep(self.delay)
+        return {'hostname': self.hostname}
+        
+    def get_config(self):
+        return {'running': 'running', 'candidate': '', 'startup': ''}
+        
+    def compare_config(self):
+        return ''
+        
+    def commit_config(self):
+        self.committed = True
+        
+    def get_users(self):
+        raise NotImplementedError
+
+class TestNapalmCollector(unittest.TestCase):
+    
+    def setUp(self):
+        FakeDevice.opened = []
+        FakeDevice.calls = InFlight()
+        FakeDevice.release = Event()
+        self.network = Network()
+        self.nodes = [
+                      self.network.nf(name='router' + str(i), operating_system='eos')
+                      for i in range(20)
+                      ]
+        self.progress = []
+        self.sessions = SessionManager()
+        self.workers = 10
+        self.collector = NapalmCollector(
+            lambda node: {
+                          'ip_address': node.name,
+                          'username': 'user', 
+                          'password': 'password',
+                          'enable_password': ''
+                          },
+            workers = self.workers,
+            timeout = 0.5,
+            progress = lambda *args: self.progress.append(args),
+            get_driver = lambda operating_system: FakeDevice,
+            sessions = self.sessions
+            )
+        
+    def tearDown(self):
+        FakeDevice.release.set()
+        self.collector.close()
+        self.sessions.close()
+        
+    def session_nodes(self):
+        return {session.key[1] for session in self.sessions.idle}
+        
+    # the devices are updated concurrently, and the sessions are reused by 
+    # the following actions
+    def test_concurrent_update(self):
+        errors = self.collector.update({'Facts', 'Users'}, *self.nodes)
+        self.assertGreater(FakeDevice.calls.highest, 1)
+        self.assertLessEqual(FakeDevice.calls.highest, self.workers)
+        self.assertFalse(errors)
+        for node in self.nodes:
+            self.assertEqual(node.napalm_data['Facts'], {'hostname': node.name})
+            self.assertEqual(node.napalm_data['Users'], {})
+        self.assertEqual([done for done, *_ in self.progress], list(range(1, 21)))
+        self.collector.run(commit_action, self.nodes)
+        self.assertEqual(sorted(FakeDevice.opened), sorted(n.name for n in self.nodes))
+        self.assertEqual(self.session_nodes(), set(self.nodes))
+        self.assertTrue(all(s.connection.committed for s in self.sessions.idle))
+        
+    # a device that cannot be reached or does not answer in time is reported
+    # without delaying the others
+    def test_failures(self):
+        self.nodes[0].name, self.nodes[1].name = 'slow router', 'down router'
+        errors = self.collector.update({'Facts'}, *self.nodes)
+        # the slow device is still answering when the update is done
+        self.assertEqual(FakeDevice.calls.current, 1)
+        FakeDevice.release.set()
+        self.assertIsInstance(errors.pop(self.nodes[0]), TimeoutError)
+        self.assertIsInstance(errors.pop(self.nodes[1]), ConnectionError)
+        self.assertFalse(errors)
+        self.assertNotIn('Facts', self.nodes[0].napalm_data)
+        self.assertEqual(self.session_nodes(), set(self.nodes[2:]))
+        
+class TestSessionManager(unittest.TestCase):
+    
+    def setUp(self):
+        self.closed = []
+        self.dead = set()
+        self.sessions = SessionManager(
+                                       idle_timeout = 10, 
+                                       max_sessions = 2, 
+                                       check_interval = 5
+                                       )
+        
+    def session(self, key):
+        return self.sessions.session(
+                                     key, 
+                                     lambda: [key],
+                                     lambda connection: key not in self.dead,
+                                     self.closed.append
+                                     )
+        
+    def age(self, seconds):
+        for session in self.sessions.idle:
+            session.last_used -= seconds
+            session.last_checked -= seconds
+        
+    # a session is reused until it is idle for too long, or evicted by more
+    # recently used sessions
+    def test_reuse_and_eviction(self):
+        with self.session('A') as connection:
+            pass
+        with self.session('A') as reused:
+            self.assertIs(reused, connection)
+            self.assertFalse(self.sessions.idle)
+        for key in 'BC':
+            with self.session(key):
+                pass
+        self.assertEqual(self.closed, [['A']])
+        self.age(11)
+        self.sessions.evict()
+        self.assertEqual(self.closed, [['A'], ['B'], ['C']])
+        self.assertFalse(self.sessions.idle)
+        
+    # a session is checked before it is reused, and closed when the action
+    # using it fails
+    def test_health_checks(self):
+        with self.session('A') as connection:
+            pass
+        self.dead.add('A')
+        with self.session('A') as reused:
+            self.assertIs(reused, connection)
+        self.age(6)
+        with self.session('A') as new_connection:
+            self.assertIsNot(new_connection, connection)
+        self.assertEqual(self.closed, [connection])
+        with self.assertRaises(ValueError):
+            with self.session('A'):
+                raise ValueError
+        self.assertEqual(self.closed, [connection, new_connection])
+        self.assertFalse(self.sessions.idle)
+        
+    # sessions in use count toward the limit: a thread waits for a session
+    # to be given back when all of them are in use
+    def test_open_sessions_limit(self):
+        entered, done, opened = [], Event(), [0, 0]
+        def connect(key):
+            opened[0] += 1
+            opened[1] = max(opened)
+            return [key]
+        def close(connection):
+            opened[0] -= 1
+        def action(key):
+            with self.sessions.session(key, lambda: connect(key), bool, close):
+                entered.append(key)
+                done.wait(10)
+        threads = [Thread(target=action, args=(key,)) for key in 'ABCD']
+        for thread in threads:
+            thread.start()
+        while len(entered) < 2:
+            sleep(0.01)
+        sleep(0.1)
+        self.assertEqual(len(entered), 2)
+        done.set()
+        for thread in threads:
+            thread.join(10)
+        self.assertEqual(sorted(entered), list('ABCD'))
+        self.assertEqual(opened[1], 2)
+        self.assertEqual(self.sessions.busy, 0)
+        self.assertEqual(len(self.sessions.idle), 2)
+        
+# netmiko connection standing in for ConnectHandler: each prompt round 
+# trip takes 'delay' seconds
+class FakeConnection(object):
+    
+    delay = 0.02
+    calls = InFlight()
+    
+    def __init__(self, **parameters):
+        if parameters['ip'] == 'unreachable':
+            raise ConnectionError(parameters['ip'])
+        self.sent = []
+        
+    def send_config_set(self, lines):
+        with self.calls:
+            sleep(self.delay)
+        self.sent.append(lines)
+        return 'config set of {} lines'.format(len(lines))
+        
+    def send_command(self, line):
+        with self.calls:
+            sleep(self.delay)
+        self.sent.append(line)
+        return line
+        
+    def disconnect(self):
+        pass
+        
+class TestScriptPush(unittest.TestCase):
+    
+    script = 'hostname {{ name }}\ninterface lo0\nip address {{ ip_address }}'
+    
+    def setUp(self):
+        self.network = Network()
+        self.nodes = [
+                      self.network.nf(
+                                      name = 'switch' + str(i), 
+                                      ip_address = '10.0.0.' + str(i)
+                                      ) 
+                      for i in range(20)
+                      ]
+        self.sessions = SessionManager()
+        FakeConnection.calls = InFlight()
+        
+    def tearDown(self):
+        self.sessions.close()
+        
+    def pusher(self, batch):
+        return ScriptPusher(
+                            {
+                             'username': 'user', 
+                             'password': 'password',
+                             'enable_password': ''
+                             },
+                            batch = batch,
+                            connect = FakeConnection,
+                            sessions = self.sessions
+                            )
+        
+    # in batch mode, the script rendered for each node is sent as a single
+    # configuration set, and the devices are configured concurrently
+    def test_batch_push(self):
+        pusher = self.pusher(True)
+        results = pusher.push(self.script, *self.nodes)
+        self.assertGreater(FakeConnection.calls.highest, 1)
+        self.assertLessEqual(FakeConnection.calls.highest, pusher.workers)
+        self.assertFalse(any(result.error for result in results.values()))
+        connections = {s.key[1]: s.connection for s in self.sessions.idle}
+        for node in self.nodes:
+            self.assertEqual(results[node].output, 'config set of 3 lines')
+            self.assertEqual(connections[node].sent, [[
+                                              'hostname ' + node.name, 
+                                              'interface lo0',
+                                              'ip address ' + node.ip_address
+                                              ]])
+        
+    # line per line, each line is a prompt round trip; a device that cannot
+    # be reached is reported without stopping the push
+    def test_line_push(self):
+        self.nodes[0].ip_address = 'unreachable'
+        results = self.pusher(False).push(self.script, *self.nodes)
+        self.assertIsInstance(results[self.nodes[0]].error, ConnectionError)
+        for node in self.nodes[1:]:
+            self.assertIsNone(results[node].error)
+            self.assertGreaterEqual(results[node].duration, 3*FakeConnection.delay)
+            self.assertEqual(results[node].output.splitlines()[1], 'interface lo0')
+        
+class TestTemplateCache(unittest.TestCase):
+    
+    script = 'hostname {{ name }}\nip address {{ ip_address }} {{ subnetmask }}'
+    
+    def setUp(self):
+        self.network = Network()
+        self.nodes = [
+                      self.network.nf(
+                                      name = 'router' + str(i), 
+                                      ip_address = '10.0.0.' + str(i)
+                                      ) 
+                      for i in range(10)
+                      ]
+        self.cache = TemplateCache(size=2)
+        
+    # a template is compiled once, and the least recently used templates
+    # are dropped
+    def test_compiled_templates(self):
+        template = self.cache.template(self.script)
+        self.assertIs(self.cache.template(self.script), template)
+        self.cache.template('a')
+        self.cache.template(self.script)
+        self.cache.template('b')
+        self.assertIs(self.cache.template(self.script), template)
+        self.assertEqual(len(self.cache.templates), 2)
+        
+    # the context of a node only contains its import / export properties
+    def test_render(self):
+        node = self.nodes[3]
+        self.assertEqual(
+                         self.cache.render(self.script + '{{ gnode }}', node),
+                         'hostname router3\nip address 10.0.0.3 '
+                         )
+        configurations = self.cache.render_all(self.script, self.nodes)
+        self.assertEqual(list(configurations), self.nodes)
+        self.assertEqual(
+                         self.cache.render_all(self.script, self.nodes, 3),
+                         configurations
+                         )
+        
+class TestSnapshot(unittest.TestCase):
+    
+    @start_pyNMS_and_import_project('test_isis.xls')
+    def setUp(self):
+        self.path = join(tempfile.mkdtemp(), 'test_isis.pnms')
+        self.pj.snapshot_export(self.path)
+        
+    def tearDown(self):
+        self.app.quit()
+        
+    def content(self, network):
+        return (
+                {
+                 node.name: (node.subtype, node.x, node.y, dict(node.AS_properties))
+                 for node in network.nodes.values()
+                 },
+                {
+                 link.name: (link.subtype, link.source.name, link.destination.name)
+                 for link in network.all_links()
+                 },
+                {
+                 (i.link.name, i.node.name): (str(i.ip_address), dict(i.AS_properties))
+                 for i in network.interfaces
+                 },
+                {
+                 AS.name: (
+                           AS.AS_type, 
+                           set(map(str, AS.nodes)), 
+                           set(map(str, AS.links)),
+                           {
+                            area.name: (set(map(str, area.pa['node'])), area.id)
+                            for area in AS.areas.values()
+                            }
+                           )
+                 for AS in network.pnAS.values()
+                 }
+                )
+        
+    # a project loaded from a snapshot has the same objects, AS and routing
+    # tables as the exported project
+    def test_snapshot(self):
+        network = Network()
+        snapshot = Snapshot(self.path)
+        snapshot.load(network)
+        self.assertEqual(self.content(network), self.content(self.nk))
+        self.assertEqual(
+                         TestHeadless.routing_tables(self, network), 
+                         TestHeadless.routing_tables(self, self.nk)
+                         )
+        
+    # sections are only read when they are loaded
+    def test_lazy_sections(self):
+        snapshot, network = Snapshot(self.path), Network()
+        self.assertIn('AS', snapshot.index)
+        snapshot.load(network, sections=('router',))
+        self.assertEqual(set(snapshot.sections), {'router'})
+        self.assertEqual(len(network.nodes), len(self.nk.nodes))
+        self.assertFalse(network.plinks)
+        
+class TestYAML(unittest.TestCase):
+    
+    @start_pyNMS_and_import_project('test_isis.xls')
+    def setUp(self):
+        self.path = join(tempfile.mkdtemp(), 'test_isis.yaml')
+        self.pj.yaml_export(self.path)
+        
+    def tearDown(self):
+        self.app.quit()
+        
+    def content(self, network):
+        return (
+                {
+                 node.name: node.subtype
+                 for node in network.nodes.values()
+                 },
+                {
+                 link.name: (link.subtype, link.source.name, link.destination.name)
+                 for link in network.all_links()
+                 }
+                )
+        
+    # the sections are exported in the import order, and the objects are
+    # created as they are read
+    def test_yaml_round_trip(self):
+        with open(self.path) as file:
+            sections = [section for section, objects in read_sections(file)]
+        order = [s for s in ProjectLoader.import_order if s in sections]
+        self.assertEqual(sections[:len(order)], order)
+        network = Network()
+        ProjectLoader(network).yaml_import(self.path)
+        self.assertEqual(self.content(network), self.content(self.nk))
+        
+    # in older files, the sections are sorted by name (links before nodes)
+    def test_sorted_sections(self):
+        path = join(path_pynms, 'Workspace', 'usa.yaml')
+        with open(path) as file:
+            sections = [section for section, objects in read_sections(file)]
+        self.assertEqual(sections, sorted(sections))
+        network = Network()
+        ProjectLoader(network).yaml_import(path)
+        self.assertEqual(len(network.nodes), 28)
+        self.assertEqual(len(network.plinks), 44)
+        self.assertFalse({
+                          node for link in network.plinks.values()
+                          for node in (link.source, link.destination)
+                          if node.subtype != 'router'
+                          })
+        
+class TestLiteralParsing(unittest.TestCase):
+    
+    def test_parse_collection(self):
+        self.assertEqual(parse_collection("['a', \"b c\", 1, 2.5]"), ('a', 'b c', 1, 2.5))
+        self.assertEqual(parse_collection('set()'), ())
+        self.assertEqual(parse_collection('{}'), ())
+        self.assertEqual(parse_collection("['it\\'s']"), ("it's",))
+        for text in ('[a, b]', "__import__('os').getcwd()", "['a'"):
+            with self.assertRaises((ValueError, SyntaxError)):
+                parse_collection(text)
+                
+    # the parsed values are memoised, but each conversion returns a new
+    # collection
+    def test_conversions(self):
+        network = Network()
+        nodes = network.convert_node_set("{'r1', 'r2'}")
+        self.assertEqual(set(map(str, nodes)), {'r1', 'r2'})
+        source, destination = nodes
+        network.lf(name='l1', source=source, destination=destination)
+        links = network.convert_link_list("['l1', 'l1']")
+        self.assertEqual(len(links), 2)
+        self.assertIs(links[0], links[1])
+        first = SetProperty("{'AS1'}")
+        self.assertEqual(first, {'AS1'})
+        self.assertIsNot(first, SetProperty("{'AS1'}"))
+        
+class TestBulkFactories(unittest.TestCase):
+    
+    # the bulk factories give the same objects as the node and link 
+    # factories: a name already used refers to the existing object
+    def test_bulk_factories(self):
+        network = Network()
+        existing = network.nf(name='r0')
+        nodes = network.nodes_bulk('switch', (
+                                   {'name': name} for name in ('r0', 's1', 's2', 's1')
+                                   ))
+        self.assertIs(nodes[0], existing)
+        self.assertIs(nodes[1], nodes[3])
+        self.assertEqual(len(network.nodes), 3)
+        self.assertEqual(set(network.spn['switch'].values()), {nodes[1], nodes[2]})
+        links = network.links_bulk(
+                                   'ethernet link', 
+                                   [nodes[0].id, nodes[1].id], 
+                                   [nodes[1].id, nodes[2].id],
+                                   [{'name': 'l1', 'distance': 5}, {}]
+                                   )
+        self.assertEqual(network.lf(name='l1'), links[0])
+        self.assertEqual(links[0].distance, 5)
+        self.assertEqual(len(network.interfaces), 4)
+        self.assertEqual(len(network.spn['ethernet interface']), 4)
+        neighbors = {neighbor for neighbor, _ in network.graph[nodes[1].id]['plink']}
+        self.assertEqual(neighbors, {nodes[0], nodes[2]})
+        self.assertEqual(network.nf().id, 4)
+        
+    def test_square_tiling(self):
+        network = Network()
+        objects = list(network.square_tiling(10, 'switch'))
+        self.assertEqual(len(network.nodes), 100)
+        self.assertEqual(len(network.plinks), 180)
+        self.assertEqual(len(objects), 280)
+        self.assertEqual(set(network.spn), {'switch', 'ethernet link', 'ethernet interface'})
+        
+class TestCompactObjects(unittest.TestCase):
+    
+    # default values are class attributes, and the rarely used dictionnaries
+    # are only created when they are used
+    def test_compact_objects(self):
+        network = Network()
+        source, destination = network.nf(name='r1'), network.nf(name='r2')
+        link = network.lf(source=source, destination=destination)
+        interface = link.interfaceS
+        self.assertEqual(interface.ip_address, '0.0.0.0')
+        self.assertEqual(source.x, 0.)
+        self.assertEqual(vars(interface), {})
+        self.assertEqual(vars(link), {})
+        with self.assertRaises(AttributeError):
+            source._AS_properties
+        source('AS1', 'cost', 5)
+        self.assertEqual(source.AS_properties, {'AS1': {'cost': 5}})
+        source.x = 10.
+        self.assertEqual((source.x, destination.x), (10., 0.))
+        node = network.nf(name='r3', vendor='Juniper')
+        self.assertEqual(vars(node), {'vendor': 'Juniper'})
+        
 class TestFlow(unittest.TestCase):
  
     @start_pyNMS_and_import_project('test_flow1.xls')
@@ -176,7 +1221,44 @@ class TestSP(unittest.TestCase):
         for i, r in enumerate((self.route9, self.route10, self.route11)):
             _, path = self.nk.A_star(r[0], r[1])
             self.assertEqual(list(map(str, path)), self.results[i])
-        
+
+    def test_dijkstra(self):
+        for i, r in enumerate((self.route9, self.route10, self.route11)):
+            _, path, _ = self.nk.dijkstra(r[0], r[1])
+            self.assertEqual(list(map(str, path)), self.results[i])
+
+    def test_shortest_path_kernel(self):
+        spt = self.nk.shortest_path()
+        for i, r in enumerate((self.route9, self.route10, self.route11)):
+            _, path = spt.run(r[0]).path(r[1])
+            self.assertEqual(list(map(str, path)), self.results[i])
+
+    def test_compiled_graph(self):
+        compiled_graph = self.nk.compile()
+        self.assertIs(self.nk.compile(), compiled_graph)
+        self.assertEqual(len(compiled_graph), len(self.nk.nodes))
+        # the compiled view is invalidated when the topology changes
+        self.nk.lf(source=self.route9[0], destination=self.route9[1])
+        self.assertIsNone(self.nk.compiled_graph)
+        _, path, _ = self.nk.dijkstra(*self.route9)
+        self.assertEqual(len(path), 1)
+
+    # the costs are extracted again only after a cost change, and the masks
+    # only for new allowed sets
+    def test_compiled_graph_cache(self):
+        compiled_graph = self.nk.compile()
+        weights = compiled_graph.weights('plink')
+        self.assertIs(compiled_graph.weights('plink'), weights)
+        allowed_links = set(self.nk.plinks.values())
+        mask = compiled_graph.edge_mask('plink', allowed_links)
+        self.assertIs(compiled_graph.edge_mask('plink', allowed_links), mask)
+        self.assertIsNot(compiled_graph.edge_mask('plink', set(allowed_links)), mask)
+        plink = next(iter(self.nk.plinks.values()))
+        plink.costSD = plink.costDS = 1000
+        self.nk.bump('cost')
+        self.assertIsNot(compiled_graph.weights('plink'), weights)
+        self.assertIn(1000, compiled_graph.weights('plink'))
+
     def test_bellman_ford(self):
         for i, r in enumerate((self.route9, self.route10, self.route11)):
             _, path = self.nk.bellman_ford(r[0], r[1])
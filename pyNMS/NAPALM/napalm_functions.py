@@ -13,15 +13,17 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from collections import OrderedDict, defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from time import monotonic
+from automation.device_actions import credentials_function
+from automation.session_manager import session_key, session_manager
+from automation.templates import template_cache
 import warnings
 try:
     from napalm_base import get_network_driver
 except ImportError:
     warnings.warn('napalm not installed')
-try:
-    from jinja2 import Template
-except ImportError:
-    warnings.warn('jinja2 not installed')
+    get_network_driver = None
 
 napalm_actions = OrderedDict([
 ('ARP table', 'get_arp_table'),
@@ -47,105 +49,237 @@ napalm_actions = OrderedDict([
 # ('Routing table', 'get_route_to') # need argument
 ])
 
-def open_device(credentials, node):
-    driver = get_network_driver(node.operating_system.lower())
+# getters of the actions of update_allowed: returns the NAPALM data of the 
+# node to be updated
+def napalm_getters(device, update_allowed):
+    data = {}
+    for action, function in napalm_actions.items():
+        if action in update_allowed:
+            try:
+                data[action] = getattr(device, function)()
+            except NotImplementedError:
+                data[action] = {}
+    if 'Configuration' in update_allowed:
+        data['Configuration']['compare'] = device.compare_config()
+    if 'Logging' in update_allowed:
+        data['cli'] = device.cli(['show logging'])
+    return data
+    
+def napalm_update(device, node, update_allowed):
+    node.napalm_data.update(napalm_getters(device, update_allowed))
+    
+def candidate_configuration(node):
+    config = node.napalm_data['Configuration']['candidate']
+    return template_cache.render(config, node)
+    
+## Actions run by the collector on a device: they return the NAPALM data of 
+## the node to be updated
+
+def update_action(device, node, update_allowed):
+    return napalm_getters(device, update_allowed)
+
+def commit_action(device, node):
+    device.commit_config()
+    return napalm_getters(device, {'Configuration'})
+    
+def discard_action(device, node):
+    device.discard_config()
+    return napalm_getters(device, {'Configuration'})
+    
+def rollback_action(device, node):
+    device.rollback()
+    return napalm_getters(device, {'Configuration'})
+    
+def load_merge_action(device, node, commit=False):
+    device.load_merge_candidate(config=candidate_configuration(node))
+    if commit:
+        device.commit_config()
+    return napalm_getters(device, {'Configuration'})
+    
+def load_replace_action(device, node, commit=False):
+    device.load_replace_candidate(config=candidate_configuration(node))
+    if commit:
+        device.commit_config()
+    return napalm_getters(device, {'Configuration'})
+
+## Sessions
+
+# the NAPALM sessions are kept open by the session manager (see 
+# automation/session_manager.py) and reused by the following actions
+
+def open_device(credentials, node, get_driver=None, timeout=60):
+    driver = (get_driver or get_network_driver)(node.operating_system.lower())
     device = driver(
                     hostname = credentials['ip_address'], 
                     username = credentials['username'], 
                     password = credentials['password'], 
+                    timeout = timeout,
                     optional_args = {'secret': credentials['enable_password']}
                     )
     device.open()
     return device
+    
+# drivers that cannot check their connection are considered alive: a dead
+# session is then closed when the action using it fails
+def is_alive(device):
+    try:
+        return device.is_alive()['is_alive']
+    except NotImplementedError:
+        return True
+    
+def napalm_session(credentials, node, get_driver=None, timeout=60, sessions=None):
+    return (sessions or session_manager).session(
+        session_key('napalm', node, node.operating_system.lower(), credentials),
+        lambda: open_device(credentials, node, get_driver, timeout),
+        is_alive,
+        lambda device: device.close()
+        )
 
-def napalm_update(device, node, update_allowed):
-    for action, function in napalm_actions.items():
-        if action in update_allowed:
-            try:
-                node.napalm_data[action] = getattr(device, function)()
-            except NotImplementedError:
-                node.napalm_data[action] = {}
-    if 'Configuration' in update_allowed:
-        node.napalm_data['Configuration']['compare'] = device.compare_config()
-    if 'Logging' in update_allowed:
-        node.napalm_data['cli'] = device.cli(['show logging'])
+## Concurrent collector
+
+# The collector runs an action on many devices at once, with a pool of 
+# 'workers' threads (the time is mostly spent waiting for the devices).
+# - The sessions to the devices are taken from the session manager 
+# 'sessions' (the shared session manager by default).
+# - The result of an action is written to node.napalm_data by the thread 
+# calling 'run', never by the workers.
+# - A device that doesn't complete an action within 'timeout' seconds is 
+# reported as failed (the timeout is also given to the NAPALM driver), and 
+# its result is discarded if it completes later.
+# - 'get_driver' is the function returning the NAPALM driver of an 
+# operating system (napalm get_network_driver by default).
+# 'credentials' and 'progress' are described in automation/device_actions.py.
+
+class NapalmCollector(object):
+    
+    # time (in seconds) between two checks of the timeouts
+    poll_interval = 0.1
+    
+    def __init__(
+                 self, 
+                 credentials, 
+                 workers = 10, 
+                 timeout = 60, 
+                 progress = None, 
+                 get_driver = None,
+                 sessions = None
+                 ):
+        self.credentials = credentials_function(credentials)
+        self.timeout = timeout
+        self.progress = progress
+        self.get_driver = get_driver
+        self.sessions = sessions or session_manager
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        
+    def __enter__(self):
+        return self
+        
+    def __exit__(self, *exception):
+        self.close()
+        
+    def task(self, action, node, credentials, started, *args):
+        started[node] = monotonic()
+        with napalm_session(
+                            credentials, 
+                            node, 
+                            self.get_driver, 
+                            self.timeout, 
+                            self.sessions
+                            ) as device:
+            return action(device, node, *args)
+        
+    # run 'action' (function of the device, the node and 'args') on all 
+    # nodes. Returns a dictionnary associating the nodes for which the 
+    # action failed to the exception raised
+    def run(self, action, nodes, *args):
+        started, errors = {}, {}
+        futures = {
+                   self.executor.submit(
+                                        self.task, 
+                                        action, 
+                                        node, 
+                                        self.credentials(node), 
+                                        started, 
+                                        *args
+                                        ): node
+                   for node in nodes
+                   }
+        pending, done_count = set(futures), 0
+        while pending:
+            done, pending = wait(
+                                 pending, 
+                                 timeout = self.poll_interval, 
+                                 return_when = FIRST_COMPLETED
+                                 )
+            now, timed_out = monotonic(), set()
+            for future in pending:
+                node = futures[future]
+                if node in started and now - started[node] > self.timeout:
+                    timed_out.add(future)
+            pending -= timed_out
+            for future in done | timed_out:
+                node, error = futures[future], None
+                if future in timed_out:
+                    error = TimeoutError('{} timed out'.format(node))
+                elif future.exception():
+                    error = future.exception()
+                else:
+                    node.napalm_data.update(future.result())
+                if error:
+                    errors[node] = error
+                done_count += 1
+                if self.progress:
+                    self.progress(done_count, len(futures), node, error)
+        return errors
+        
+    def update(self, update_allowed, *nodes):
+        return self.run(update_action, nodes, update_allowed)
+        
+    # the sessions stay open in the session manager; the workers of devices 
+    # that timed out are not waited for
+    def close(self):
+        self.executor.shutdown(wait=False)
+        
+## Standalone functions: an action run on all nodes
+
+def run_action(credentials, action, nodes, *args):
+    with NapalmCollector(credentials) as collector:
+        errors = collector.run(action, nodes, *args)
+    for node, error in errors.items():
+        warnings.warn('NAPALM action on {} failed: {}'.format(node, error))
+    return errors
 
 def standalone_napalm_update(credentials, update_allowed, *nodes):
-    for node in nodes:
-        device = open_device(credentials, node)
-        napalm_update(device, node, update_allowed)
-        device.close()
+    return run_action(credentials, update_action, nodes, update_allowed)
         
 def napalm_commit(credentials, *nodes):
-    for node in nodes:
-        device = open_device(credentials, node)
-        device.commit_config()
-        napalm_update(device, node, {'Configuration'})
-        device.close()
+    return run_action(credentials, commit_action, nodes)
         
 def napalm_discard(credentials, *nodes):
-    for node in nodes:
-        device = open_device(credentials, node)
-        device.discard_config()
-        napalm_update(device, node, {'Configuration'})
-        device.close()
+    return run_action(credentials, discard_action, nodes)
         
 def napalm_load_merge(credentials, *nodes):
-    for node in nodes:
-        device = open_device(credentials, node)
-        config = node.napalm_data['Configuration']['candidate']
-        j2_config = Template(config).render(**node.__dict__)
-        device.load_merge_candidate(config=j2_config)
-        napalm_update(device, node, {'Configuration'})
-        device.close()
+    return run_action(credentials, load_merge_action, nodes)
         
 def napalm_load_merge_commit(credentials, *nodes):
-    for node in nodes:
-        device = open_device(credentials, node)
-        config = node.napalm_data['Configuration']['candidate']
-        j2_config = Template(config).render(**node.__dict__)
-        device.load_merge_candidate(config=j2_config)
-        device.commit_config()
-        napalm_update(device, node, {'Configuration'})
-        device.close()
+    return run_action(credentials, load_merge_action, nodes, True)
         
 def napalm_load_replace(credentials, *nodes):
-    for node in nodes:
-        device = open_device(credentials, node)
-        config = node.napalm_data['Configuration']['candidate']
-        j2_config = Template(config).render(**node.__dict__)
-        device.load_replace_candidate(config=j2_config)
-        napalm_update(device, node, {'Configuration'})
-        device.close()
+    return run_action(credentials, load_replace_action, nodes)
         
 def napalm_load_replace_commit(credentials, *nodes):
-    for node in nodes:
-        device = open_device(credentials, node)
-        config = node.napalm_data['Configuration']['candidate']
-        j2_config = Template(config).render(**node.__dict__)
-        device.load_replace_candidate(config=j2_config)
-        device.commit_config()
-        napalm_update(device, node, {'Configuration'})
-        device.close()
+    return run_action(credentials, load_replace_action, nodes, True)
         
 def napalm_rollback(credentials, *nodes):
-    for node in nodes:
-        device = open_device(credentials, node)
-        device.rollback()
-        napalm_update(device, node, {'Configuration'})
-        device.close()
+    return run_action(credentials, rollback_action, nodes)
         
 def napalm_ping(credentials, node, **parameters):
-    device = open_device(credentials, node)
-    result = device.ping(**parameters)
-    device.close()
-    return result
+    with napalm_session(credentials, node) as device:
+        return device.ping(**parameters)
     
 def napalm_traceroute(credentials, node, **parameters):
-    device = open_device(credentials, node)
-    result = device.traceroute(**parameters)
-    device.close()
-    return result
+    with napalm_session(credentials, node) as device:
+        return device.traceroute(**parameters)
     
 ## pretty print the output
 
@@ -0,0 +1,28 @@
+# Copyright (C) 2017 Antoine Fourmy <antoine dot fourmy at gmail dot com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Actions run on many devices at once, with a pool of worker threads: the
+# NAPALM collector (NAPALM/napalm_functions.py) and the script pusher
+# (automation/script_push.py).
+# - 'credentials' is either the credentials of all nodes, or a function 
+# returning the credentials of a node (e.g Network.get_credentials): it is
+# only called by the calling thread.
+# - 'progress' is called by the calling thread every time a device is done,
+# with the number of devices done, the total number of devices, the node 
+# and the error (None if the action succeeded).
+
+def credentials_function(credentials):
+    if callable(credentials):
+        return credentials
+    return lambda node: credentials
@@ -0,0 +1,111 @@
+# Copyright (C) 2017 Antoine Fourmy <antoine dot fourmy at gmail dot com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from automation.device_actions import credentials_function
+from automation.session_manager import session_key, session_manager
+from automation.templates import template_cache
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from time import monotonic
+from warnings import warn
+try:
+    from netmiko import ConnectHandler
+except ImportError:
+    warn('netmiko not installed')
+    ConnectHandler = None
+
+# result of a push on a device: the output of the device, the time spent
+# (in seconds) and the exception raised (None if the push succeeded)
+PushResult = namedtuple('PushResult', 'output duration error')
+
+def connection_parameters(node, credentials):
+    return {
+            'device_type': node.netmiko_operating_system,
+            'ip': node.ip_address,
+            # credentials to log in to the device
+            'username': credentials['username'],
+            'password': credentials['password'],
+            'secret': credentials['enable_password']
+            }
+
+# The pusher sends a Jinja2 script to many devices at once, with a pool of
+# 'workers' threads. The script is rendered for all nodes by the calling
+# thread (see automation/templates.py).
+# - in batch mode, the rendered script is sent to a device as one
+# configuration set (netmiko send_config_set: a single prompt round trip
+# per batch instead of one per line)
+# - otherwise, it is sent line per line (netmiko send_command)
+# The connections are taken from the session manager 'sessions', and
+# opened with 'connect' (netmiko ConnectHandler by default).
+# 'credentials' and 'progress' are described in automation/device_actions.py.
+
+class ScriptPusher(object):
+
+    def __init__(
+                 self,
+                 credentials,
+                 workers = 10,
+                 batch = True,
+                 progress = None,
+                 connect = None,
+                 sessions = None
+                 ):
+        self.credentials = credentials_function(credentials)
+        self.workers = workers
+        self.batch = batch
+        self.progress = progress
+        self.connect = connect or ConnectHandler
+        self.sessions = sessions or session_manager
+
+    def push_device(self, node, parameters, lines):
+        start = monotonic()
+        try:
+            with self.sessions.session(
+                session_key('netmiko', node, parameters['device_type'], parameters),
+                lambda: self.connect(**parameters),
+                lambda connection: connection.is_alive(),
+                lambda connection: connection.disconnect()
+                ) as connection:
+                if self.batch:
+                    output = connection.send_config_set(lines)
+                else:
+                    output = '\n'.join(map(connection.send_command, lines))
+        except Exception as error:
+            return PushResult('', monotonic() - start, error)
+        return PushResult(output, monotonic() - start, None)
+
+    # returns a dictionnary associating each node to its push result
+    def push(self, script, *nodes):
+        configurations, results = template_cache.render_all(script, nodes), {}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {
+                       executor.submit(
+                            self.push_device,
+                            node,
+                            connection_parameters(node, self.credentials(node)),
+                            configuration.splitlines()
+                            ): node
+                       for node, configuration in configurations.items()
+                       }
+            for done_count, future in enumerate(as_completed(futures), 1):
+                node = futures[future]
+                results[node] = future.result()
+                if self.progress:
+                    self.progress(
+                                  done_count,
+                                  len(futures),
+                                  node,
+                                  results[node].error
+                                  )
+        return results
@@ -12,18 +12,11 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+from automation.script_push import ScriptPusher
 from miscellaneous.decorators import update_paths
 from pyQT_widgets.Q_console_edit import QConsoleEdit
-from PyQt5.QtWidgets import QGridLayout, QPushButton, QWidget
-from warnings import warn
-try:
-    from netmiko import ConnectHandler
-except ImportError:
-    warn('netmiko not installed')
-try:
-    from jinja2 import Template
-except ImportError:
-    warn('jinja2 not installed')
+from pyQT_widgets.Q_devices_progress_dialog import QDevicesProgressDialog
+from PyQt5.QtWidgets import QCheckBox, QGridLayout, QPushButton, QWidget
 
 class SendScriptWindow(QWidget):
     
@@ -40,37 +33,42 @@ class SendScriptWindow(QWidget):
         
         self.script_content_edit = QConsoleEdit()
         
+        # in batch mode, the script is sent as one configuration set per
+        # device, instead of line per line
+        self.batch_push = QCheckBox('Batch push (configuration set)')
+        self.batch_push.setChecked(True)
+        
         send_button = QPushButton('Send script')
         send_button.clicked.connect(self.send_script)
+        
+        # result of the last push on each device
+        self.results_edit = QConsoleEdit()
+        self.results_edit.setReadOnly(True)
                                         
         layout = QGridLayout()
-        layout.addWidget(self.script_content_edit, 0, 0)
-        layout.addWidget(send_button, 1, 0)
+        layout.addWidget(self.script_content_edit, 0, 0, 1, 2)
+        layout.addWidget(self.batch_push, 1, 0)
+        layout.addWidget(send_button, 1, 1)
+        layout.addWidget(self.results_edit, 2, 0, 1, 2)
         self.setLayout(layout)
         
+    # the script is sent to all devices concurrently (see 
+    # automation/script_push.py), with a progress dialog updated every time
+    # a device is done
     def send_script(self):
-        config = self.script_content_edit.toPlainText()
-        for node in self.nodes:
-            # log in to the device
-            credentials = self.network.get_credentials(node)
-            connection_parameters = {
-                'device_type': node.netmiko_operating_system,
-                'ip': node.ip_address,
-                # credentials to log in to the device
-                'username': credentials['username'], 
-                'password': credentials['password'], 
-                'enable_password': credentials['enable_password']
-            }
-            
-            netmiko_connection = ConnectHandler(**connection_parameters)
-            
-            # turn the script into a Jinja2 template
-            j2_config = Template(config).render(**node.__dict__)
-            
-            # send the script line per line
-            for line in j2_config.splitlines():
-                netmiko_connection.send_command(line)
-                
-            netmiko_connection.disconnect()
-            
-                                            
\ No newline at end of file
+        nodes = list(self.nodes)
+        progress_dialog = QDevicesProgressDialog('Send script', len(nodes))
+        pusher = ScriptPusher(
+                              self.network.get_credentials, 
+                              batch = self.batch_push.isChecked(),
+                              progress = progress_dialog.progress
+                              )
+        results = pusher.push(self.script_content_edit.toPlainText(), *nodes)
+        self.results_edit.setPlainText('\n'.join(
+            '{} ({:.1f}s): {}'.format(
+                                      node, 
+                                      result.duration, 
+                                      result.error or result.output
+                                      )
+            for node, result in results.items()
+            ))
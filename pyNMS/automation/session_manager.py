@@ -0,0 +1,151 @@
+# Copyright (C) 2017 Antoine Fourmy <antoine dot fourmy at gmail dot com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from contextlib import contextmanager
+from threading import Condition
+from time import monotonic
+
+# Sessions to the devices (NAPALM devices, netmiko connections), kept open
+# between two actions so that the SSH connection and the login are not
+# done again for each action.
+# A session is identified by a key (node, driver, credentials). It is used
+# by one thread at a time: it is taken from the idle sessions (or opened if
+# there is none) when an action starts, and given back when it is done.
+# - an idle session is closed after 'idle_timeout' seconds without use
+# - at most 'max_sessions' sessions are open at once, in use or idle: when
+# a session must be opened and the limit is reached, the least recently
+# used idle session is closed, and if all sessions are in use, the thread
+# waits until one of them is given back
+# - an idle session that was not checked for 'check_interval' seconds is
+# checked before it is used, and replaced by a new session if the device
+# does not answer
+# - a session that was in use when an exception was raised is closed
+
+def session_key(kind, node, driver, credentials):
+    return (kind, node, driver, tuple(sorted(credentials.items())))
+
+class Session(object):
+
+    def __init__(self, key, connection, alive, close):
+        self.key = key
+        self.connection = connection
+        # function returning whether the connection is still usable
+        self.alive = alive
+        # function closing the connection
+        self.close = close
+        self.last_used = self.last_checked = monotonic()
+
+    def is_alive(self):
+        self.last_checked = monotonic()
+        try:
+            return self.alive(self.connection)
+        except Exception:
+            return False
+
+    def terminate(self):
+        try:
+            self.close(self.connection)
+        except Exception:
+            pass
+
+class SessionManager(object):
+
+    def __init__(self, idle_timeout=300, max_sessions=50, check_interval=30):
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self.check_interval = check_interval
+        # idle sessions, from the least to the most recently used
+        self.idle = []
+        # number of sessions in use
+        self.busy = 0
+        self.lock = Condition()
+
+    # returns the most recently used idle session of a key, or None if a
+    # new session must be opened, once the session is counted as in use.
+    # The second value is the idle session that must be closed to keep the
+    # number of open sessions below the limit, if any.
+    def checkout(self, key):
+        with self.lock:
+            while True:
+                for index in reversed(range(len(self.idle))):
+                    if self.idle[index].key == key:
+                        self.busy += 1
+                        return self.idle.pop(index), None
+                if self.busy + len(self.idle) < self.max_sessions:
+                    self.busy += 1
+                    return None, None
+                if self.idle:
+                    self.busy += 1
+                    return None, self.idle.pop(0)
+                self.lock.wait()
+
+    # a session given back is idle, and a session closed while in use
+    # leaves room for a new one
+    def release(self, session=None):
+        with self.lock:
+            self.busy -= 1
+            if session:
+                session.last_used = monotonic()
+                self.idle.append(session)
+            self.lock.notify()
+        self.evict()
+
+    # close the sessions idle for too long, and the least recently used ones
+    # if there are too many (after 'max_sessions' was lowered)
+    def evict(self):
+        now, evicted = monotonic(), []
+        with self.lock:
+            while self.idle and (
+                    self.busy + len(self.idle) > self.max_sessions
+                    or now - self.idle[0].last_used > self.idle_timeout
+                    ):
+                evicted.append(self.idle.pop(0))
+            if evicted:
+                self.lock.notify_all()
+        for session in evicted:
+            session.terminate()
+
+    # context manager yielding an open connection: 'connect' opens a new
+    # connection, 'alive' checks that a connection is usable, and 'close'
+    # closes it
+    @contextmanager
+    def session(self, key, connect, alive, close):
+        self.evict()
+        session, evicted = self.checkout(key)
+        if evicted:
+            evicted.terminate()
+        # a session that does not answer is replaced, in the same slot
+        if session and monotonic() - session.last_checked >= self.check_interval:
+            if not session.is_alive():
+                session.terminate()
+                session = None
+        try:
+            if session is None:
+                session = Session(key, connect(), alive, close)
+            yield session.connection
+        except BaseException:
+            if session:
+                session.terminate()
+            self.release()
+            raise
+        self.release(session)
+
+    def close(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for session in idle:
+            session.terminate()
+
+# sessions shared by the NAPALM functions and the send-script window
+session_manager = SessionManager()
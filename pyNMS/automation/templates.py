@@ -0,0 +1,100 @@
+# Copyright (C) 2017 Antoine Fourmy <antoine dot fourmy at gmail dot com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from hashlib import sha1
+from objects.objects import object_ie
+from threading import Lock
+from warnings import warn
+try:
+    from jinja2 import Environment
+except ImportError:
+    warn('jinja2 not installed')
+
+# Rendering of the Jinja2 configuration templates (scripts sent to the
+# devices, NAPALM candidate configurations).
+# - The compiled templates are kept in a LRU cache keyed by the hash of
+# their source, shared by all rendering functions: a template is compiled
+# once, however many nodes it is rendered for.
+# - The context of a node is built from its import / export properties
+# (name, IP address, credentials, coordinates...), not from its attributes,
+# which include the graphical objects and routing tables of the node.
+# - 'render_all' renders a template for many nodes at once. With more than
+# one process, the contexts are spread across forked worker processes,
+# which inherit the compiled template.
+
+def node_context(node):
+    return {
+            property.name: getattr(node, property.name)
+            for property in object_ie[node.subtype]
+            }
+
+class TemplateCache(object):
+
+    def __init__(self, size=128):
+        self.size = size
+        self.environment = None
+        # hash of the source -> compiled template, from the least to the
+        # most recently used
+        self.templates = OrderedDict()
+        self.lock = Lock()
+
+    def template(self, source):
+        key = sha1(source.encode('utf-8')).hexdigest()
+        with self.lock:
+            if key in self.templates:
+                self.templates.move_to_end(key)
+                return self.templates[key]
+        if self.environment is None:
+            self.environment = Environment()
+        template = self.environment.from_string(source)
+        with self.lock:
+            self.templates[key] = template
+            while len(self.templates) > self.size:
+                self.templates.popitem(last=False)
+        return template
+
+    def render(self, source, node):
+        return self.template(source).render(node_context(node))
+
+    # returns a dictionnary associating each node to its configuration
+    def render_all(self, source, nodes, processes=1):
+        global current_template
+        template, nodes = self.template(source), list(nodes)
+        contexts = list(map(node_context, nodes))
+        if processes > 1 and 'fork' in multiprocessing.get_all_start_methods():
+            chunks = [contexts[i::processes] for i in range(processes)]
+            current_template = template
+            context = multiprocessing.get_context('fork')
+            with ProcessPoolExecutor(processes, mp_context=context) as pool:
+                results = list(pool.map(render_chunk, chunks))
+            current_template = None
+            # the contexts of chunk i are the contexts i, i + processes...
+            configurations = [None]*len(contexts)
+            for i, result in enumerate(results):
+                configurations[i::processes] = result
+        else:
+            configurations = [template.render(context) for context in contexts]
+        return OrderedDict(zip(nodes, configurations))
+
+# the template being rendered, inherited by the forked worker processes
+current_template = None
+
+def render_chunk(contexts):
+    return [current_template.render(context) for context in contexts]
+
+# templates shared by the NAPALM functions and the script pusher
+template_cache = TemplateCache()
@@ -16,17 +16,20 @@ from objects.objects import *
 from collections import defaultdict
 from miscellaneous.network_functions import mac_comparer
 from heapq import heappop, heappush
+from networks.shortest_path import ShortestPath
 from . import area
-from . import AS_management
 
 class AutonomousSystem(object):
     
     class_type = 'AS'
     has_area = False
+    
+    # name of the management window class of the AS (see AS_management)
+    management_class = None
 
     def __init__(
                  self, 
-                 view,
+                 network,
                  name, 
                  id,
                  links = set(), 
@@ -34,8 +37,11 @@ class AutonomousSystem(object):
                  imp = False
                  ):
                      
-        self.view = view
-        self.network = self.view.network
+        self.network = network
+        # a network without view (headless) has no management window:
+        # its AS have no management window either
+        self.view = network.view
+        self.management = None
         self.name = name
         self.id = id
         self.links = links
@@ -62,6 +68,7 @@ class AutonomousSystem(object):
             self.pAS[obj.class_type].add(obj)
             if not self in obj.AS:
                 obj.AS[self] = set()
+        self.network.bump('topology')
         
     def remove_from_AS(self, *objects):
         for obj in objects:
@@ -70,13 +77,29 @@ class AutonomousSystem(object):
             # we pop the AS from the dict of object AS, and retrieve the list
             # of area it belongs to in this AS
             obj.AS.pop(self)
+        self.network.bump('topology')
             
     def delete_AS(self):
         for obj in self.nodes | self.links:
             obj.AS.pop(self)
             self.pAS[obj.class_type].discard(obj)
-        self.management.destroy()
+        self.network.bump('topology')
+        if self.management:
+            self.management.destroy()
         self.network.pnAS.pop(self.name)
+        
+    # the management window module is imported on demand, as it depends
+    # on PyQt: the AS classes can be used without it
+    def attach_management(self, is_imported):
+        if self.view is not None and self.management_class:
+            from . import AS_management
+            management_class = getattr(AS_management, self.management_class, None)
+            if management_class:
+                self.management = management_class(self, is_imported)
+            
+    def refresh_management(self):
+        if self.management:
+            self.management.refresh_display()
             
 class ASWithArea(AutonomousSystem):
     
@@ -110,6 +133,7 @@ class ASWithArea(AutonomousSystem):
                 # we remove the area to the list of area in the AS 
                 # dictionary, for all objects of the area
                 obj.AS[area.AS].remove(area)
+        self.network.bump('topology')
                 
     def delete_AS(self):
         for area in tuple(self.areas.values()):
@@ -129,13 +153,14 @@ class Ethernet_AS(AutonomousSystem):
 class VLAN_AS(ASWithArea, Ethernet_AS):
     
     AS_type = 'VLAN'
+    management_class = 'VLAN_Management'
     
     def __init__(self, *args):
         super().__init__(*args)
         is_imported = args[-1]
         
         # management window of the AS 
-        self.management = AS_management.VLAN_Management(self, is_imported)
+        self.attach_management(is_imported)
                 
         if not is_imported:
             self.area_factory(
@@ -149,11 +174,12 @@ class VLAN_AS(ASWithArea, Ethernet_AS):
             self.add_to_AS(*(self.nodes | self.links))
 
         # update the AS management panel by filling all boxes
-        self.management.refresh_display()
+        self.refresh_management()
             
 class STP_AS(Ethernet_AS):
     
     AS_type = 'STP'
+    management_class = 'STP_Management'
     
     def __init__(self, *args):
         super().__init__(*args)
@@ -164,7 +190,7 @@ class STP_AS(Ethernet_AS):
         self.SPT_links = set()
         
         # management window of the AS 
-        self.management = AS_management.STP_Management(self, is_imported)
+        self.attach_management(is_imported)
                 
         # set the default per-AS properties of all AS objects
         self.add_to_AS(*(self.nodes | self.links))
@@ -173,7 +199,7 @@ class STP_AS(Ethernet_AS):
         # highest priority, or in case of tie, the highest MAC address
         # self.root_election()
         # update the AS management panel by filling all boxes
-        self.management.refresh_display()
+        self.refresh_management()
                     
     def add_to_AS(self, *objects):
         super(STP_AS, self).add_to_AS(*objects)
@@ -210,42 +236,34 @@ class STP_AS(Ethernet_AS):
     def build_SPT(self):
         # clear the current spanning tree physical links
         self.SPT_links.clear()
-        visited = set()
         # allowed nodes and links
         allowed_nodes = self.pAS['node']
         allowed_links =  self.pAS['link'] - self.network.failed_obj
-        # we keep track of all already visited subnetworks so that we 
-        # don't add them more than once to the mapping dict.
-        heap = [(0, self.root, [])]
-        
-        while heap:
-            dist, node, path_link = heappop(heap)
-            print(node)
-            if node not in visited:
-                if path_link:
-                    self.SPT_links.add(path_link[-1])
-                visited.add(node)
-                for neighbor, l2vc in self.network.gftr(node, 'l2link', 'l2vc'):
-                    adj_link = l2vc('link', node)
-                    remote_link = l2vc('link', neighbor)
-                    if adj_link in path_link:
-                        continue
-                    # excluded and allowed nodes
-                    if neighbor not in allowed_nodes:
-                        continue
-                    # excluded and allowed physical links
-                    if adj_link not in allowed_links: 
-                        continue
-                    ex_int_cost = adj_link('cost', node, AS=self.name)
-                    heappush(heap, (dist + ex_int_cost, 
-                                        neighbor, path_link + [adj_link]))
+        spt = ShortestPath(
+                           lambda node: self.network.gftr(node, 'l2link', 'l2vc'),
+                           lambda l2vc, node: l2vc('link', node)('cost', node, AS=self.name),
+                           lambda l2vc, node: l2vc('link', node),
+                           allowed_nodes = allowed_nodes,
+                           allowed_links = allowed_links
+                           ).run(self.root)
+        # the spanning tree is made of the physical links used to reach
+        # all switches from the root
+        for node, l2vc, _ in spt.tree():
+            self.SPT_links.add(l2vc('link', node))
     
 class IP_AS(AutonomousSystem):
     
     layer = 'IP'
     
+    # route types that a route of any cost can replace (e.g an intra-area
+    # route replaces an inter-area route in OSPF)
+    overridable_routes = ()
+    
     def __init__(self, *args):
         super().__init__(*args)
+        # router -> shortest path distance to all nodes of the AS, as of the
+        # last computation of its routing table: used by the incremental SPF
+        self.distances = {}
         
     def add_to_AS(self, *objects):
         super(IP_AS, self).add_to_AS(*objects)
@@ -257,22 +275,170 @@ class IP_AS(AutonomousSystem):
                                                     'router_id': None
                                                     })
                                                     
+    # shortest path kernel on the layer-3 virtual connections of the AS: 
+    # the cost of a virtual connection is the per-AS cost of the interface
+    # of its physical link
+    def shortest_path(self, allowed_nodes, allowed_links, cost=None):
+        return ShortestPath(
+                            lambda node: self.network.gftr(node, 'l3link', 'l3vc'),
+                            cost or self.cost,
+                            lambda l3vc, node: l3vc('link', node),
+                            allowed_nodes = allowed_nodes,
+                            allowed_links = allowed_links
+                            )
+                            
+    def cost(self, l3vc, node):
+        return l3vc('link', node)('cost', node, AS=self.name)
+                            
+    # add the directly connected subnetworks of the source to its 
+    # routing table
+    def connected_routes(self, source, spt, SP_cost):
+        for neighbor, l3vc in spt.adjacency(source):
+            adj_link = l3vc('link', source)
+            ex_ip = l3vc('link', neighbor)('ip_address', neighbor)
+            ex_int = adj_link('interface', source)
+            source.rt[adj_link.subnetwork] = {('C', ex_ip, ex_int,
+                                                0, neighbor, adj_link)}
+            SP_cost[adj_link.subnetwork] = 0
+                                                    
     def build_RFT(self):
         allowed_nodes = self.nodes
         allowed_links =  self.links - self.network.failed_obj
+        # the allowed sets are computed once for all routers of the AS
+        spt = self.shortest_path(allowed_nodes, allowed_links)
+        # the routing table builders go through the whole first hop search:
+        # the distances it found are kept for the incremental SPF
         for node in self.nodes:
-            self.RFT_builder(node, allowed_nodes, allowed_links)
+            self.RFT_builder(node, spt)
+            self.distances[node] = spt.distances
+            
+    ## Incremental SPF
+    
+    # keys of the routing table that a route crossing a virtual connection 
+    # toward node can lead to
+    def arrival_keys(self, l3vc, node):
+        yield l3vc('link', node).subnetwork
+        
+    # the routing table builders go through the relaxations of the first hop
+    # search in increasing distance order, and a route is decided by the
+    # first relaxations toward its subnetwork: relaxations more expensive 
+    # than the routes of a subnetwork cannot alter them, unless they are of
+    # an overridable type. Connected and static routes are added last and 
+    # are never altered.
+    # returns, for each key of the routing table of the source, the 
+    # highest distance a relaxation can have to alter it.
+    def route_bounds(self, source):
+        bounds = defaultdict(lambda: float('inf'))
+        for key, routes in source.rt.items():
+            types = {route[0] for route in routes}
+            if types & {'C', 'S'}:
+                bounds[key] = float('-inf')
+            elif not types & set(self.overridable_routes):
+                bounds[key] = max(route[3] for route in routes)
+        return bounds
+        
+    # called after the cost of a physical link or its failure state changed:
+    # 'old_costs' (node ID -> per-AS cost of the interface of that node) and
+    # 'was_failed' describe the physical link before the change.
+    # A relaxation that crosses the link (or arrives through it) cannot be 
+    # cheaper than the distance to the node it starts from, plus the lowest 
+    # of the old and new costs: with one shortest path tree rooted at the 
+    # end of each virtual connection of the link (on the graph where the 
+    # link has that lowest cost), we know the lowest distance of all 
+    # relaxations that go through the link, for all routers at once.
+    # returns:
+    # - the routers whose routing table may change
+    # - the routers whose routing table only loses the routes toward the
+    # subnetwork of the link: when the link fails and is the only link of 
+    # its subnetwork, a router whose other routes are not affected has no
+    # path left toward that subnetwork (partial route computation)
+    # - the routers whose routing table won't change, but whose distances
+    # may change
+    def affected_routers(self, plink, old_costs, was_failed):
+        inf = float('inf')
+        
+        def lowest_cost(l3vc, node):
+            cost = self.cost(l3vc, node)
+            if l3vc('link', node) == plink and not was_failed:
+                cost = min(cost, old_costs[node.id])
+            return cost
+            
+        # the link is allowed if it is allowed either before or after
+        allowed_links = (self.links - self.network.failed_obj) | {plink}
+        lowest_spt = self.shortest_path(self.nodes, allowed_links, lowest_cost)
+        
+        pruned_key = None
+        if not was_failed and plink in self.network.failed_obj:
+            if not any(
+                       link.subnetwork == plink.subnetwork 
+                       for link in self.links if link != plink
+                       ):
+                pruned_key = plink.subnetwork
+        
+        # virtual connections crossing the link or arriving through it
+        changed = []
+        for node in self.nodes:
+            for neighbor, l3vc in lowest_spt.adjacency(node):
+                if plink in (l3vc('link', node), l3vc('link', neighbor)):
+                    changed.append((node, l3vc, neighbor))
+        
+        # for each changed virtual connection, the keys it leads to, and
+        # key -> lowest distance of a relaxation toward that key, from its
+        # end (the virtual connection is not crossed backward right away)
+        offsets = {}
+        for node, l3vc, neighbor in changed:
+            offset = {}
+            for start, dist in lowest_spt.run(neighbor).settled.items():
+                for end, vc in lowest_spt.adjacency(start):
+                    if start == neighbor and vc == l3vc:
+                        continue
+                    dist_end = dist + lowest_cost(vc, start)
+                    for key in self.arrival_keys(vc, end):
+                        if dist_end < offset.get(key, inf):
+                            offset[key] = dist_end
+            direct = set(self.arrival_keys(l3vc, neighbor))
+            offsets[(node, l3vc, neighbor)] = (direct, offset)
+            
+        rebuild, prune, refresh = set(), set(), set()
+        for source in self.nodes:
+            distances = self.distances.get(source)
+            if distances is None:
+                rebuild.add(source)
+                continue
+            bounds = self.route_bounds(source)
+            for (node, l3vc, neighbor), (direct, offset) in offsets.items():
+                if node not in distances:
+                    continue
+                dist = distances[node] + lowest_cost(l3vc, node)
+                if node == source or any(
+                                         dist + dist_key <= bounds[key]
+                                         for key, dist_key in offset.items()
+                                         ):
+                    rebuild.add(source)
+                    break
+                reached = {key for key in direct if dist <= bounds[key]}
+                if reached - {pruned_key}:
+                    rebuild.add(source)
+                    break
+                if reached:
+                    prune.add(source)
+                # the virtual connection is, or may become, part of the 
+                # shortest path tree of the source
+                if dist <= distances.get(neighbor, inf):
+                    refresh.add(source)
+        return rebuild, prune - rebuild, refresh - rebuild
                 
 class RIP_AS(IP_AS):
     
     AS_type = 'RIP'
+    management_class = 'RIP_Management'
     
     def __init__(self, *args):
         super().__init__(*args)
         is_imported = args[-1]
         
         # management window of the AS 
-        self.management = AS_management.RIP_Management(self, is_imported)
+        self.attach_management(is_imported)
         
         # the metric used to compute the shortest path. By default, it is 
         # a hop count for a RIP AS, and bandwidth-dependent for ISIS or OSPF.
@@ -285,7 +451,7 @@ class RIP_AS(IP_AS):
         self.add_to_AS(*(self.nodes | self.links))
             
         # update the AS management panel by filling all boxes
-        self.management.refresh_display()
+        self.refresh_management()
             
     def add_to_AS(self, *objects):
         super(RIP_AS, self).add_to_AS(*objects)       
@@ -298,61 +464,35 @@ class RIP_AS(IP_AS):
                 obj.interfaceS(self.name, 'cost', 1)
                 obj.interfaceD(self.name, 'cost', 1)   
         
-    def RFT_builder(self, source, allowed_nodes, allowed_links):
+    def RFT_builder(self, source, spt):
         K = source.AS_properties[self.name]['LB_paths']
-        visited = set()
-        # we keep track of all already visited subnetworks so that we 
-        # don't add them more than once to the mapping dict.
-        visited_subnetworks = set()
-        heap = [(0, source, [], None)]
         # cost of the shortesth path to a subnetwork
         SP_cost = {}
-        
-        while heap:
-            dist, node, l3_path, ex_int = heappop(heap)  
-            if (node, ex_int) not in visited:
-                visited.add((node, ex_int))
-                for neighbor, l3vc in self.network.gftr(node, 'l3link', 'l3vc'):
-                    adj_link = l3vc('link', node)
-                    remote_link = l3vc('link', neighbor)
-                    if l3vc in l3_path:
-                        continue
-                    # excluded and allowed nodes
-                    if neighbor not in allowed_nodes:
-                        continue
-                    # excluded and allowed physical links
-                    if adj_link not in allowed_links: 
-                        continue
-                    if node == source:
-                        ex_ip = remote_link('ip_address', neighbor)
-                        ex_int = adj_link('interface', source)
-                        source.rt[adj_link.subnetwork] = {('C', ex_ip, ex_int,
-                                            dist, neighbor, adj_link)}
-                        SP_cost[adj_link.subnetwork] = 0
-                    ex_int_cost = adj_link('cost', node, AS=self.name)
-                    heappush(heap, (dist + ex_int_cost, 
-                            neighbor, l3_path + [l3vc], ex_int))
-                    
-            if l3_path:
-                curr_l3, ex_l3 = l3_path[-1], l3_path[0]
-                ex_tk = ex_l3('link', source)
-                nh = ex_l3.destination if ex_l3.source == source else ex_l3.source
-                ex_ip = ex_l3('link', nh)('ip_address', nh)
-                link = curr_l3('link', node)
-                ex_int = ex_tk('interface', source)
-                if link.subnetwork not in source.rt:
-                    SP_cost[link.subnetwork] = dist
-                    source.rt[link.subnetwork] = {('R', ex_ip, ex_int, 
-                                                dist, nh, ex_tk)}
-                else:
-                    if (dist == SP_cost[link.subnetwork] 
-                        and K > len(source.rt[link.subnetwork])):
-                        source.rt[link.subnetwork].add(('R', ex_ip, ex_int, 
-                                                dist, nh, ex_tk))
-        
+        self.connected_routes(source, spt, SP_cost)
+
+        # ex_l3 is the first virtual connection of the path (exit of the
+        # source), curr_l3 the last one: the route is toward the subnetwork
+        # of its physical link
+        for dist, node, ex_l3, curr_l3 in spt.first_hop_search(source):
+            ex_tk = ex_l3('link', source)
+            nh = ex_l3.destination if ex_l3.source == source else ex_l3.source
+            ex_ip = ex_l3('link', nh)('ip_address', nh)
+            link = curr_l3('link', node)
+            ex_int = ex_tk('interface', source)
+            if link.subnetwork not in source.rt:
+                SP_cost[link.subnetwork] = dist
+                source.rt[link.subnetwork] = {('R', ex_ip, ex_int, 
+                                            dist, nh, ex_tk)}
+            else:
+                if (dist == SP_cost[link.subnetwork] 
+                    and K > len(source.rt[link.subnetwork])):
+                    source.rt[link.subnetwork].add(('R', ex_ip, ex_int, 
+                                            dist, nh, ex_tk))
+    
 class ISIS_AS(ASWithArea, IP_AS):
     
     AS_type = 'ISIS'
+    management_class = 'ISIS_Management'
     
     def __init__(self, *args):
         super().__init__(*args)
@@ -360,7 +500,7 @@ class ISIS_AS(ASWithArea, IP_AS):
         self.ref_bw = 10000 # (kbps)
         
         # management window of the AS 
-        self.management = AS_management.ISIS_Management(self, is_imported)
+        self.attach_management(is_imported)
         
         # contains all L1/L2 nodes
         self.border_routers = set()
@@ -379,7 +519,7 @@ class ISIS_AS(ASWithArea, IP_AS):
             self.add_to_area(self.areas['Backbone'], *(self.nodes | self.links))
         
         # update the AS management panel by filling all boxes
-        self.management.refresh_display()
+        self.refresh_management()
         
     def add_to_AS(self, *objects):
         super(ISIS_AS, self).add_to_AS(*objects)       
@@ -427,14 +567,25 @@ class ISIS_AS(ASWithArea, IP_AS):
                         self.areas['Backbone'].add_to_area(adj_link)
                         self.border_routers.add(node)   
 
-    def RFT_builder(self, source, allowed_nodes, allowed_links):
+    # an L1 router has a default route toward the closest L1/L2 router
+    def arrival_keys(self, l3vc, node):
+        yield from super().arrival_keys(l3vc, node)
+        if node in self.border_routers:
+            yield '0.0.0.0'
+            
+    def route_bounds(self, source):
+        bounds = super().route_bounds(source)
+        src_area ,= source.AS[self]
+        if source in self.border_routers or src_area.name == 'Backbone':
+            bounds['0.0.0.0'] = float('-inf')
+        return bounds
+
+    def RFT_builder(self, source, spt):
 
         K = source.AS_properties[self.name]['LB_paths']
-        visited = set()
         # we keep track of all already visited subnetworks so that we 
         # don't add them more than once to the mapping dict.
         visited_subnetworks = set()
-        heap = [(0, source, [], None)]
 
         # cost of the shortesth path to a subnetwork
         SP_cost = {}
@@ -448,82 +599,60 @@ class ISIS_AS(ASWithArea, IP_AS):
         # and all other routes are i L1 as rtype (route type).
         isL1 = source not in self.border_routers and src_area.name != 'Backbone'
         
-        while heap:
-            dist, node, l3_path, ex_int = heappop(heap)  
-            if (node, ex_int) not in visited:
-                visited.add((node, ex_int))
-                for neighbor, l3vc in self.network.gftr(node, 'l3link', 'l3vc'):
-                    adj_link = l3vc('link', node)
-                    remote_link = l3vc('link', neighbor)
-                    if l3vc in l3_path:
-                        continue
-                    # excluded and allowed nodes
-                    if neighbor not in allowed_nodes:
-                        continue
-                    # excluded and allowed physical links
-                    if adj_link not in allowed_links: 
-                        continue
-                    if node == source:
-                        ex_ip = remote_link('ip_address', neighbor)
-                        ex_int = adj_link('interface', source)
-                        source.rt[adj_link.subnetwork] = {('C', ex_ip, ex_int,
-                                            dist, neighbor, adj_link)}
-                        SP_cost[adj_link.subnetwork] = 0
-                    ex_int_cost = adj_link('cost', node, AS=self.name)
-                    heappush(heap, (dist + ex_int_cost, 
-                                neighbor, l3_path + [l3vc], ex_int))
-                    
-            if l3_path:
-                curr_l3, ex_l3 = l3_path[-1], l3_path[0]
-                ex_tk = ex_l3('link', source)
-                nh = ex_l3.destination if ex_l3.source == source else ex_l3.source
-                ex_ip = ex_l3('link', nh)('ip_address', nh)
-                link = curr_l3('link', node)
-                ex_int = ex_tk('interface', source)
-                link_int_cost = link('cost', node, AS=self.name)
-                if isL1:
-                    if (node in self.border_routers 
-                                        and '0.0.0.0' not in source.rt):
-                        source.rt['0.0.0.0'] = {('i*L1', ex_ip, ex_int,
-                                                    dist, nh, ex_tk)}
-                    else:
-                        if (('i L1', link.subnetwork) not in visited_subnetworks 
-                                        and link.AS[self] & ex_tk.AS[self]):
-                            visited_subnetworks.add(('i L1', link.subnetwork))
-                            source.rt[link.subnetwork] = {('i L1', ex_ip, ex_int,
-                                    dist + link_int_cost, nh, ex_tk)}
+        self.connected_routes(source, spt, SP_cost)
+
+        for dist, node, ex_l3, curr_l3 in spt.first_hop_search(source):
+            ex_tk = ex_l3('link', source)
+            nh = ex_l3.destination if ex_l3.source == source else ex_l3.source
+            ex_ip = ex_l3('link', nh)('ip_address', nh)
+            link = curr_l3('link', node)
+            ex_int = ex_tk('interface', source)
+            link_int_cost = link('cost', node, AS=self.name)
+            if isL1:
+                if (node in self.border_routers 
+                                    and '0.0.0.0' not in source.rt):
+                    source.rt['0.0.0.0'] = {('i*L1', ex_ip, ex_int,
+                                                dist, nh, ex_tk)}
                 else:
-                    linkAS ,= link.AS[self]
-                    exit_area ,= ex_tk.AS[self]
-                    rtype = 'i L1' if (link.AS[self] & ex_tk.AS[self] and 
-                                    linkAS.name != 'Backbone') else 'i L2'
-                    # we favor intra-area routes by excluding a 
-                    # route if the area of the exit physical link is not
-                    # the one of the subnetwork
-                    if (not ex_tk.AS[self] & link.AS[self] 
-                                    and linkAS.name == 'Backbone'):
-                        continue
-                    # if the source is an L1/L2 node and the destination
-                    # is an L1 area different from its own, we force it
-                    # to use the backbone by forbidding it to use the
-                    # exit interface in the source area
-                    if (rtype == 'i L2' and source in self.border_routers and 
-                                exit_area.name != 'Backbone'):
-                        continue
                     if (('i L1', link.subnetwork) not in visited_subnetworks 
-                        and ('i L2', link.subnetwork) not in visited_subnetworks):
-                        visited_subnetworks.add((rtype, link.subnetwork))
-                        source.rt[link.subnetwork] = {(rtype, ex_ip, ex_int,
+                                    and link.AS[self] & ex_tk.AS[self]):
+                        visited_subnetworks.add(('i L1', link.subnetwork))
+                        source.rt[link.subnetwork] = {('i L1', ex_ip, ex_int,
                                 dist + link_int_cost, nh, ex_tk)}
-                    # TODO
-                    # IS-IS uses per-address unequal cost load balancing 
-                    # a user-defined variance defined as a percentage of the
-                    # primary path cost defines which paths can be used
-                    # (up to 9).
-                
+            else:
+                linkAS ,= link.AS[self]
+                exit_area ,= ex_tk.AS[self]
+                rtype = 'i L1' if (link.AS[self] & ex_tk.AS[self] and 
+                                linkAS.name != 'Backbone') else 'i L2'
+                # we favor intra-area routes by excluding a 
+                # route if the area of the exit physical link is not
+                # the one of the subnetwork
+                if (not ex_tk.AS[self] & link.AS[self] 
+                                and linkAS.name == 'Backbone'):
+                    continue
+                # if the source is an L1/L2 node and the destination
+                # is an L1 area different from its own, we force it
+                # to use the backbone by forbidding it to use the
+                # exit interface in the source area
+                if (rtype == 'i L2' and source in self.border_routers and 
+                            exit_area.name != 'Backbone'):
+                    continue
+                if (('i L1', link.subnetwork) not in visited_subnetworks 
+                    and ('i L2', link.subnetwork) not in visited_subnetworks):
+                    visited_subnetworks.add((rtype, link.subnetwork))
+                    source.rt[link.subnetwork] = {(rtype, ex_ip, ex_int,
+                            dist + link_int_cost, nh, ex_tk)}
+                # TODO
+                # IS-IS uses per-address unequal cost load balancing 
+                # a user-defined variance defined as a percentage of the
+                # primary path cost defines which paths can be used
+                # (up to 9).
+            
 class OSPF_AS(ASWithArea, IP_AS):
     
     AS_type = 'OSPF'
+    management_class = 'OSPF_Management'
+    overridable_routes = ('O IA',)
     
     def __init__(self, *args):
         super().__init__(*args)
@@ -532,7 +661,7 @@ class OSPF_AS(ASWithArea, IP_AS):
         self.ref_bw = 10**8
 
         # management window of the AS
-        self.management = AS_management.OSPF_Management(self, is_imported)
+        self.attach_management(is_imported)
         
         # contains all ABRs
         self.border_routers = set()
@@ -553,7 +682,7 @@ class OSPF_AS(ASWithArea, IP_AS):
             self.add_to_area(self.areas['Backbone'], *(self.nodes | self.links))
             
         # update the AS management panel by filling all boxes
-        self.management.refresh_display()
+        self.refresh_management()
         
     def add_to_AS(self, *objects):
         super(OSPF_AS, self).add_to_AS(*objects)     
@@ -589,98 +718,73 @@ class OSPF_AS(ASWithArea, IP_AS):
                 for area in adj_link.AS[self]:
                     area.add_to_area(node)  
             
-    def RFT_builder(self, source, allowed_nodes, allowed_links):
+    def RFT_builder(self, source, spt):
         K = int(source.AS_properties[self.name]['LB_paths'])
-        visited = set()
         # we keep track of all already visited subnetworks so that we 
         # don't add them more than once to the mapping dict.
         visited_subnetworks = set()
-        heap = [(0, source, [], None)]
         # source area: we make sure that if the node is connected to an area,
         # the path we find to any subnetwork in that area is an intra-area path.
         src_areas = source.AS[self]
         # cost of the shortesth path to a subnetwork
         SP_cost = {}
         
-        while heap:
-            dist, node, l3_path, ex_int = heappop(heap)
-            if (node, ex_int) not in visited:
-                visited.add((node, ex_int))
-                for neighbor, l3vc in self.network.gftr(node, 'l3link', 'l3vc'):
-                    adj_link = l3vc('link', node)
-                    remote_link = l3vc('link', neighbor)
-                    if l3vc in l3_path:
-                        continue
-                    # excluded and allowed nodes
-                    if neighbor not in allowed_nodes:
-                        continue
-                    # excluded and allowed physical links
-                    if adj_link not in allowed_links: 
-                        continue
-                    if node == source:
-                        ex_ip = remote_link('ip_address', neighbor)
-                        ex_int = adj_link('interface', source)
-                        source.rt[adj_link.subnetwork] = {('C', ex_ip, ex_int,
-                                            dist, neighbor, adj_link)}
-                        SP_cost[adj_link.subnetwork] = 0
-                    ex_int_cost = adj_link('cost', node, AS=self.name)
-                    heappush(heap, (dist + ex_int_cost, 
-                                    neighbor, l3_path + [l3vc], ex_int))
-                    
-            if l3_path:
-                curr_l3, ex_l3 = l3_path[-1], l3_path[0]
-                ex_tk = ex_l3('link', source)
-                nh = ex_l3.destination if ex_l3.source == source else ex_l3.source
-                ex_ip = ex_l3('link', nh)('ip_address', nh)
-                link = curr_l3('link', node)
-                ex_int = ex_tk('interface', source)
-                # we check if the physical link has any common area with the
-                # exit physical link: if it does not, it is an inter-area route.
-                rtype = 'O' if (link.AS[self] & ex_tk.AS[self]) else 'O IA'
-                if link.subnetwork not in source.rt:
+        self.connected_routes(source, spt, SP_cost)
+
+        for dist, node, ex_l3, curr_l3 in spt.first_hop_search(source):
+            ex_tk = ex_l3('link', source)
+            nh = ex_l3.destination if ex_l3.source == source else ex_l3.source
+            ex_ip = ex_l3('link', nh)('ip_address', nh)
+            link = curr_l3('link', node)
+            ex_int = ex_tk('interface', source)
+            # we check if the physical link has any common area with the
+            # exit physical link: if it does not, it is an inter-area route.
+            rtype = 'O' if (link.AS[self] & ex_tk.AS[self]) else 'O IA'
+            if link.subnetwork not in source.rt:
+                SP_cost[link.subnetwork] = dist
+                source.rt[link.subnetwork] = {(rtype, ex_ip, ex_int, 
+                                            dist, nh, ex_tk)}
+            else:
+                for route in source.rt[link.subnetwork]:
+                    break
+                if route[0] == 'O' and rtype == 'IA':
+                    continue
+                elif route[0] == 'O IA' and rtype == 'O':
                     SP_cost[link.subnetwork] = dist
                     source.rt[link.subnetwork] = {(rtype, ex_ip, ex_int, 
-                                                dist, nh, ex_tk)}
+                                            dist, nh, ex_tk)}
                 else:
-                    for route in source.rt[link.subnetwork]:
-                        break
-                    if route[0] == 'O' and rtype == 'IA':
-                        continue
-                    elif route[0] == 'O IA' and rtype == 'O':
-                        SP_cost[link.subnetwork] = dist
-                        source.rt[link.subnetwork] = {(rtype, ex_ip, ex_int, 
-                                                dist, nh, ex_tk)}
-                    else:
-                        if (dist == SP_cost[link.subnetwork]
-                            and int(K) > len(source.rt[link.subnetwork])):
-                            source.rt[link.subnetwork].add((
-                                                    rtype, ex_ip, ex_int, 
-                                                        dist, nh, ex_tk
-                                                        ))
-                if (rtype, link.subnetwork) not in visited_subnetworks:
-                    if ('O', link.subnetwork) in visited_subnetworks:
-                        continue
-                    else:
-                        visited_subnetworks.add((rtype, link.subnetwork))
-                        source.rt[link.subnetwork] = {(rtype, ex_ip, ex_int, 
-                                                        dist, nh, ex_tk)}
-                                                        
+                    if (dist == SP_cost[link.subnetwork]
+                        and int(K) > len(source.rt[link.subnetwork])):
+                        source.rt[link.subnetwork].add((
+                                                rtype, ex_ip, ex_int, 
+                                                    dist, nh, ex_tk
+                                                    ))
+            if (rtype, link.subnetwork) not in visited_subnetworks:
+                if ('O', link.subnetwork) in visited_subnetworks:
+                    continue
+                else:
+                    visited_subnetworks.add((rtype, link.subnetwork))
+                    source.rt[link.subnetwork] = {(rtype, ex_ip, ex_int, 
+                                                    dist, nh, ex_tk)}
+                                                    
 class BGP_AS(ASWithArea, IP_AS):
     
     AS_type = 'BGP'
+    management_class = 'BGP_Management'
     
     def __init__(self, *args):
         super().__init__(*args)
         is_imported = args[-1]
 
         # management window of the AS
-        self.management = AS_management.BGP_Management(self, is_imported)
+        self.attach_management(is_imported)
         
         # set the default per-AS properties of all AS objects
         self.add_to_AS(*(self.nodes | self.links))
             
         # update the AS management panel by filling all boxes
-        self.management.refresh_display()
+        self.refresh_management()
         
     def add_to_AS(self, *objects):
         super(BGP_AS, self).add_to_AS(*objects)       
@@ -691,6 +795,14 @@ class BGP_AS(ASWithArea, IP_AS):
                                                     'local_pref': 100,
                                                     })
                 
+    # BGP routes are computed with a path vector algorithm on the BGP 
+    # peerings, not with the shortest path kernel of the IGPs
+    def build_RFT(self):
+        allowed_nodes = self.nodes
+        allowed_links =  self.links - self.network.failed_obj
+        for node in self.nodes:
+            self.RFT_builder(node, allowed_nodes, allowed_links)
+                
     def update_AS_topology(self):                
         # update all BGP peering type based on the source and destination AS
         for node in self.nodes:
@@ -364,6 +364,7 @@ class ISIS_Management(ASManagementWithArea, IPManagement):
             # same metric: 1.
             cost = max(1, self.AS.ref_bw / bw)
             link.costSD = link.costDS = cost
+        self.AS.network.bump('cost')
         
 class OSPF_Management(ASManagementWithArea, IPManagement):
     
@@ -392,7 +393,8 @@ class OSPF_Management(ASManagementWithArea, IPManagement):
             # by default, all interfaces from GE to 100GE will result in the
             # same metric: 1.
             cost = max(1, self.AS.ref_bw / bw)
-            link.costSD = link.costDS = cost 
+            link.costSD = link.costDS = cost
+        self.AS.network.bump('cost')
             
     ## saving function: used when closing the window
     
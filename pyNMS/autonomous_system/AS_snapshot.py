@@ -0,0 +1,256 @@
+# Copyright (C) 2017 Antoine Fourmy <antoine dot fourmy at gmail dot com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from concurrent.futures import ProcessPoolExecutor
+from networks.shortest_path import ShortestPath
+
+# The routing table of a router only depends on the topology of its AS: the
+# shortest path computations of all routers of all IGP AS are independent.
+# To run them on a process pool, we take a compact, picklable snapshot of
+# each AS: the nodes (id, name, areas, number of ECMP paths), the layer-3
+# virtual connections between allowed nodes and links, and for each
+# physical link, its subnetwork, its areas and the per-AS cost of its
+# interfaces. The snapshot objects answer the same calls as the real
+# objects, so that the RFT_builder of the AS class runs on them unchanged.
+# Interfaces and IP addresses are replaced with (type, link id, node id)
+# tokens, and the routes sent back by the workers only contain IDs: they are
+# converted back to real objects when merged into the routing tables.
+
+class SnapshotArea(object):
+
+    def __init__(self, name):
+        self.name = name
+
+    def __eq__(self, other):
+        return isinstance(other, SnapshotArea) and self.name == other.name
+
+    def __hash__(self):
+        return hash(self.name)
+
+class SnapshotNode(object):
+
+    def __init__(self, node, AS, snapshot):
+        self.id = node.id
+        self.name = node.name
+        self.AS_properties = {AS.name: dict(node.AS_properties[AS.name])}
+        self.snapshot = snapshot
+        self.areas = snapshot.areas(node.AS.get(AS, set()))
+        self.rt = {}
+
+    # the AS dictionary is rebuilt on access, instead of being stored: a
+    # dictionary keyed by the snapshot could not be unpickled, since the
+    # snapshot is not built yet when its nodes and links are.
+    @property
+    def AS(self):
+        return {self.snapshot: self.areas}
+
+    def __eq__(self, other):
+        return isinstance(other, SnapshotNode) and self.name == other.name
+
+    def __hash__(self):
+        return hash(self.name)
+
+class SnapshotLink(object):
+
+    def __init__(self, plink, AS, snapshot):
+        self.id = plink.id
+        self.subnetwork = plink.subnetwork
+        # the per-AS dictionaries are read with 'get': they are defaultdict,
+        # and the snapshot must not add the AS to a link outside of it
+        self.snapshot = snapshot
+        self.areas = snapshot.areas(plink.AS.get(AS, set()))
+        # per-AS cost of the interface of each end of the link
+        self.cost = {
+                     plink.source.id: plink.interfaceS.AS_properties
+                                        .get(AS.name, {}).get('cost'),
+                     plink.destination.id: plink.interfaceD.AS_properties
+                                        .get(AS.name, {}).get('cost')
+                     }
+
+    def __call__(self, property, node, AS=None):
+        if property == 'cost':
+            return self.cost[node.id]
+        # 'interface' and 'ip_address' are replaced with tokens
+        return (property, self.id, node.id)
+
+    @property
+    def AS(self):
+        return {self.snapshot: self.areas}
+
+    def __eq__(self, other):
+        return isinstance(other, SnapshotLink) and self.id == other.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+class SnapshotVC(object):
+
+    def __init__(self, l3vc, nodes, links):
+        self.id = l3vc.id
+        self.source = nodes[l3vc.source.id]
+        self.destination = nodes[l3vc.destination.id]
+        self.links = {
+                      node.id: links[l3vc('link', node).id]
+                      for node in (l3vc.source, l3vc.destination)
+                      }
+
+    def __call__(self, property, node):
+        return self.links[node.id]
+
+    def __eq__(self, other):
+        return isinstance(other, SnapshotVC) and self.id == other.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+class ASSnapshot(object):
+
+    def __init__(self, AS):
+        self.name = AS.name
+        self.AS_class = type(AS)
+        network = AS.network
+        allowed_links = AS.links - network.failed_obj
+        self.nodes = {node.id: SnapshotNode(node, AS, self) for node in AS.nodes}
+        links, vcs = {}, {}
+        self.adjacency = {node_id: [] for node_id in self.nodes}
+        for node in AS.nodes:
+            for neighbor, l3vc in network.gftr(node, 'l3link', 'l3vc'):
+                # same filtering as the shortest path kernel of the AS
+                if neighbor not in AS.nodes:
+                    continue
+                if l3vc('link', node) not in allowed_links:
+                    continue
+                for plink in (l3vc('link', node), l3vc('link', neighbor)):
+                    if plink.id not in links:
+                        links[plink.id] = SnapshotLink(plink, AS, self)
+                if l3vc.id not in vcs:
+                    vcs[l3vc.id] = SnapshotVC(l3vc, self.nodes, links)
+                self.adjacency[node.id].append((
+                                                self.nodes[neighbor.id],
+                                                vcs[l3vc.id]
+                                                ))
+        self.border_routers = {
+                               self.nodes[node.id]
+                               for node in getattr(AS, 'border_routers', ())
+                               if node.id in self.nodes
+                               }
+
+    def __eq__(self, other):
+        return isinstance(other, ASSnapshot) and self.name == other.name
+
+    def __hash__(self):
+        return hash(self.name)
+
+    # convert a set of areas to a set of snapshot areas (None for RIP)
+    @staticmethod
+    def areas(areas):
+        if areas is None:
+            return None
+        return {SnapshotArea(area.name) for area in areas}
+
+    def shortest_path(self):
+        return ShortestPath(
+                            lambda node: self.adjacency[node.id],
+                            lambda vc, node: vc('link', node)('cost', node, AS=self.name),
+                            lambda vc, node: vc('link', node)
+                            )
+
+    # the routing table builders of the AS class are used as they are
+    def connected_routes(self, source, spt, SP_cost):
+        return self.AS_class.connected_routes(self, source, spt, SP_cost)
+
+    def RFT_builder(self, source, spt):
+        return self.AS_class.RFT_builder(self, source, spt)
+
+    # build the routing table of the sources, and return them with IDs
+    # instead of objects, along with the distances of the sources to all
+    # nodes of the AS (used by the incremental SPF)
+    def build_RFT(self, source_ids):
+        spt, tables = self.shortest_path(), {}
+        for source_id in source_ids:
+            source = self.nodes[source_id]
+            self.RFT_builder(source, spt)
+            table = {
+                subnetwork: [
+                             (rtype, ex_ip, ex_int, dist, nh.id, ex_tk.id)
+                             for rtype, ex_ip, ex_int, dist, nh, ex_tk in routes
+                             ]
+                for subnetwork, routes in source.rt.items()
+                }
+            distances = {
+                         node.id: dist 
+                         for node, dist in spt.distances.items()
+                         }
+            tables[source_id] = (table, distances)
+            source.rt = {}
+        return tables
+
+## Process pool
+
+# each worker receives all snapshots once, when it starts
+worker_snapshots = {}
+
+def init_worker(snapshots):
+    worker_snapshots.update(snapshots)
+
+def build_RFT(AS_name, source_ids):
+    return AS_name, worker_snapshots[AS_name].build_RFT(source_ids)
+
+# convert an ID-based route back to a route made of network objects
+def objectize_route(network, route):
+    rtype, (_, ip_link, ip_node), (_, int_link, int_node), dist, nh, ex_tk = route
+    ip_node, int_node = network.nodes[ip_node], network.nodes[int_node]
+    return (
+            rtype,
+            network.plinks[ip_link]('ip_address', ip_node),
+            network.plinks[int_link]('interface', int_node),
+            dist,
+            network.nodes[nh],
+            network.plinks[ex_tk]
+            )
+
+# computes the routing tables of all routers of the AS on a pool of
+# 'processes' workers: each task is a chunk of the routers of one AS.
+# The resulting tables are merged in the routing tables of the routers,
+# AS after AS.
+def parallel_RFT_creation(network, ASes, processes):
+    snapshots = {AS.name: ASSnapshot(AS) for AS in ASes}
+    tasks = []
+    for AS in ASes:
+        sources = sorted(node.id for node in AS.nodes)
+        chunk = max(1, len(sources) // (4 * processes))
+        for i in range(0, len(sources), chunk):
+            tasks.append((AS.name, sources[i:i + chunk]))
+    results = {AS.name: {} for AS in ASes}
+    with ProcessPoolExecutor(
+                             processes,
+                             initializer = init_worker,
+                             initargs = (snapshots,)
+                             ) as pool:
+        futures = [pool.submit(build_RFT, *task) for task in tasks]
+        for future in futures:
+            AS_name, tables = future.result()
+            results[AS_name].update(tables)
+    for AS in ASes:
+        for source_id, (table, distances) in results[AS.name].items():
+            source = network.nodes[source_id]
+            for subnetwork, routes in table.items():
+                source.rt[subnetwork] = {
+                                         objectize_route(network, route)
+                                         for route in routes
+                                         }
+            AS.distances[source] = {
+                                    network.nodes[node_id]: dist
+                                    for node_id, dist in distances.items()
+                                    }
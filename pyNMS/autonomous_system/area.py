@@ -31,7 +31,8 @@ class Area(object):
         # update the area dict of the AS with the new area
         self.AS.areas[name] = self
         # add the area to the AS management panel area listbox
-        self.AS.management.add_area(name, id)
+        if self.AS.management:
+            self.AS.management.add_area(name, id)
         
     def __repr__(self):
         return self.name
@@ -40,9 +41,11 @@ class Area(object):
         for obj in objects:
             self.pa[obj.class_type].add(obj)
             obj.AS[self.AS].add(self)
+        self.AS.network.bump('topology')
             
     def remove_from_area(self, *objects):
         for obj in objects:
             self.pa[obj.class_type].discard(obj)
             obj.AS[self.AS].discard(self)
+        self.AS.network.bump('topology')
             
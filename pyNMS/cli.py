@@ -0,0 +1,90 @@
+# Copyright (C) 2017 Antoine Fourmy <antoine dot fourmy at gmail dot com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Command-line interface: imports a project (Excel or YAML) in a network
+# without view, runs the refresh pipeline (and optionally the physical link
+# dimensioning) and prints the traffic of all physical links.
+# PyQt is not imported: it can be run on a server without display.
+# Example: python cli.py project.xls --dimensioning --processes 4
+
+import argparse
+import sys
+from inspect import stack
+from os.path import abspath, dirname
+
+# prevent python from writing *.pyc files / __pycache__ folders
+sys.dont_write_bytecode = True
+
+path_app = dirname(abspath(stack()[0][1]))
+
+if path_app not in sys.path:
+    sys.path.append(path_app)
+
+from networks.loader import ProjectLoader
+from networks.network import Network
+
+def parse_arguments(arguments=None):
+    parser = argparse.ArgumentParser(
+                description = 'Run the pyNMS refresh pipeline on a project'
+                )
+    parser.add_argument('project', help='Excel (.xls) or YAML project file')
+    parser.add_argument(
+                        '--stages',
+                        nargs = '+',
+                        choices = list(Network.stage_inputs),
+                        default = list(Network.stage_inputs),
+                        help = 'stages of the refresh pipeline to run'
+                        )
+    parser.add_argument(
+                        '--processes',
+                        type = int,
+                        default = 1,
+                        help = 'number of processes for routing and dimensioning'
+                        )
+    parser.add_argument(
+                        '--dimensioning',
+                        action = 'store_true',
+                        help = 'compute the worst-case traffic of physical links'
+                        )
+    return parser.parse_args(arguments)
+
+def run(arguments=None):
+    arguments = parse_arguments(arguments)
+    network = Network()
+    network.routing_processes = arguments.processes
+    ProjectLoader(network).import_file(arguments.project)
+    # the stages are run in the order of the refresh pipeline
+    network.run_stages(*(
+                         stage for stage in network.stage_inputs
+                         if stage in arguments.stages
+                         ))
+    if arguments.dimensioning:
+        network.plink_dimensioning()
+    for plink in sorted(network.plinks.values(), key=lambda plink: plink.name):
+        line = '{}: {} (SD), {} (DS)'.format(
+                                             plink.name,
+                                             plink.trafficSD,
+                                             plink.trafficDS
+                                             )
+        if arguments.dimensioning:
+            line += ', worst case {} (SD), {} (DS), failure: {}'.format(
+                                                            plink.wctrafficSD,
+                                                            plink.wctrafficDS,
+                                                            plink.wcfailure
+                                                            )
+        print(line)
+    return network
+
+if str.__eq__(__name__, '__main__'):
+    run()
@@ -13,21 +13,13 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from collections import defaultdict, OrderedDict
+from importlib import import_module
 from objects.objects import *
 from os.path import abspath, join, pardir
-from graph_algorithms.shortest_path_window import ShortestPathWindow
-from graph_algorithms.maximum_flow_window import MaximumFlowWindow
-from graph_algorithms.disjoint_sp_window import DisjointSPWindow
-from graph_algorithms.minimum_cost_flow_window import MCFlowWindow
-from graph_algorithms.rwa_window import RWAWindow
-from graph_generation.graph_generation_window import GraphGenerationWindow
-from gis.gis_parameter_window import GISParameterWindow
 from miscellaneous.graph_drawing import *
-from miscellaneous.credentials_window import CredentialsWindow
-from miscellaneous.search_window import SearchWindow
-from miscellaneous.style_window import StyleWindow
-from miscellaneous.debug import DebugWindow
 from miscellaneous.decorators import update_paths
+from miscellaneous.startup import StartupReport
+from automation.session_manager import session_manager
 from main_menus import (
                         node_creation_panel,
                         internal_node_creation_panel,
@@ -41,7 +33,7 @@ from project import Project
 from subprocess import Popen
 from views import base_view
 from PyQt5 import QtCore, QtGui, QtWidgets
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtGui import (
                          QColor, 
                          QIcon,
@@ -65,9 +57,117 @@ from PyQt5.QtWidgets import (
                              QWidget
                              )
 
+# The permanent windows are created the first time they are used, and their
+# module is only imported then: the window replaces the descriptor in the
+# controller, so that it is created only once.
+class LazyWindow(object):
+    
+    def __init__(self, module, window_class, with_controller=True):
+        self.module = module
+        self.window_class = window_class
+        self.with_controller = with_controller
+        
+    def __set_name__(self, owner, name):
+        self.name = name
+        
+    def __get__(self, controller, owner):
+        if controller is None:
+            return self
+        with controller.startup_report.measure('widget', self.window_class):
+            window_class = getattr(import_module(self.module), self.window_class)
+            if self.with_controller:
+                window = window_class(controller)
+            else:
+                window = window_class()
+        setattr(controller, self.name, window)
+        return window
+
+# Pixmaps of the node subtypes, pixmaps[color][subtype]: an image is read
+# the first time it is used, instead of reading all images at startup.
+# If 'source' is set, the pixmaps are the pixmaps of the source, rescaled.
+class NodePixmaps(dict):
+    
+    def __init__(self, path_icon, source=None):
+        self.path_icon = path_icon
+        self.source = source
+        
+    def __missing__(self, color):
+        self[color] = pixmaps = SubtypePixmaps(self, color)
+        return pixmaps
+        
+class SubtypePixmaps(dict):
+    
+    def __init__(self, node_pixmaps, color):
+        self.node_pixmaps = node_pixmaps
+        self.color = color
+        
+    def __missing__(self, subtype):
+        if self.node_pixmaps.source is not None:
+            pixmap = self.node_pixmaps.source[self.color][subtype].scaled(
+                                                        QSize(100, 100), 
+                                                        Qt.KeepAspectRatio,
+                                                        Qt.SmoothTransformation
+                                                        )
+        else:
+            extension = '.png' if subtype in ('shelf', 'port', 'card') else '.gif'
+            path = join(
+                        self.node_pixmaps.path_icon, 
+                        ''.join((self.color, '_', subtype, extension))
+                        )
+            pixmap = QPixmap(path)
+        self[subtype] = pixmap
+        return pixmap
+
 class Controller(QMainWindow):
-    def __init__(self, path_app):
+    
+    ## permanent windows
+    
+    graph_generation_window = LazyWindow(
+                                'graph_generation.graph_generation_window',
+                                'GraphGenerationWindow'
+                                )
+    spring_layout_parameters_window = LazyWindow(
+                                'miscellaneous.graph_drawing',
+                                'SpringLayoutParametersWindow'
+                                )
+    gis_parameter_window = LazyWindow(
+                                'gis.gis_parameter_window', 
+                                'GISParameterWindow'
+                                )
+    search_window = LazyWindow('miscellaneous.search_window', 'SearchWindow')
+    style_window = LazyWindow('miscellaneous.style_window', 'StyleWindow', False)
+    debug_window = LazyWindow('miscellaneous.debug', 'DebugWindow')
+    credentials_window = LazyWindow(
+                                'miscellaneous.credentials_window',
+                                'CredentialsWindow'
+                                )
+    
+    # Graph algorithm windows
+    shortest_path_window = LazyWindow(
+                                'graph_algorithms.shortest_path_window',
+                                'ShortestPathWindow'
+                                )
+    maximum_flow_window = LazyWindow(
+                                'graph_algorithms.maximum_flow_window',
+                                'MaximumFlowWindow'
+                                )
+    disjoint_sp_window = LazyWindow(
+                                'graph_algorithms.disjoint_sp_window',
+                                'DisjointSPWindow'
+                                )
+    mcf_window = LazyWindow(
+                            'graph_algorithms.minimum_cost_flow_window', 
+                            'MCFlowWindow'
+                            )
+    rwa_window = LazyWindow('graph_algorithms.rwa_window', 'RWAWindow')
+    
+    # with 'lazy_windows' set to False, all permanent windows are created
+    # at startup. The startup report records the time spent creating each
+    # widget (and, if it was started before importing the controller, the
+    # time spent importing each module)
+    def __init__(self, path_app, lazy_windows=True, startup_report=None):
         super().__init__()
+        self.startup_report = startup_report or StartupReport()
         # for the update_paths decorator to work
         self.controller = self
         palette = self.palette()
@@ -80,6 +180,8 @@ class Controller(QMainWindow):
         self.path_apps = join(path_parent, 'Apps')
         self.path_icon = join(path_parent, 'Icons')
         self.path_shapefiles = join(path_parent, 'Shapefiles')
+        # projected shapefiles drawn on the map (see gis/shapefile_cache.py)
+        self.path_cache = join(path_parent, 'Cache')
         self.path_test = join(path_parent, 'Tests')
         self.path_workspace = join(path_parent, 'Workspace')
         
@@ -90,23 +192,6 @@ class Controller(QMainWindow):
         central_widget = QWidget(self)
         self.setCentralWidget(central_widget)
         
-        ## permanent windows
-        
-        self.graph_generation_window = GraphGenerationWindow(self)
-        self.spring_layout_parameters_window = SpringLayoutParametersWindow(self)
-        self.gis_parameter_window = GISParameterWindow(self)
-        self.search_window = SearchWindow(self)
-        self.style_window = StyleWindow()
-        self.debug_window = DebugWindow(self)
-        self.credentials_window = CredentialsWindow(self)
-        
-        # Graph algorithm windows
-        self.shortest_path_window = ShortestPathWindow(self)   
-        self.maximum_flow_window = MaximumFlowWindow(self)
-        self.disjoint_sp_window = DisjointSPWindow(self)
-        self.mcf_window = MCFlowWindow(self)
-        self.rwa_window = RWAWindow(self)
-        
         ## Menu bar
         menu_bar = self.menuBar()
         
@@ -134,6 +219,14 @@ class Controller(QMainWindow):
         yaml_export.setStatusTip('Export the current project (YAML format)')
         yaml_export.triggered.connect(self.yaml_export)
         
+        snapshot_import = QAction('Snapshot import', self)
+        snapshot_import.setStatusTip('Import a project (snapshot format)')
+        snapshot_import.triggered.connect(self.snapshot_import)
+        
+        snapshot_export = QAction('Snapshot export', self)
+        snapshot_export.setStatusTip('Export the current project (snapshot format)')
+        snapshot_export.triggered.connect(self.snapshot_export)
+        
         debug_pynms = QAction('Debug', self)
         debug_pynms.setShortcut('Ctrl+D')
         debug_pynms.setStatusTip('Debug')
@@ -154,6 +247,9 @@ class Controller(QMainWindow):
         main_menu.addAction(yaml_import)
         main_menu.addAction(yaml_export)
         main_menu.addSeparator()
+        main_menu.addAction(snapshot_import)
+        main_menu.addAction(snapshot_export)
+        main_menu.addSeparator()
         main_menu.addAction(debug_pynms)
         main_menu.addAction(quit_pynms)
         
@@ -322,22 +418,10 @@ class Controller(QMainWindow):
         toolbar.addAction(zoom_in)
         toolbar.addAction(zoom_out)
         
-        # create all pixmap images for node subtypes
-        self.pixmaps = defaultdict(OrderedDict)
+        # pixmap images for node subtypes, read the first time they are used
+        self.pixmaps = NodePixmaps(self.path_icon)
         # rescaled pixmap used on the canvas to display graphical objects
-        self.gpixmaps = defaultdict(OrderedDict)
-        for color in ('default', 'red', 'purple'):
-            for subtype in node_subtype:
-                if subtype in ('shelf', 'port', 'card'):
-                    path = join(self.path_icon, ''.join((color, '_', subtype, '.png')))
-                else:
-                    path = join(self.path_icon, ''.join((color, '_', subtype, '.gif')))
-                self.pixmaps[color][subtype] = QPixmap(path)
-                self.gpixmaps[color][subtype] = QPixmap(path).scaled(
-                                                        QSize(100, 100), 
-                                                        Qt.KeepAspectRatio,
-                                                        Qt.SmoothTransformation
-                                                        )
+        self.gpixmaps = NodePixmaps(self.path_icon, self.pixmaps)
                 
         # associate a project name to a Project object
         self.dict_project = {}
@@ -345,58 +429,60 @@ class Controller(QMainWindow):
         self.cpt_project = 0
         
         ## notebook containing all menus
-        notebook_menu = QTabWidget(self)
-        notebook_menu.setFixedSize(350, 800)
+        with self.startup_report.measure('widget', 'menu panels'):
+            notebook_menu = QTabWidget(self)
+            notebook_menu.setFixedSize(350, 800)
         
-        # first tab: the creation menu
-        creation_menu = QWidget(notebook_menu)
-        notebook_menu.addTab(creation_menu, 'Creation')
+            # first tab: the creation menu
+            creation_menu = QWidget(notebook_menu)
+            notebook_menu.addTab(creation_menu, 'Creation')
         
-        # creation menus
-        node_creation_menu = node_creation_panel.NodeCreationPanel(self)
-        link_creation_menu = link_creation_panel.LinkCreationPanel(self)
+            # creation menus
+            node_creation_menu = node_creation_panel.NodeCreationPanel(self)
+            link_creation_menu = link_creation_panel.LinkCreationPanel(self)
         
-        # creation panel for the internal node view
-        internal_node_creation_menu = internal_node_creation_panel.InternalNodeCreationPanel(self)
+            # creation panel for the internal node view
+            internal_node_creation_menu = internal_node_creation_panel.InternalNodeCreationPanel(self)
         
-        # layout of the creation menu
-        self.creation_menu_layout = QGridLayout(creation_menu)
-        self.creation_menu_layout.addWidget(node_creation_menu, 0, 0)
-        self.creation_menu_layout.addWidget(link_creation_menu, 1, 0)
-        self.creation_menu_layout.addWidget(internal_node_creation_menu, 0, 0)
+            # layout of the creation menu
+            self.creation_menu_layout = QGridLayout(creation_menu)
+            self.creation_menu_layout.addWidget(node_creation_menu, 0, 0)
+            self.creation_menu_layout.addWidget(link_creation_menu, 1, 0)
+            self.creation_menu_layout.addWidget(internal_node_creation_menu, 0, 0)
         
-        # second tab: the display menu
-        display_menu = QWidget(notebook_menu)
-        notebook_menu.addTab(display_menu, 'Display')
+            # second tab: the display menu
+            display_menu = QWidget(notebook_menu)
+            notebook_menu.addTab(display_menu, 'Display')
         
-        # display menus
-        self.node_display_menu = node_display_panel.NodeDisplayPanel(self)
-        self.link_display_menu = link_display_panel.LinkDisplayPanel(self)
+            # display menus
+            self.node_display_menu = node_display_panel.NodeDisplayPanel(self)
+            self.link_display_menu = link_display_panel.LinkDisplayPanel(self)
         
-        display_menu_layout = QVBoxLayout(display_menu)
-        display_menu_layout.addWidget(self.node_display_menu)
-        display_menu_layout.addWidget(self.link_display_menu)
+            display_menu_layout = QVBoxLayout(display_menu)
+            display_menu_layout.addWidget(self.node_display_menu)
+            display_menu_layout.addWidget(self.link_display_menu)
         
-        # third tab: the options menu
-        options_menu = QWidget(notebook_menu)
-        notebook_menu.addTab(options_menu, 'Options')
+            # third tab: the options menu
+            options_menu = QWidget(notebook_menu)
+            notebook_menu.addTab(options_menu, 'Options')
         
-        # options panel
-        self.routing_panel = routing_panel.RoutingPanel(self)
-        self.selection_panel = selection_panel.SelectionPanel(self)
+            # options panel
+            self.routing_panel = routing_panel.RoutingPanel(self)
+            self.selection_panel = selection_panel.SelectionPanel(self)
         
-        options_menu_layout = QGridLayout(options_menu)
-        options_menu_layout.addWidget(self.selection_panel, 0, 0, 1, 2)
-        options_menu_layout.addWidget(self.routing_panel, 2, 0, 3, 1)
+            options_menu_layout = QGridLayout(options_menu)
+            options_menu_layout.addWidget(self.selection_panel, 0, 0, 1, 2)
+            options_menu_layout.addWidget(self.routing_panel, 2, 0, 3, 1)
         
-        # display the menu for the network mode
-        self.change_menu('network')
+            # display the menu for the network mode
+            self.change_menu('network')
         
         ## notebook containing all projects
         self.notebook_project = QTabWidget(self)
         
         # first project
-        self.add_project()
+        with self.startup_report.measure('widget', 'first project'):
+            self.add_project()
 
         layout = QHBoxLayout(central_widget)
         layout.addWidget(notebook_menu) 
@@ -410,6 +496,18 @@ class Controller(QMainWindow):
         # creation mode (node subtype or link subtype)
         self.creation_mode = 'router'
         
+        # the device sessions idle for too long are closed every minute, and
+        # all sessions are closed when pyNMS exits
+        self.session_timer = QTimer(self)
+        self.session_timer.timeout.connect(session_manager.evict)
+        self.session_timer.start(60000)
+        QApplication.instance().aboutToQuit.connect(session_manager.close)
+        
+        if not lazy_windows:
+            for name, attribute in vars(Controller).items():
+                if isinstance(attribute, LazyWindow):
+                    getattr(self, name)
+        
     def add_project(self, name=None):
         self.cpt_project += 1
         if not name:
@@ -440,8 +538,14 @@ class Controller(QMainWindow):
     def yaml_export(self):
         self.current_project.yaml_export()
         
+    def snapshot_import(self):
+        self.current_project.snapshot_import()
+        
+    def snapshot_export(self):
+        self.current_project.snapshot_export()
+        
     def stop_drawing(self):
-        self.current_project.current_view.stop_timer()
+        self.current_project.current_view.stop_layout()
         
     def switch_to_selection_mode(self):
         self.mode = 'selection'
@@ -0,0 +1,129 @@
+# Copyright (C) 2017 Antoine Fourmy <antoine dot fourmy at gmail dot com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import warnings
+from hashlib import sha1
+import numpy as np
+import shapefile
+
+# Cache of the projected geometry of the shapefiles drawn on the map.
+# The geometry of a shapefile is stored as two arrays:
+# - 'points', the (x, y) vertices of all polygons, one after the other. As
+# when the map was drawn from shapely polygons, the rings of a polygon (its
+# exterior and its holes) are concatenated.
+# - 'offsets', the index of the first vertex of each polygon in 'points',
+# followed by the number of vertices.
+# The projected geometry is keyed by (shapefile path, modification time,
+# projection, ratio). It is kept in memory, and stored on disk (one numpy
+# .npz file per key, with float32 coordinates) so that it survives restarts.
+# On a miss, the shapefile is read once (its longitude / latitude arrays are
+# also kept in memory), and projected with a single pyproj call.
+
+# projected vertices beyond this value (e.g the far side of the earth in
+# an orthographic projection) are dropped
+OUT_OF_BOUNDS = 1e+10
+
+class ShapefileCache(object):
+
+    def __init__(self, path_cache=None):
+        # directory of the on-disk cache, or None for a memory-only cache
+        self.path_cache = path_cache
+        # (path, mtime) -> (longitude / latitude points, offsets)
+        self.geometries = {}
+        # (path, mtime, projection, ratio) -> (canvas points, offsets)
+        self.projected = {}
+
+    def read(self, path):
+        points, offsets = [], [0]
+        for shape in shapefile.Reader(path).shapes():
+            geometry = shape.__geo_interface__
+            if geometry['type'] == 'Polygon':
+                polygons = [geometry['coordinates']]
+            else:
+                polygons = geometry['coordinates']
+            for rings in polygons:
+                for ring in rings:
+                    points.extend(ring)
+                offsets.append(len(points))
+        return (
+                np.array(points, dtype=np.float64).reshape(-1, 2),
+                np.array(offsets, dtype=np.int64)
+                )
+
+    # canvas coordinates of the vertices: the projected coordinates, scaled
+    # by the ratio, with the y axis pointing downward
+    def project(self, points, offsets, projection, ratio):
+        x, y = projection(points[:, 0], points[:, 1])
+        x, y = np.asarray(x) * ratio, -np.asarray(y) * ratio
+        kept = np.isfinite(x) & np.isfinite(y) & (x <= OUT_OF_BOUNDS)
+        # the offsets are shifted by the number of vertices dropped before
+        offsets = np.concatenate(([0], np.cumsum(kept)))[offsets]
+        return np.column_stack((x[kept], y[kept])), offsets
+
+    def filename(self, key):
+        return os.path.join(
+                            self.path_cache,
+                            sha1(repr(key).encode('utf-8')).hexdigest() + '.npz'
+                            )
+
+    def load(self, key):
+        if not self.path_cache:
+            return None
+        try:
+            with np.load(self.filename(key)) as archive:
+                return (
+                        archive['points'].astype(np.float64),
+                        archive['offsets'].astype(np.int64)
+                        )
+        except (OSError, KeyError, ValueError):
+            return None
+
+    # the file is written under a temporary name and renamed, so that an
+    # interrupted write never leaves a truncated cache file
+    def store(self, key, points, offsets):
+        if not self.path_cache:
+            return
+        filename = self.filename(key)
+        try:
+            os.makedirs(self.path_cache, exist_ok=True)
+            with open(filename + '.tmp', 'wb') as file:
+                np.savez(
+                         file,
+                         points = points.astype(np.float32),
+                         offsets = offsets.astype(np.int32)
+                         )
+            os.replace(filename + '.tmp', filename)
+        except OSError as e:
+            warnings.warn('Shapefile cache not written: {}'.format(e))
+
+    # projected geometry of a shapefile: 'projection' is the pyproj
+    # projection, and 'name' its name (part of the key)
+    def polygons(self, path, name, projection, ratio):
+        path = os.path.abspath(path)
+        mtime = os.path.getmtime(path)
+        key = (path, mtime, name, ratio)
+        if key not in self.projected:
+            geometry = self.load(key)
+            if geometry is None:
+                if (path, mtime) not in self.geometries:
+                    self.geometries[(path, mtime)] = self.read(path)
+                geometry = self.project(
+                                        *self.geometries[(path, mtime)],
+                                        projection,
+                                        ratio
+                                        )
+                self.store(key, *geometry)
+            self.projected[key] = geometry
+        return self.projected[key]
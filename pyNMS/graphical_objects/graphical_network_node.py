@@ -6,14 +6,23 @@ class GraphicalNetworkNode(GraphicalNode):
     
     def __init__(self, view, node=None):
         super().__init__(view, node)
-        self.internal_view = InternalNodeView(self, view.controller)
+        self.internal_node_view = None
+        
+    # the internal view of a node is a QGraphicsView: it is only created 
+    # when it is first shown, instead of once per node at import
+    @property
+    def internal_view(self):
+        if not self.internal_node_view:
+            self.internal_node_view = InternalNodeView(self, self.controller)
+        return self.internal_node_view
         
     # itemChange is overriden for a Graphical Network Node, because a site 
     # has no attached link. It does not need to trigger the update position
     # method when on motion.
     @overrider(GraphicalNode)
     def itemChange(self, change, value):
-        if change == self.ItemScenePositionHasChanged:
+        # during a bulk move, links are updated once all nodes have moved
+        if change == self.ItemScenePositionHasChanged and not self.view.bulk_move:
             for glink in self.view.attached_glinks(self):
                 glink.update_position()
         return super().itemChange(change, value)
@@ -42,6 +42,8 @@ class GraphicalNode(QGraphicsPixmapItem):
         # initialize the label
         self.label = self.view.scene.addSimpleText('')
         self.label.setZValue(15)
+        if view.overview:
+            self.set_level_of_detail(True)
         
     @property
     def x(self):
@@ -61,10 +63,7 @@ class GraphicalNode(QGraphicsPixmapItem):
         
     def itemChange(self, change, value):
         if change == self.ItemSelectedHasChanged:
-            if self.isSelected():
-                self.setPixmap(self.selection_pixmap)
-            else:
-                self.setPixmap(self.pixmap)
+            self.update_pixmap()
         if change == self.ItemPositionHasChanged:
             # when the node is created, the ItemPositionHasChanged is triggered:
             # we create the label
@@ -74,6 +73,21 @@ class GraphicalNode(QGraphicsPixmapItem):
             self.label.setPos(self.pos() + QPoint(-20, 40))
         return QGraphicsPixmapItem.itemChange(self, change, value)
         
+    # in overview mode (see BaseView), the node is drawn as a point of fixed
+    # size whatever the zoom, and its label is hidden
+    def set_level_of_detail(self, overview):
+        self.setFlag(QGraphicsItem.ItemIgnoresTransformations, overview)
+        self.label.setVisible(not overview)
+        self.update_pixmap()
+        
+    def update_pixmap(self):
+        if self.view.overview:
+            pixmap = self.view.point_pixmap('red' if self.isSelected() else 'default')
+        else:
+            pixmap = self.selection_pixmap if self.isSelected() else self.pixmap
+        self.setPixmap(pixmap)
+        self.setOffset(QPointF(-pixmap.width()/2, -pixmap.height()/2))
+        
     def mousePressEvent(self, event):
         selection_allowed = self.controller.mode == 'selection'
         node_selection_allowed = self.view.selection['node']
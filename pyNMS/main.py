@@ -24,13 +24,32 @@ path_app = dirname(abspath(stack()[0][1]))
 if path_app not in sys.path:
     sys.path.append(path_app)
     
+# options:
+# - '--startup-report': print the time spent importing each module and 
+# creating each widget, once the main window is shown
+# - '--eager-windows': create all permanent windows at startup instead of
+# the first time they are used
+from miscellaneous.startup import StartupReport
+startup_report = StartupReport()
+if '--startup-report' in sys.argv:
+    startup_report.start()
+    
 import controller
 from PyQt5.QtWidgets import QApplication
 
 if str.__eq__(__name__, '__main__'):
-    app = QApplication(sys.argv)
-    controller = controller.Controller(path_app)
+    with startup_report.measure('widget', 'QApplication'):
+        app = QApplication(sys.argv)
+    controller = controller.Controller(
+                                       path_app, 
+                                       lazy_windows = '--eager-windows' not in sys.argv,
+                                       startup_report = startup_report
+                                       )
     controller.setWindowTitle('pyNMS')
     controller.setGeometry(100, 100, 1500, 800)
-    controller.show()
+    with startup_report.measure('widget', 'main window display'):
+        controller.show()
+    if '--startup-report' in sys.argv:
+        startup_report.stop()
+        print(startup_report.report())
     sys.exit(app.exec_())
\ No newline at end of file
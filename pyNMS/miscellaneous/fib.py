@@ -0,0 +1,100 @@
+# Copyright (C) 2017 Antoine Fourmy <antoine dot fourmy at gmail dot com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Forwarding information base: a longest prefix match structure built from
+# a routing table. Prefixes are stored as 32-bit integers (see toip in
+# network_functions) with a prefix length, in a path-compressed binary trie
+# (Patricia trie): a node only exists where a prefix is stored or where two
+# prefixes diverge, and a lookup visits at most 33 nodes, whatever the size
+# of the routing table.
+
+# MASKS[length] is the integer netmask of a prefix length
+MASKS = [(0xFFFFFFFF << (32 - length)) & 0xFFFFFFFF for length in range(33)]
+
+# tells whether an address (integer) belongs to a prefix
+def contains(prefix, length, address):
+    return not (address ^ prefix) & MASKS[length]
+
+# bit of an address at a position (0 being the most significant bit)
+def bit(address, position):
+    return address >> (31 - position) & 1
+
+class TrieNode(object):
+
+    __slots__ = ('prefix', 'length', 'value', 'children')
+
+    def __init__(self, prefix, length, value=None):
+        self.prefix = prefix
+        self.length = length
+        self.value = value
+        self.children = [None, None]
+
+class FIB(object):
+
+    # routes is an iterable of (prefix, length, value)
+    def __init__(self, routes=()):
+        self.root = TrieNode(0, 0)
+        self.size = 0
+        for prefix, length, value in routes:
+            self.insert(prefix, length, value)
+
+    def __len__(self):
+        return self.size
+
+    def insert(self, prefix, length, value):
+        prefix &= MASKS[length]
+        node = self.root
+        while node.length < length:
+            branch = bit(prefix, node.length)
+            child = node.children[branch]
+            if not child:
+                node.children[branch] = TrieNode(prefix, length, value)
+                self.size += 1
+                return
+            # number of leading bits the prefix and the child have in common
+            common = min(
+                         32 - ((prefix ^ child.prefix) & 0xFFFFFFFF).bit_length(),
+                         length,
+                         child.length
+                         )
+            if common == child.length:
+                node = child
+                continue
+            # the prefix and the child diverge before the end of the child:
+            # a new node is inserted where they diverge
+            fork = TrieNode(prefix & MASKS[common], common)
+            node.children[branch] = fork
+            fork.children[bit(child.prefix, common)] = child
+            if common == length:
+                fork.value = value
+            else:
+                new_node = TrieNode(prefix, length, value)
+                fork.children[bit(prefix, common)] = new_node
+            self.size += 1
+            return
+        # the prefix is already a node of the trie
+        if node.value is None:
+            self.size += 1
+        node.value = value
+
+    # value of the longest prefix that contains the address, or None
+    def lookup(self, address):
+        node, match = self.root, None
+        while node and contains(node.prefix, node.length, address):
+            if node.value is not None:
+                match = node.value
+            if node.length == 32:
+                break
+            node = node.children[bit(address, node.length)]
+        return match
@@ -0,0 +1,106 @@
+# Copyright (C) 2017 Antoine Fourmy <antoine dot fourmy at gmail dot com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import numpy as np
+
+# Force-directed layout algorithms on numpy arrays, without GUI: the layout
+# worker (miscellaneous/graph_drawing.py) runs them in a thread, and the
+# network view moves the graphical nodes to the computed positions.
+# - 'positions' is an (N, 2) array of the (x, y) positions of the nodes
+# - 'edges' is an (M, 2) array of the indices of the ends of the links (a
+# pair of nodes appears once per link between them)
+# The repulsive forces are computed for all pairs of nodes, on blocks of
+# 'block_size' nodes at a time (a (block_size, N) matrix of distances),
+# and the attractive forces are computed on the edge array.
+
+class ForceDirectedLayout(object):
+
+    block_size = 512
+
+    def __init__(self, positions, edges):
+        self.positions = np.array(positions, dtype=float).reshape(-1, 2)
+        self.velocities = np.zeros_like(self.positions)
+        self.edges = np.array(edges, dtype=np.intp).reshape(-1, 2)
+        # pairs of connected nodes: each pair once, without self-loops
+        pairs = np.sort(self.edges[self.edges[:, 0] != self.edges[:, 1]], axis=1)
+        self.pairs = np.unique(pairs, axis=0).reshape(-1, 2)
+
+    # nodes moved by the user while the layout runs: they restart from
+    # their new position, without speed
+    def move(self, indices, positions):
+        self.positions[indices] = positions
+        self.velocities[indices] = 0
+
+    # for each node A, sum of factor(distance(A, B))*(B - A) for all nodes
+    # B at a nonzero distance of A, computed as a matrix product: 
+    # sum(c_AB*B) - sum(c_AB)*A, with c_AB = factor(distance(A, B))
+    def pairwise_forces(self, factor):
+        positions = self.positions
+        x, y = positions[:, 0], positions[:, 1]
+        forces = np.empty_like(positions)
+        for start in range(0, len(positions), self.block_size):
+            block = positions[start:start + self.block_size]
+            dx = x[None, :] - block[:, 0, None]
+            dy = y[None, :] - block[:, 1, None]
+            distance = np.sqrt(dx*dx + dy*dy)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                coefficient = factor(distance)
+            coefficient[distance == 0] = 0
+            forces[start:start + self.block_size] = (
+                coefficient @ positions - coefficient.sum(axis=1)[:, None]*block
+                )
+        return forces
+
+    # for each edge (A, B), adds factor(distance(A, B))*(B - A) to the force
+    # of A, and the opposite to the force of B
+    def edge_forces(self, edges, factor, forces):
+        delta = self.positions[edges[:, 1]] - self.positions[edges[:, 0]]
+        distance = np.hypot(delta[:, 0], delta[:, 1])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            coefficient = factor(distance)
+        coefficient[distance == 0] = 0
+        force = coefficient[:, None]*delta
+        np.add.at(forces, edges[:, 0], force)
+        np.add.at(forces, edges[:, 1], -force)
+
+    ## 1) Eades algorithm (spring layout)
+
+    # We use the following constants:
+    # - cf is the Coulomb factor (repulsive force factor)
+    # - k is the spring constant (stiffness of the spring)
+    # - sf is the speed factor
+    # - L0 is the equilibrium length
+
+    def spring_layout(self, cf, k, sf, L0):
+        forces = self.pairwise_forces(lambda d: -cf/(d*d*d))
+        self.edge_forces(self.pairs, lambda d: k*(d - L0)/d, forces)
+        self.velocities = np.clip(0.5*self.velocities + 0.2*forces, -100, 100)
+        self.positions += self.velocities*sf
+
+    ## 2) Fruchterman-Reingold algorithm
+
+    # opd is the optimal distance between nodes
+
+    def fruchterman_reingold_layout(self, opd=0):
+        if not len(self.positions):
+            return
+        if not opd:
+            opd = np.sqrt(500*500/len(self.positions))
+        forces = self.pairwise_forces(lambda d: -opd*opd/(d*d))
+        self.edge_forces(self.edges, lambda d: d/opd, forces)
+        self.velocities = forces
+        # the displacement of a node is the square root of its velocity
+        speed = np.hypot(forces[:, 0], forces[:, 1])
+        moving = speed > 0
+        self.positions[moving] += forces[moving]/np.sqrt(speed[moving])[:, None]
@@ -12,10 +12,11 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+from collections import deque
 from miscellaneous.decorators import update_paths
 from objects.objects import *
 from os.path import join
-from PyQt5.QtCore import Qt, QSize
+from PyQt5.QtCore import Qt, QSize, QThread, pyqtSignal
 from PyQt5.QtGui import (
                          QIcon,
                          QColor, 
@@ -58,3 +59,44 @@ class SpringLayoutParametersWindow(QWidget):
         
     def get_values(self):
         return (float(line_edit.text()) for line_edit in self.line_edits)
+        
+# The layout worker runs a force-directed layout algorithm (see 
+# miscellaneous/force_layout.py) in a thread, so that the GUI is not frozen
+# while the layout of a large network is computed. After each iteration,
+# it sends the positions of the nodes to the view ('moved' signal), unless
+# the view has not yet applied the previous positions ('pending'): the view
+# receives the positions in batches, at the rate at which it can draw them.
+# The parameters of the algorithm can be changed while it runs.
+# The view sends back the positions of the nodes the user moved ('moves',
+# a queue of (indices, positions)): they are applied before the next batch
+# is sent, so that the nodes do not snap back to their former position.
+# The worker belongs to the view ('parent'): once stopped, it is deleted by
+# Qt after the signals it sent have been processed.
+
+class LayoutWorker(QThread):
+    
+    moved = pyqtSignal(object)
+    
+    def __init__(self, parent, layout, algorithm, parameters=()):
+        super().__init__(parent)
+        self.layout = layout
+        self.algorithm = getattr(layout, algorithm)
+        self.parameters = parameters
+        self.moves = deque()
+        self.pending = self.stopped = False
+        
+    def run(self):
+        while not self.stopped:
+            self.algorithm(*self.parameters)
+            if not self.pending:
+                while self.moves:
+                    self.layout.move(*self.moves.popleft())
+                self.pending = True
+                self.moved.emit(self.layout.positions.copy())
+            # one iteration per millisecond at most
+            self.msleep(1)
+            
+    def stop(self):
+        self.stopped = True
+        self.wait()
+        self.deleteLater()
@@ -0,0 +1,70 @@
+# Copyright (C) 2017 Antoine Fourmy <antoine dot fourmy at gmail dot com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import re
+from ast import literal_eval
+from functools import lru_cache
+
+# Parser of the lists and sets exported in Excel and YAML cells, as written
+# by str(): "['router1', 'router2']", "{'Cisco'}", "set()"...
+# These strings used to be evaluated with eval, which can run any code
+# contained in an imported file, and is slow.
+# - flat collections of quoted strings and numbers (the usual case) are
+# parsed with a regular expression
+# - anything else (escaped quotes, nested collections...) is parsed by
+# ast.literal_eval, which only accepts Python literals
+# The result is a tuple, memoised: identical cells (vendor lists, the
+# nodes of an area...) are parsed only once. The callers build a new list
+# or set from it, as the objects must not share their collections.
+
+item = re.compile(r'''\s*('[^'\\]*'|"[^"\\]*"|[\w.+-]+)\s*(?:,|$)''')
+
+brackets = {'[': ']', '{': '}', '(': ')'}
+
+constants = {'True': True, 'False': False, 'None': None}
+
+def parse_item(token):
+    if token[0] in '\'"':
+        return token[1:-1]
+    if token in constants:
+        return constants[token]
+    try:
+        return int(token)
+    except ValueError:
+        return float(token)
+
+@lru_cache(maxsize=4096)
+def parse_collection(text):
+    text = text.strip()
+    if text == 'set()':
+        return ()
+    if len(text) < 2 or brackets.get(text[0]) != text[-1]:
+        raise ValueError('not a list or a set: {}'.format(text))
+    inner, values, position = text[1:-1].strip(), [], 0
+    while position < len(inner):
+        match = item.match(inner, position)
+        if not match:
+            break
+        try:
+            values.append(parse_item(match.group(1)))
+        except ValueError:
+            break
+        position = match.end()
+    else:
+        return tuple(values)
+    values = literal_eval(text)
+    # '{}' is a dictionnary for python, but an empty set for pyNMS
+    if not isinstance(values, (list, set, tuple, dict)):
+        raise ValueError('not a list or a set: {}'.format(text))
+    return tuple(values)
@@ -0,0 +1,82 @@
+# Copyright (C) 2017 Antoine Fourmy <antoine dot fourmy at gmail dot com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import builtins
+import sys
+from collections import OrderedDict
+from contextlib import contextmanager
+from time import perf_counter
+
+# Startup-time report: time spent importing each module and creating each
+# widget. Measures can be nested (a widget whose module is imported when it
+# is created, a module importing other modules): each measure only counts
+# its own time, without the time of the measures nested in it.
+# Module imports are timed by replacing __import__ between 'start' and
+# 'stop' (see main.py, '--startup-report' option).
+
+class StartupReport(object):
+
+    def __init__(self):
+        # category ('module', 'widget') -> list of (name, time in seconds)
+        self.timings = OrderedDict((('module', []), ('widget', [])))
+        # time of the measures nested in each measure in progress
+        self.nested = []
+        self.builtin_import = None
+
+    @contextmanager
+    def measure(self, category, name):
+        self.nested.append(0.)
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            duration = perf_counter() - start
+            nested = self.nested.pop()
+            if self.nested:
+                self.nested[-1] += duration
+            self.timings[category].append((name, duration - nested))
+
+    def timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        # modules already imported are not measured
+        if not level and name in sys.modules:
+            return self.builtin_import(name, globals, locals, fromlist, level)
+        # relative imports are reported with the name of their package
+        module = name
+        if level and globals:
+            module = '.'.join(filter(None, (globals.get('__package__'), name)))
+        with self.measure('module', module):
+            return self.builtin_import(name, globals, locals, fromlist, level)
+
+    def start(self):
+        self.builtin_import = builtins.__import__
+        builtins.__import__ = self.timed_import
+
+    def stop(self):
+        builtins.__import__ = self.builtin_import
+
+    # the report lists, for each category, the total time and the 'limit'
+    # slowest modules / widgets
+    def report(self, limit=15):
+        lines = []
+        for category, timings in self.timings.items():
+            total = sum(duration for _, duration in timings)
+            lines.append('{} ({} measures): {:.3f}s'.format(
+                                                        category,
+                                                        len(timings),
+                                                        total
+                                                        ))
+            slowest = sorted(timings, key=lambda timing: -timing[1])[:limit]
+            for name, duration in slowest:
+                lines.append('    {:<50} {:.3f}s'.format(name, duration))
+        return '\n'.join(lines)
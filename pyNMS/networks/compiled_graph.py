@@ -0,0 +1,235 @@
+# Copyright (C) 2017 Antoine Fourmy <antoine dot fourmy at gmail dot com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import warnings
+from heapq import heappop, heappush
+
+# numpy is imported the first time a graph is compiled, and not when the
+# module is imported: np is None until then, and False if numpy is missing
+np = None
+
+def load_numpy():
+    global np
+    if np is None:
+        try:
+            import numpy
+            np = numpy
+        except ImportError:
+            warnings.warn('Package missing: the compiled topology view is disabled')
+            np = False
+    return np
+
+# A compiled graph is a read-only, array-backed snapshot of the adjacency of
+# a Graph, in CSR (compressed sparse row) format:
+# - nodes are mapped to contiguous integer indices
+# - for each link type, 'offsets' is an array of size N + 1 such that the
+# edges leaving the node of index i are the positions offsets[i] to
+# offsets[i + 1] of the 'targets' (index of the neighbor) and 'edges' (index
+# of the link in 'links') arrays
+# Each link appears twice in the arrays (once per direction): 'forward' tells
+# whether the edge goes from the source to the destination of the link.
+# The snapshot is built lazily, per link type, and is thrown away by the
+# Graph as soon as the topology changes (node / link creation or deletion).
+# Per-edge weights are not part of the snapshot, as they can be edited
+# without changing the topology: they are extracted with one pass over the
+# links, instead of one function call per relaxed edge, and the costs are
+# kept until the 'cost' version of the graph changes.
+# The node and edge masks of the last allowed sets of a query are kept as
+# well, keyed on the identity of the sets: an allowed set must not be 
+# modified once it was used in a query.
+
+class CSRAdjacency(object):
+
+    def __init__(self, graph, link_type, nodes, index):
+        self.links = list(graph.pn[link_type].values())
+        link_index = {link: idx for idx, link in enumerate(self.links)}
+        offsets, targets, edges, forward = [0], [], [], []
+        for node in nodes:
+            adjacency = graph.graph.get(node.id, {}).get(link_type, ())
+            for neighbor, link in adjacency:
+                targets.append(index[neighbor.id])
+                edges.append(link_index[link])
+                forward.append(link.source == node)
+            offsets.append(len(targets))
+        self.offsets = np.array(offsets, dtype=np.int64)
+        self.targets = np.array(targets, dtype=np.int64)
+        self.edges = np.array(edges, dtype=np.int64)
+        self.forward = np.array(forward, dtype=bool)
+        # index of the node each edge is leaving from
+        self.sources = np.repeat(
+                                 np.arange(len(nodes), dtype=np.int64),
+                                 np.diff(self.offsets)
+                                 )
+
+class CompiledGraph(object):
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.nodes = list(graph.nodes.values())
+        # node ID -> index in the arrays
+        self.index = {node.id: idx for idx, node in enumerate(self.nodes)}
+        self.adjacencies = {}
+        # (link type, property) -> (cost version, weights)
+        self.weights_cache = {}
+        # link type (None for the nodes) -> (allowed set, mask)
+        self.masks_cache = {}
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def adjacency(self, link_type):
+        if link_type not in self.adjacencies:
+            self.adjacencies[link_type] = CSRAdjacency(
+                                                       self.graph,
+                                                       link_type,
+                                                       self.nodes,
+                                                       self.index
+                                                       )
+        return self.adjacencies[link_type]
+
+    # properties whose edition always bumps the 'cost' version of the graph:
+    # the traffic and the flows are changed by the routing and flow
+    # algorithms without any version bump, and are never cached
+    cached_properties = ('cost',)
+
+    # returns an array of the directed value of a property for all edges.
+    def weights(self, link_type, property='cost'):
+        if property not in self.cached_properties:
+            return self.extract_weights(link_type, property)
+        version = self.graph.versions['cost']
+        cached = self.weights_cache.get((link_type, property))
+        if not cached or cached[0] != version:
+            weights = self.extract_weights(link_type, property)
+            cached = self.weights_cache[(link_type, property)] = version, weights
+        return cached[1]
+
+    # Directed properties (cost, capacity, traffic...) are stored as
+    # property + 'SD' / property + 'DS' on physical links: we read both
+    # once per link, then select the right one with the 'forward' mask.
+    def extract_weights(self, link_type, property):
+        adj = self.adjacency(link_type)
+        try:
+            SD = np.array([getattr(l, property + 'SD') for l in adj.links], float)
+            DS = np.array([getattr(l, property + 'DS') for l in adj.links], float)
+        except AttributeError:
+            # not a directed property: we fall back on the link's own call
+            return np.array([
+                             adj.links[e](property, self.nodes[s])
+                             for e, s in zip(adj.edges.tolist(), adj.sources.tolist())
+                             ], float)
+        return np.where(adj.forward, SD[adj.edges], DS[adj.edges])
+
+    # boolean masks built from sets of allowed nodes / links
+
+    def cached_mask(self, key, allowed, build):
+        cached = self.masks_cache.get(key)
+        if not cached or cached[0] is not allowed:
+            cached = self.masks_cache[key] = allowed, build()
+        return cached[1]
+
+    def node_mask(self, allowed_nodes=None):
+        def build():
+            if allowed_nodes is None:
+                return np.ones(len(self.nodes), dtype=bool)
+            mask = np.zeros(len(self.nodes), dtype=bool)
+            mask[[self.index[n.id] for n in allowed_nodes if n.id in self.index]] = True
+            return mask
+        return self.cached_mask(None, allowed_nodes, build)
+
+    def edge_mask(self, link_type, allowed_links=None):
+        adj = self.adjacency(link_type)
+        def build():
+            if allowed_links is None:
+                return np.ones(len(adj.edges), dtype=bool)
+            link_mask = np.array([l in allowed_links for l in adj.links], dtype=bool)
+            return link_mask[adj.edges]
+        return self.cached_mask(link_type, allowed_links, build)
+
+    ## Graph algorithms on the compiled view
+
+    # Dijkstra algorithm: we return the distance array, the index of the
+    # predecessor of each node and the index of the edge used to reach it
+    # (-1 if the node isn't reached)
+    def dijkstra(
+                 self,
+                 source,
+                 link_type = 'plink',
+                 property = 'cost',
+                 allowed_nodes = None,
+                 allowed_links = None
+                 ):
+        adj = self.adjacency(link_type)
+        n = len(self.nodes)
+        # the arrays are converted to lists once: indexing a list from python
+        # code is much faster than indexing a numpy array
+        offsets, targets = adj.offsets.tolist(), adj.targets.tolist()
+        weights = self.weights(link_type, property).tolist()
+        allowed_node = self.node_mask(allowed_nodes).tolist()
+        allowed_edge = self.edge_mask(link_type, allowed_links).tolist()
+        dist = [float('inf')] * n
+        prec_node, prec_edge = [-1] * n, [-1] * n
+        visited = [False] * n
+        src = self.index[source.id]
+        dist[src] = 0
+        heap = [(0, src)]
+        while heap:
+            dist_node, node = heappop(heap)
+            if visited[node]:
+                continue
+            visited[node] = True
+            for edge in range(offsets[node], offsets[node + 1]):
+                neighbor = targets[edge]
+                if not (allowed_node[neighbor] and allowed_edge[edge]):
+                    continue
+                dist_neighbor = dist_node + weights[edge]
+                if dist_neighbor < dist[neighbor]:
+                    dist[neighbor] = dist_neighbor
+                    prec_node[neighbor] = node
+                    prec_edge[neighbor] = edge
+                    heappush(heap, (dist_neighbor, neighbor))
+        return dist, prec_node, prec_edge
+
+    # traceback of the links from the source to the target, using the
+    # predecessor arrays returned by the dijkstra function above
+    def path(self, link_type, prec_node, prec_edge, target):
+        adj = self.adjacency(link_type)
+        curr, path = self.index[target.id], []
+        while prec_edge[curr] != -1:
+            path.append(adj.links[adj.edges[prec_edge[curr]]])
+            curr = prec_node[curr]
+        return path[::-1]
+
+    # returns the indices of all nodes reachable from the source
+    def reachable(self, source, link_type='plink', seen=None):
+        adj = self.adjacency(link_type)
+        offsets, targets = adj.offsets.tolist(), adj.targets.tolist()
+        if seen is None:
+            seen = [False] * len(self.nodes)
+        src = self.index[source.id]
+        seen[src], stack, component = True, [src], [src]
+        while stack:
+            node = stack.pop()
+            for neighbor in targets[offsets[node]:offsets[node + 1]]:
+                if not seen[neighbor]:
+                    seen[neighbor] = True
+                    stack.append(neighbor)
+                    component.append(neighbor)
+        return component
+
+    def connected_components(self, link_type='plink'):
+        seen = [False] * len(self.nodes)
+        for idx, node in enumerate(self.nodes):
+            if not seen[idx]:
+                component = self.reachable(node, link_type, seen)
+                yield {self.nodes[i] for i in component}
@@ -0,0 +1,183 @@
+# Copyright (C) 2017 Antoine Fourmy <antoine dot fourmy at gmail dot com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import multiprocessing
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from miscellaneous.fib import contains
+from miscellaneous.network_functions import toip
+
+# Failure sweep engine used for the worst-case dimensioning of the physical
+# links: each failure scenario (a set of physical links that fail together,
+# e.g a shared risk link group) is simulated, and for each physical link
+# and direction, we keep the highest traffic over all scenarios, as well as
+# the scenario that induces it.
+# All scenarios share one baseline (routing tables and traffic routing
+# without failure):
+# - the routing tables are updated incrementally when the physical links of
+# a scenario fail, and rolled back afterwards
+# - the traffic load of each routed traffic is computed once, and an
+# inverted index associates a physical link or a router to the traffics 
+# whose baseline path crosses it. In a scenario, only the traffics that
+# cross a failed physical link, or a router whose route toward their 
+# destination changed, are re-routed: the path of all other traffics, and
+# therefore their load, is unchanged.
+# Scenarios are spread across worker processes: the workers are forked once
+# the baseline is computed, so that they inherit it instead of receiving a
+# copy of the network. The worker results are reduced in scenario order.
+
+class FailureSweep(object):
+
+    def __init__(self, network, scenarios):
+        self.network = network
+        self.scenarios = [tuple(scenario) for scenario in scenarios]
+        # routed traffic -> (plink, direction) -> traffic load
+        self.loads = {}
+        # plink or router -> traffics whose baseline path crosses it
+        self.index = defaultdict(set)
+        # routed traffic -> destination address (integer)
+        self.destinations = {}
+        # (plink, direction) -> baseline traffic load
+        self.baseline = defaultdict(float)
+        # routed traffic -> baseline path
+        self.paths = {}
+
+    def routed_traffics(self):
+        for traffic in self.network.traffics.values():
+            src, dest = traffic.source, traffic.destination
+            if all(node.subtype == 'router' for node in (src, dest)):
+                yield traffic
+
+    def compute_baseline(self):
+        self.network.routing_table_creation()
+        self.network.path_finder()
+        self.loads = self.network.traffic_loads(list(self.routed_traffics()))
+        for traffic, load in self.loads.items():
+            self.paths[traffic] = traffic.path
+            if traffic.destination_IP:
+                self.destinations[traffic] = toip(traffic.destination_IP.ip_addr)
+            for obj in traffic.path:
+                self.index[obj].add(traffic)
+            for key, value in load.items():
+                self.baseline[key] += value
+
+    # tells whether one of the routing table keys is a prefix that contains
+    # the destination of the traffic: if it is, the longest prefix match of
+    # the destination may have changed
+    def reaches(self, traffic, keys):
+        if traffic not in self.destinations:
+            return False
+        address = self.destinations[traffic]
+        prefix = self.network.prefix
+        return any(contains(*prefix(key), address) for key in keys)
+
+    # simulate a scenario, and return the traffic load of all directions of
+    # physical links whose load differs from the baseline
+    def simulate(self, scenario):
+        network = self.network
+        changes, journal = defaultdict(set), []
+        traffics = set().union(*(self.index[plink] for plink in scenario))
+        for plink in scenario:
+            plink_changes = network.fail_plink(plink, journal)
+            if plink_changes is None:
+                traffics = set(self.loads)
+                continue
+            for router, keys in plink_changes.items():
+                changes[router] |= keys
+        for router, keys in changes.items():
+            for traffic in self.index[router]:
+                if self.reaches(traffic, keys):
+                    traffics.add(traffic)
+        delta = defaultdict(float)
+        for traffic, load in network.traffic_loads(traffics).items():
+            for key, value in self.loads[traffic].items():
+                delta[key] -= value
+            for key, value in load.items():
+                delta[key] += value
+        network.rollback_failures(journal, *scenario)
+        return {key: self.baseline[key] + value for key, value in delta.items()}
+
+    # simulate a chunk of scenarios: the result is, for each direction of
+    # a physical link, the list of (scenario index, traffic load) for all
+    # scenarios where it differs from the baseline
+    def simulate_chunk(self, indices):
+        results = defaultdict(list)
+        for idx in indices:
+            for (plink, dir), value in self.simulate(self.scenarios[idx]).items():
+                results[(plink.id, dir)].append((idx, value))
+        return dict(results)
+
+    def run(self, processes=1):
+        self.compute_baseline()
+        chunks = [
+                  range(i, len(self.scenarios), processes)
+                  for i in range(processes)
+                  ]
+        if processes > 1 and 'fork' in multiprocessing.get_all_start_methods():
+            global current_sweep
+            current_sweep = self
+            context = multiprocessing.get_context('fork')
+            with ProcessPoolExecutor(processes, mp_context=context) as pool:
+                results = list(pool.map(simulate_chunk, chunks))
+            current_sweep = None
+        else:
+            results = [self.simulate_chunk(range(len(self.scenarios)))]
+        self.reduce(results)
+        # the network is left in its baseline state
+        self.network.reset_traffic()
+        for (plink, dir), value in self.baseline.items():
+            setattr(plink, 'traffic' + dir, value)
+        for traffic, path in self.paths.items():
+            traffic.path = path
+
+    # the worst-case traffic is the highest traffic load over all scenarios:
+    # for the scenarios where the load of a direction of a physical link
+    # doesn't change, it is the baseline load.
+    # As in a sequential sweep, the worst-case failure is the first scenario
+    # that induces the worst-case traffic, and when both directions increase,
+    # the latest of the two scenarios.
+    def reduce(self, results):
+        changes = defaultdict(list)
+        for result in results:
+            for key, values in result.items():
+                changes[key].extend(values)
+        events = defaultdict(list)
+        for plink in self.network.plinks.values():
+            for order, dir in enumerate(('SD', 'DS')):
+                values = changes.get((plink.id, dir), [])
+                changed = {idx for idx, _ in values}
+                unchanged = next(
+                                 (
+                                 idx for idx in range(len(self.scenarios))
+                                 if idx not in changed
+                                 ),
+                                 None
+                                 )
+                if unchanged is not None:
+                    values.append((unchanged, self.baseline[(plink, dir)]))
+                if not values:
+                    continue
+                idx, value = min(values, key=lambda value: (-value[1], value[0]))
+                if value > getattr(plink, 'wctraffic' + dir):
+                    setattr(plink, 'wctraffic' + dir, value)
+                    events[plink].append((idx, order))
+        for plink, plink_events in events.items():
+            idx, _ = max(plink_events)
+            plink.wcfailure = ', '.join(map(str, self.scenarios[idx]))
+
+# the sweep being computed, inherited by the forked worker processes
+current_sweep = None
+
+def simulate_chunk(indices):
+    return current_sweep.simulate_chunk(indices)
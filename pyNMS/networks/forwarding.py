@@ -0,0 +1,127 @@
+# Copyright (C) 2017 Antoine Fourmy <antoine dot fourmy at gmail dot com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from collections import defaultdict
+from miscellaneous.network_functions import toip
+
+# Forwarding DAG toward one destination (destination router and IP address).
+# Forwarding a data flow only depends on its destination: at a router, the
+# ECMP routes of the longest prefix match of the destination address, and
+# at a switch, the switching table entry of the destination MAC address set
+# by the last router. All traffics sent toward the same destination
+# therefore follow the same DAG, whose vertices are the states of a data
+# flow: (router, None) or (switch, destination MAC address).
+# The DAG is built once, from the sources of all traffics of the group, and
+# the throughputs of all traffics are spread along it in a single pass in
+# topological order.
+
+class ForwardingDAG(object):
+
+    def __init__(self, network, destination, dst_ip):
+        self.network = network
+        self.destination = destination
+        self.dst_address = toip(dst_ip.ip_addr)
+        # state -> list of (exit physical link, direction, next state,
+        # number of ECMP routes the throughput is shared between)
+        self.edges = {}
+        # states of routers without any route toward the destination
+        self.dead_ends = set()
+        self.order = None
+
+    def state(self, node, dst_mac):
+        return (node, dst_mac if node.subtype == 'switch' else None)
+
+    def successors(self, state):
+        node, dst_mac = state
+        if node == self.destination:
+            return []
+        if node.subtype == 'router':
+            routes = self.network.fib(node).lookup(self.dst_address)
+            # as in RFT_path_finder, the routes whose exit physical link is
+            # in failure are ignored
+            routes = [r for r in routes or () if r[-1] not in self.network.failed_obj]
+            if not routes:
+                self.dead_ends.add(state)
+                return []
+            successors = []
+            for _, nh_ip, _, _, _, ex_tk in routes:
+                sd = (node == ex_tk.source)*'SD' or 'DS'
+                next_hop = ex_tk.source if sd == 'DS' else ex_tk.destination
+                next_state = self.state(next_hop, node.arpt[nh_ip][0])
+                successors.append((ex_tk, sd, next_state, len(routes)))
+            return successors
+        if node.subtype == 'switch':
+            ex_tk = node.st[dst_mac].link
+            sd = (node == ex_tk.source)*'SD' or 'DS'
+            next_hop = ex_tk.source if sd == 'DS' else ex_tk.destination
+            return [(ex_tk, sd, self.state(next_hop, dst_mac), 1)]
+        return []
+
+    # add all states reachable from a source to the DAG
+    def expand(self, source):
+        stack = [(source, None)]
+        while stack:
+            state = stack.pop()
+            if state in self.edges:
+                continue
+            self.edges[state] = self.successors(state)
+            stack.extend(next_state for *_, next_state, _ in self.edges[state])
+        self.order = None
+
+    # topological order of the states (Kahn), or None if there is a
+    # forwarding loop
+    def topological_order(self):
+        if self.order is None:
+            in_degree = defaultdict(int)
+            for successors in self.edges.values():
+                for *_, next_state, _ in successors:
+                    in_degree[next_state] += 1
+            stack = [state for state in self.edges if not in_degree[state]]
+            order = []
+            while stack:
+                state = stack.pop()
+                order.append(state)
+                for *_, next_state, _ in self.edges[state]:
+                    in_degree[next_state] -= 1
+                    if not in_degree[next_state]:
+                        stack.append(next_state)
+            self.order = order if len(order) == len(self.edges) else None
+        return self.order
+
+    # for each state, the nodes and physical links of the path from that
+    # state, and whether that path reaches a router without route
+    def reach(self):
+        objects, dead = {}, {}
+        for state in reversed(self.order):
+            objects[state] = {state[0]}
+            dead[state] = state in self.dead_ends
+            for ex_tk, _, next_state, _ in self.edges[state]:
+                objects[state].add(ex_tk)
+                objects[state] |= objects[next_state]
+                dead[state] |= dead[next_state]
+        return objects, dead
+
+    # spread throughputs ({state: throughput}) along the DAG: the result
+    # is the load of each direction of each physical link
+    def spread(self, throughputs):
+        load = defaultdict(float)
+        for state in self.order:
+            throughput = throughputs.get(state)
+            if not throughput:
+                continue
+            for ex_tk, sd, next_state, count in self.edges[state]:
+                share = throughput / count
+                load[(ex_tk, sd)] += share
+                throughputs[next_state] = throughputs.get(next_state, 0) + share
+        return load
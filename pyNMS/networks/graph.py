@@ -12,13 +12,34 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import gc
 from objects.objects import *
+from .compiled_graph import CompiledGraph, load_numpy
 from collections import defaultdict
+from functools import wraps
 from math import sqrt
+from miscellaneous.literals import parse_collection
+
+# the garbage collector is paused while many objects are created at once:
+# the new objects are not garbage, and a collection would be triggered 
+# every few hundred objects
+def gc_paused(function):
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            if gc_enabled:
+                gc.enable()
+    return wrapper
 
 class Graph(object):
     
-    def __init__(self, view):
+    # 'view' is the view displaying the graph, or None for a graph used
+    # without GUI
+    def __init__(self, view=None):
         self.nodes = {}
         self.links = {}
         
@@ -27,6 +48,15 @@ class Graph(object):
                    
         self.view = view
         self.graph = defaultdict(lambda: defaultdict(set))
+        # per-subtype indexes, kept up to date by the factories and removal
+        # methods, so that filtering by subtype costs O(result) instead
+        # of O(pool):
+        # - spn ('subtype pool network') associates a subtype to the 
+        # objects of that subtype (id -> object, or interface -> interface)
+        # - sgraph ('subtype graph') is the same as graph, with the 
+        # adjacency of a node bucketed per link subtype instead of type
+        self.spn = defaultdict(dict)
+        self.sgraph = defaultdict(lambda: defaultdict(set))
         self.cpt_link = self.cpt_node = self.cpt_AS = 1
         # useful for tests and listbox when we want to retrieve an object
         # based on its name. The only object that needs changing when a object
@@ -36,22 +66,71 @@ class Graph(object):
         # set of all objects in failure: this parameter is used for
         # link dimensioning and failure simulation
         self.failed_obj = set()
+        
+        # array-backed (CSR) view of the topology, built on demand by
+        # 'compile' and thrown away whenever a node or a link is created 
+        # or deleted
+        self.compiled_graph = None
+
+        # monotonically increasing version counters of the inputs of the
+        # derived structures (virtual connections, interfaces, switching and
+        # routing tables, traffic paths):
+        # - 'topology' is bumped when a node, a link or an AS membership
+        # is created or deleted
+        # - 'cost' is bumped when a property of an object is edited (the
+        # cost of a link, but also its capacity, a traffic throughput, etc)
+        # - 'failure' is bumped when the set of failed objects changes
+        self.versions = dict.fromkeys(('topology', 'cost', 'failure'), 0)
+        
+        # objects created ('added'), deleted ('removed') or whose properties
+        # changed ('modified') since the view last refreshed its display: 
+        # the view only redraws these objects. Nothing is recorded for a 
+        # graph without view.
+        self.dirty = {'added': set(), 'removed': set(), 'modified': set()}
 
-    # function filtering pn to retrieve all objects of given subtypes
+    # increase the version of one or several inputs
+    def bump(self, *inputs):
+        for input in inputs:
+            self.versions[input] += 1
+            
+    # record objects to be redrawn by the view
+    def mark(self, state, *objects):
+        if self.view is None:
+            return
+        # a deleted object must not be drawn
+        if state == 'removed':
+            self.dirty['added'].difference_update(objects)
+            self.dirty['modified'].difference_update(objects)
+        self.dirty[state].update(objects)
+
+    # add objects to / remove objects from the per-subtype indexes
+    def index(self, *objects):
+        for obj in objects:
+            key = obj if obj.type == 'interface' else obj.id
+            self.spn[obj.subtype][key] = obj
+            
+    def unindex(self, *objects):
+        for obj in objects:
+            key = obj if obj.type == 'interface' else obj.id
+            self.spn[obj.subtype].pop(key, None)
+    
+    # function retrieving all objects of given subtypes from the index
     def ftr(self, type, *sts):
-        keep = lambda r: r.subtype in sts
-        if type == 'interface':
-            return filter(keep, self.pn[type])
-        else:
-            return filter(keep, self.pn[type].values())
+        for subtype in sts:
+            # the index is copied so that objects can be deleted while 
+            # iterating
+            yield from tuple(self.spn.get(subtype, {}).values())
         
-    # function filtering graph to retrieve all links of given subtypes
-    # attached to the source node. 
+    # function retrieving all links of given subtypes attached to the 
+    # source node from the per-subtype adjacency buckets.
     # if ud (undirected) is set to True, we retrieve all links of the 
     # corresponding subtypes, else we check that 'src' is the source
     def gftr(self, src, type, *sts, ud=True):
-        keep = lambda r: r[1].subtype in sts and (ud or r[1].source == src)
-        return filter(keep, self.graph[src.id][type])
+        adjacency = self.sgraph.get(src.id, {})
+        for subtype in sts:
+            for neighbor, link in adjacency.get(subtype, ()):
+                if ud or link.source == src:
+                    yield neighbor, link
           
     # 'lf' is the link factory. Creates or retrieves any type of link
     def lf(self, subtype='ethernet link', id=None, name=None, **kwargs):
@@ -61,6 +140,7 @@ class Graph(object):
             if name in self.name_to_id:
                 link = self.pn[link_type][self.name_to_id[name]]
                 link.update_properties(kwargs)
+                self.mark('modified', link)
                 return link
             s, d = kwargs['source'], kwargs['destination']
             id = self.cpt_link
@@ -68,15 +148,29 @@ class Graph(object):
                 name = subtype + str(self.cpt_link)
             kwargs.update({'id': id, 'name': name})
             new_link = link_class_with_vc[subtype](**kwargs)
-            self.name_to_id[name] = id
-            self.pn[link_type][id] = new_link
-            self.graph[s.id][link_type].add((d, new_link))
-            self.graph[d.id][link_type].add((s, new_link))
-            if subtype in ('ethernet link', 'optical link'):
-                self.interfaces |= {new_link.interfaceS, new_link.interfaceD}
+            self.register_link(new_link)
             self.cpt_link += 1
+            self.compiled_graph = None
+            self.bump('topology')
+            self.mark('added', new_link)
         return self.pn[link_type][id]
         
+    # add a link created outside of the link factory (its id and name are 
+    # set) to the pools, the adjacency and the indexes
+    def register_link(self, link):
+        s, d, subtype = link.source, link.destination, link.subtype
+        self.name_to_id[link.name] = link.id
+        self.pn[link.type][link.id] = link
+        self.graph[s.id][link.type].add((d, link))
+        self.graph[d.id][link.type].add((s, link))
+        self.sgraph[s.id][subtype].add((d, link))
+        self.sgraph[d.id][subtype].add((s, link))
+        self.index(link)
+        if subtype in ('ethernet link', 'optical link'):
+            self.interfaces.add(link.interfaceS)
+            self.interfaces.add(link.interfaceD)
+            self.index(link.interfaceS, link.interfaceD)
+        
     # 'nf' is the node factory. Creates or retrieves any type of nodes
     def nf(self, subtype='router', id=None, **kwargs):
         if 'name' not in kwargs:
@@ -86,14 +180,124 @@ class Graph(object):
             if kwargs['name'] in self.name_to_id:
                 node = self.nodes[self.name_to_id[kwargs['name']]]
                 node.update_properties(kwargs)
+                self.mark('modified', node)
                 return node
         id = self.cpt_node
         kwargs['id'] = id
-        self.nodes[id] = node_class[subtype](**kwargs)
-        self.name_to_id[kwargs['name']] = id
+        self.register_node(node_class[subtype](**kwargs))
         self.cpt_node += 1
+        self.compiled_graph = None
+        self.bump('topology')
+        self.mark('added', self.nodes[id])
         return self.nodes[id]
         
+    # add a node created outside of the node factory (its id and name are 
+    # set) to the pool and the indexes
+    def register_node(self, node):
+        self.nodes[node.id] = node
+        self.index(node)
+        self.name_to_id[node.name] = node.id
+
+    # Bulk factories: create many objects of a subtype at once (graph
+    # generation, multiple object creation, import of a file).
+    # - the objects are built by an object builder (see objects/objects.py)
+    # instead of the initializer
+    # - the ids are assigned in one block, and the new objects are added to
+    # the pools and indexes with one update per pool (a dictionnary updated
+    # with another dictionnary is resized once)
+    # - the topology version, the compiled graph and the objects to redraw
+    # are updated once for all objects
+    # As with 'nf' and 'lf', a record whose name is already used updates the
+    # object of that name. Both factories return the objects of the records,
+    # in the same order.
+
+    # 'records' is an iterable of dictionnaries of node properties
+    @gc_paused
+    def nodes_bulk(self, subtype, records):
+        records, samples = list(records), {}
+        for record in records:
+            for property, value in record.items():
+                samples.setdefault(property, value)
+        build = ObjectBuilder(node_class[subtype], samples, convert=True)
+        # new nodes, by name and by id
+        names, created = {}, {}
+        nodes, id = [], self.cpt_node
+        for record in records:
+            name = record.get('name') or subtype + str(id)
+            if name in names or name in self.name_to_id:
+                node = names.get(name) or self.nodes[self.name_to_id[name]]
+                node.update_properties(record)
+                self.mark('modified', node)
+            else:
+                node = build(dict(record, id=id, name=name))
+                names[name] = created[id] = node
+                id += 1
+            nodes.append(node)
+        if created:
+            self.cpt_node = id
+            self.nodes.update(created)
+            self.spn[subtype].update(created)
+            self.name_to_id.update((name, node.id) for name, node in names.items())
+            self.compiled_graph = None
+            self.bump('topology')
+            self.mark('added', *created.values())
+        return nodes
+
+    # the source and destination of the i-th link are the nodes of id
+    # src_ids[i] and dst_ids[i]. 'props' is an optional iterable of
+    # dictionnaries of link properties, one per link
+    @gc_paused
+    def links_bulk(self, subtype, src_ids, dst_ids, props=None):
+        link_type, nodes = subtype_to_type[subtype], self.nodes
+        records = []
+        for index, (s, d) in enumerate(zip(src_ids, dst_ids)):
+            record = dict(props[index]) if props else {}
+            record.update(source=nodes[s], destination=nodes[d])
+            records.append(record)
+        samples = {}
+        for record in records:
+            for property, value in record.items():
+                samples.setdefault(property, value)
+        build = ObjectBuilder(link_class_with_vc[subtype], samples, convert=True)
+        names, created = {}, {}
+        links, id = [], self.cpt_link
+        for record in records:
+            name = record.get('name')
+            if name and (name in names or name in self.name_to_id):
+                link = names.get(name) or self.pn[link_type][self.name_to_id[name]]
+                link.update_properties(record)
+                self.mark('modified', link)
+            else:
+                name = name or subtype + str(id)
+                link = build(dict(record, id=id, name=name))
+                names[name] = created[id] = link
+                id += 1
+            links.append(link)
+        if not created:
+            return links
+        self.cpt_link = id
+        self.pn[link_type].update(created)
+        self.spn[subtype].update(created)
+        self.name_to_id.update((name, link.id) for name, link in names.items())
+        graph, sgraph = self.graph, self.sgraph
+        for link in created.values():
+            s, d = link.source, link.destination
+            graph[s.id][link_type].add((d, link))
+            graph[d.id][link_type].add((s, link))
+            sgraph[s.id][subtype].add((d, link))
+            sgraph[d.id][subtype].add((s, link))
+        if subtype in ('ethernet link', 'optical link'):
+            interfaces = [
+                          interface for link in created.values()
+                          for interface in (link.interfaceS, link.interfaceD)
+                          ]
+            self.interfaces.update(interfaces)
+            self.index(*interfaces)
+        self.compiled_graph = None
+        self.bump('topology')
+        self.mark('added', *created.values())
+        return links
+
     # 'of' is the object factory: returns a link or a node from its name
     def of(self, name, _type):
         if _type == 'node':
@@ -137,11 +341,11 @@ class Graph(object):
     
     # convert a string representing a set of nodes, to an actual set of nodes
     def convert_node_set(self, node_set):
-        return set(map(self.convert_node, eval(node_set)))
+        return set(map(self.convert_node, parse_collection(node_set)))
     
     # convert a string representing a list of nodes, to an actual list of nodes
     def convert_node_list(self, node_list):
-        return list(map(self.convert_node, eval(node_list)))
+        return list(map(self.convert_node, parse_collection(node_list)))
         
     # convert an iterable of strings representing links, to a generator of links
     def convert_links(self, links):
@@ -150,20 +354,29 @@ class Graph(object):
     # convert a string representing a set of links, to an actual set of links
     def convert_link_set(self, link_set, subtype='ethernet link'):
         convert = lambda link: self.convert_link(link, subtype)
-        return set(map(convert, eval(link_set)))
+        return set(map(convert, parse_collection(link_set)))
     
     # convert a string representing a list of links, to an actual list of links
     def convert_link_list(self, link_list, subtype='ethernet link'):
         convert = lambda link: self.convert_link(link, subtype)
-        return list(map(convert, eval(link_list)))
+        return list(map(convert, parse_collection(link_list)))
             
     def erase_network(self):
+        self.compiled_graph = None
+        self.bump('topology')
+        self.mark('removed', *self.all_nodes(), *self.all_links())
         self.graph.clear()
+        self.sgraph.clear()
+        self.spn.clear()
         for dict_of_objects in self.pn.values():
             dict_of_objects.clear()
             
     def remove_node(self, node):
-        self.nodes.pop(self.name_to_id.pop(node.name))
+        self.unindex(self.nodes.pop(self.name_to_id.pop(node.name)))
+        self.sgraph.pop(node.id, None)
+        self.compiled_graph = None
+        self.bump('topology')
+        self.mark('removed', node)
         # retrieve adj links to delete them 
         dict_of_adj_links = self.graph.pop(node.id, {})
         for type_link, adj_obj in dict_of_adj_links.items():
@@ -174,10 +387,17 @@ class Graph(object):
         # if it is a physical link, remove the link's interfaces from the model
         if link.type == 'plink':
             self.interfaces -= {link.interfaceS, link.interfaceD}
+            self.unindex(link.interfaceS, link.interfaceD)
         # remove the link itself from the model
         self.graph[link.source.id][link.type].discard((link.destination, link))
         self.graph[link.destination.id][link.type].discard((link.source, link))
+        self.sgraph[link.source.id][link.subtype].discard((link.destination, link))
+        self.sgraph[link.destination.id][link.subtype].discard((link.source, link))
+        self.unindex(link)
         self.pn[link.type].pop(self.name_to_id.pop(link.name, None), None)
+        self.compiled_graph = None
+        self.bump('topology')
+        self.mark('removed', link)
             
     def is_connected(self, nodeA, nodeB, link_type, subtype=None):
         if not subtype:
@@ -228,6 +448,15 @@ class Graph(object):
                                                 
     ## Graph functions
     
+    # returns the compiled (CSR) view of the graph, or None if numpy 
+    # is not installed
+    def compile(self):
+        if not load_numpy():
+            return None
+        if self.compiled_graph is None:
+            self.compiled_graph = CompiledGraph(self)
+        return self.compiled_graph
+    
     def bfs(self, source):
         visited = set()
         layer = {source}
@@ -242,6 +471,10 @@ class Graph(object):
                         yield neighbor
     
     def connected_components(self):
+        compiled_graph = self.compile()
+        if compiled_graph:
+            yield from compiled_graph.connected_components()
+            return
         visited = set()
         for node in self.nodes.values():
             if node not in visited:
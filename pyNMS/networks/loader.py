@@ -0,0 +1,230 @@
+# Copyright (C) 2017 Antoine Fourmy <antoine dot fourmy at gmail dot com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import warnings
+from networks.yaml_stream import read_sections
+from objects.objects import *
+try:
+    import xlrd
+except ImportError:
+    warnings.warn('Excel/YAML libraries missing')
+
+# Import of a project (Excel, YAML or snapshot file) in a network, without GUI: the
+# project (GUI) uses it to import a file in its views' networks, and the
+# command-line interface in a headless network.
+# Sites are imported in the site network if there is one, and ignored
+# otherwise.
+
+class ProjectLoader(object):
+
+    # the order in which objects are imported is extremely important:
+    # - nodes must be imported first, before links
+    # - physical links must be imported second, before interface
+    # - interface must be imported third, for IP addresses to be created
+    # at interface import (the interface being specified at IP creation),
+    # else if a traffic link was imported before the interface, the IP
+    # address would be created via the ipS/D parameter and it would have
+    # no attached interface
+    # - then, the remaining links can be imported (routes, traffic)
+    # - AS and area can be imported
+    # - Finally, per-AS object properties can be imported
+    import_order = (
+                    'router',
+                    'switch',
+                    'oxc',
+                    'host',
+                    'antenna',
+                    'regenerator',
+                    'splitter',
+                    'cloud',
+                    'site',
+                    'ethernet link',
+                    'ethernet interface',
+                    'optical link',
+                    'optical interface',
+                    'etherchannel',
+                    'optical channel',
+                    'BGP peering',
+                    'pseudowire',
+                    'routed traffic',
+                    'static traffic',
+                    'AS',
+                    'area',
+                    'per-AS node properties',
+                    'per-AS interface properties',
+                    'sites'
+                    )
+
+    def __init__(self, network, sites=None):
+        self.network = network
+        self.sites = sites
+
+    def import_file(self, filepath):
+        if filepath.endswith(('.xls', '.xlsx')):
+            self.excel_import(filepath)
+        elif filepath.endswith('.pnms'):
+            self.snapshot_import(filepath)
+        else:
+            self.yaml_import(filepath)
+            
+    # the snapshot module depends on the import order of the loader: it is
+    # imported when a snapshot is loaded
+    def snapshot_import(self, filepath):
+        from networks.snapshot import Snapshot
+        Snapshot(filepath).load(self.network, self.sites)
+
+    # the objects of a section are created with the bulk factories (see 
+    # networks/graph.py). 'records' is an iterable of dictionnaries of 
+    # properties, with the source and destination nodes of a link.
+    def create_objects(self, subtype, records):
+        if subtype in node_subtype:
+            if subtype == 'site':
+                if self.sites is not None:
+                    self.sites.nodes_bulk(subtype, records)
+            else:
+                self.network.nodes_bulk(subtype, records)
+        if subtype in link_subtype:
+            records = list(records)
+            self.network.links_bulk(
+                                    subtype,
+                                    [record.pop('source').id for record in records],
+                                    [record.pop('destination').id for record in records],
+                                    records
+                                    )
+
+    # the YAML file is read one object at a time (see networks/yaml_stream.py)
+    # and the objects are created as they are read. A section can only be
+    # created once all sections before it in the import order have been
+    # read: the sections of the exported files are in that order, but older
+    # files have their sections sorted by name, with the links before the
+    # nodes. A section that comes too early is kept until it can be created.
+    def yaml_import(self, filepath):
+        order = [
+                 subtype for subtype in self.import_order 
+                 if subtype in node_subtype or subtype in link_subtype
+                 ]
+        waiting, next_section = {}, 0
+        with open(filepath, 'r') as file:
+            for subtype, objects in read_sections(file):
+                if subtype not in order:
+                    continue
+                if order.index(subtype) > next_section:
+                    waiting[subtype] = list(objects)
+                    continue
+                self.yaml_section(subtype, objects)
+                next_section = max(next_section, order.index(subtype) + 1)
+                while next_section < len(order) and order[next_section] in waiting:
+                    self.yaml_section(order[next_section], waiting.pop(order[next_section]))
+                    next_section += 1
+        for subtype in order:
+            if subtype in waiting:
+                self.yaml_section(subtype, waiting.pop(subtype))
+                
+    def yaml_section(self, subtype, objects):
+        objectizer = self.network.objectizer
+        self.create_objects(subtype, (
+                            {
+                             property_name: objectizer(property_name, value)
+                             for property_name, value in properties.items()
+                             }
+                            for obj, properties in objects
+                            ))
+
+    def excel_import(self, filepath):
+        book = xlrd.open_workbook(filepath)
+        network = self.network
+
+        for name in self.import_order:
+            try:
+                sheet = book.sheet_by_name(name)
+            # if the sheet cannot be found, there's nothing to import
+            except xlrd.biffh.XLRDError:
+                continue
+            # nodes and links import
+            if name in all_subtypes:
+                properties = sheet.row_values(0)
+                self.create_objects(name, (
+                                    network.mass_objectizer(
+                                                            properties, 
+                                                            sheet.row_values(row)
+                                                            )
+                                    for row in range(1, sheet.nrows)
+                                    ))
+
+            # interface import
+            elif name in ('ethernet interface', 'optical interface'):
+                if_properties = sheet.row_values(0)
+                # creation of ethernet interfaces
+                for row_index in range(1, sheet.nrows):
+                    name, link, node, *args = sheet.row_values(row_index)
+                    link = network.convert_link(link)
+                    node = network.convert_node(node)
+                    interface = link('interface', node)
+                    for property, value in zip(if_properties[2:], args):
+                        # we convert all (valid) string IPs to an OIPs
+                        if property == 'ip_address' and value != 'none':
+                            value = network.OIPf(value, interface)
+                        setattr(interface, property, value)
+
+            # AS import
+            elif name == 'AS':
+                for row_index in range(1, sheet.nrows):
+                    name, AS_type, id, nodes, links = sheet.row_values(row_index)
+                    id = int(id)
+                    subtype = 'ethernet link' if AS_type != 'BGP' else 'BGP peering'
+                    nodes = network.convert_node_set(nodes)
+                    links = network.convert_link_set(links, subtype)
+                    network.AS_factory(AS_type, name, id, links, nodes, True)
+
+            # area import
+            elif name == 'area':
+                for row_index in range(1, sheet.nrows):
+                    name, AS, id, nodes, links = sheet.row_values(row_index)
+                    AS = network.AS_factory(name=AS)
+                    nodes = network.convert_node_set(nodes)
+                    links = network.convert_link_set(links)
+                    AS.area_factory(name, int(id), links, nodes)
+
+            # per-AS node properties import
+            elif name == 'per-AS node properties':
+                for row_index in range(1, sheet.nrows):
+                    AS, node, *args = sheet.row_values(row_index)
+                    node = network.convert_node(node)
+                    for idx, property in enumerate(perAS_properties[node.subtype]):
+                        value = network.objectizer(property, args[idx])
+                        node(AS, property, value)
+
+            # import of site objects
+            elif name == 'sites':
+                if self.sites is None:
+                    continue
+                for row_index in range(1, sheet.nrows):
+                    name, nodes, links = sheet.row_values(row_index)
+                    site = self.sites.convert_node(name)
+                    links = set(network.convert_link_list(links))
+                    nodes = set(network.convert_node_list(nodes))
+                    site.add_to_site(*nodes)
+                    site.add_to_site(*links)
+
+            # per-AS interface properties import
+            else:
+                for row_index in range(1, sheet.nrows):
+                    AS, link, node, *args = sheet.row_values(row_index)
+                    AS = network.AS_factory(name=AS)
+                    link = network.convert_link(link)
+                    node = network.convert_node(node)
+                    interface = link('interface', node)
+                    for idx, property in enumerate(ethernet_interface_perAS_properties):
+                        value = network.objectizer(property, args[idx])
+                        interface(AS.name, property, value)
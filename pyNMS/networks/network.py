@@ -13,13 +13,16 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from .graph import Graph
+from .shortest_path import ShortestPath
+from .failure_sweep import FailureSweep
+from .forwarding import ForwardingDAG
 from autonomous_system.AS import AS_class
+from autonomous_system.AS_snapshot import parallel_RFT_creation
 from objects import objects
 import random
 import re
 import warnings
 from copy import copy
-from ip_networks.configuration import RouterConfiguration
 from objects.objects import *
 from miscellaneous.network_functions import *
 from math import cos, sin, asin, radians, sqrt, ceil, log
@@ -28,11 +31,17 @@ from heapq import heappop, heappush, nsmallest
 from operator import getitem, itemgetter
 from itertools import combinations
 from miscellaneous.union_find import UnionFind
-try:
-    import numpy as np
-    from cvxopt import matrix, glpk, solvers
-except ImportError:
-    warnings.warn('Package missing: linear programming functions will fail')
+from miscellaneous.fib import FIB
+# numpy and cvxopt are only used by the linear programming functions: they
+# are imported the first time one of them is called, not with the network
+def linear_programming():
+    try:
+        import numpy
+        from cvxopt import matrix, glpk
+    except ImportError:
+        warnings.warn('Package missing: linear programming functions will fail')
+        raise
+    return numpy, matrix, glpk
 
 class Network(Graph):
     
@@ -67,6 +76,24 @@ class Network(Graph):
         # string IP <-> IP mapping for I/E + parameters saving
         self.ip_to_oip = {}
         
+        # stage of the refresh pipeline -> versions of its inputs the last
+        # time it was run
+        self.stage_versions = {}
+        
+        # number of worker processes used to compute the routing tables of
+        # the IP AS: with more than one, the routing tables are computed on
+        # a process pool, from a snapshot of each AS
+        self.routing_processes = 1
+        
+        # versions of the inputs the routing tables were computed with: the
+        # incremental SPF can only update routing tables that are up-to-date
+        self.routing_versions = None
+        
+        # router -> longest prefix match forwarding table built from its 
+        # routing table (see 'fib'), and subnetwork -> prefix length
+        self.fibs = {}
+        self.subnetwork_prefixes = {}
+        
         # osi layer to devices
         self.osi_layers = {
         3: ('router', 'host', 'cloud'),
@@ -123,9 +150,10 @@ class Network(Graph):
         if not name:
             name = 'AS' + str(self.cpt_AS)
         if name not in self.pnAS:
+            self.bump('topology')
             # creation of the AS
             self.pnAS[name] = AS_class[AS_type](
-                                                self.view,
+                                                self,
                                                 name, 
                                                 id,
                                                 plinks, 
@@ -138,8 +166,13 @@ class Network(Graph):
         
     ## Retrieve the credentials
     
+    # without view (headless network), only the credentials of the node
+    # itself are used
     def get_credentials(self, node):
-        credentials = self.view.controller.credentials_window.get_credentials()
+        if self.view is None:
+            credentials = {}
+        else:
+            credentials = self.view.controller.credentials_window.get_credentials()
         for property in ('username', 'password', 'enable_password', 'ip_address'):
             value = getattr(node, property)
             if value:
@@ -177,6 +210,53 @@ class Network(Graph):
         for obj in objects:
             site.ps[obj.class_type].remove(obj)
   
+    ## Failure simulation
+    
+    def simulate_failure(self, *objects):
+        self.failed_obj |= set(objects)
+        self.bump('failure')
+        
+    def remove_failure(self, *objects):
+        self.failed_obj -= set(objects)
+        self.bump('failure')
+        
+    def remove_failures(self):
+        self.failed_obj.clear()
+        self.bump('failure')
+        
+    ## Cached stages of the refresh pipeline
+    
+    # stage -> inputs the stage depends on. A stage is skipped if the 
+    # versions of its inputs did not change since it was last run.
+    stage_inputs = OrderedDict((
+        ('update_AS_topology', ('topology',)),
+        ('vc_creation', ('topology',)),
+        ('interface_configuration', ('topology',)),
+        ('switching_table_creation', ('topology', 'cost', 'failure')),
+        ('routing_table_creation', ('topology', 'cost', 'failure')),
+        ('path_finder', ('topology', 'cost', 'failure'))
+        ))
+        
+    def stage_key(self, stage):
+        return tuple(self.versions[input] for input in self.stage_inputs[stage])
+        
+    # run, in order, the stages whose inputs changed: once a stage is run,
+    # all stages after it are run as well, since they depend on its output.
+    # The versions are recorded once all stages are run, as a stage can 
+    # itself bump the version of an input of a previous stage (e.g the 
+    # virtual connections created by vc_creation): the derived structures 
+    # are then consistent with the current versions.
+    # returns the list of stages that were run
+    def run_stages(self, *stages):
+        run = []
+        for stage in stages:
+            if run or self.stage_versions.get(stage) != self.stage_key(stage):
+                getattr(self, stage)()
+                run.append(stage)
+        for stage in stages:
+            self.stage_versions[stage] = self.stage_key(stage)
+        return run
+        
     def update_AS_topology(self):
         for AS in self.ASftr('subtype', 'ISIS', 'OSPF', 'BGP'):
             # for all OSPF, IS-IS and BGP AS, fill the ABR/L1L2/nodes/links 
@@ -331,26 +411,21 @@ class Network(Graph):
     # the impact in terms of bandwidth for each physical link. 
     # The highest value is kept in memory, as well as the physical link which failure 
     # induces this value.
-    def plink_dimensioning(self):
+    # A scenario can also be a set of physical links that fail together 
+    # (shared risk link group): 'scenarios' is an iterable of such sets.
+    # The scenarios are simulated on 'routing_processes' worker processes 
+    # (see failure_sweep.py).
+    def plink_dimensioning(self, scenarios=None):
         # we need to remove all failures before dimensioning the physical links:
         # the set of failed physical link will be redefined, but we also need the
         # icons to be cleaned from the canvas
-        self.view.remove_failures()
-        
-        # we consider each physical link in the network to be failed, one by one
-        for failed_plink in self.plinks.values():
-            self.failed_obj = {failed_plink}
-            # the physical link being failed, we will recreate all routing tables
-            # then use the path finding procedure to map the traffic flows
-            self.routing_table_creation()
-            self.path_finder()
-            for plink in self.plinks.values():
-                for dir in ('SD', 'DS'):
-                    curr_traffic = getattr(plink, 'traffic' + dir)
-                    if curr_traffic > getattr(plink, 'wctraffic' + dir):
-                        setattr(plink, 'wctraffic' + dir, curr_traffic)
-                        setattr(plink, 'wcfailure', str(failed_plink))
-        self.failed_obj.clear()
+        if self.view is None:
+            self.remove_failures()
+        else:
+            self.view.remove_failures()
+        if scenarios is None:
+            scenarios = [(plink,) for plink in self.plinks.values()]
+        FailureSweep(self, scenarios).run(self.routing_processes)
                     
     # this function creates both the ARP and the RARP tables
     def arpt_creation(self):
@@ -389,58 +464,80 @@ class Network(Graph):
             plink.trafficSD = plink.trafficDS = 0.
                 
     def path_finder(self):
+        # the physical links whose traffic changed, and the traffics whose
+        # path changed, are redrawn by the view
+        traffics = {
+                    plink: (plink.trafficSD, plink.trafficDS) 
+                    for plink in self.plinks.values()
+                    }
+        paths = {
+                 traffic: getattr(traffic, 'path', None) 
+                 for traffic in self.traffics.values()
+                 }
         self.reset_traffic()
+        routed_traffics = []
         for traffic in self.traffics.values():
             src, dest = traffic.source, traffic.destination
             if all(node.subtype == 'router' for node in (src, dest)):
-                self.RFT_path_finder(traffic)
+                routed_traffics.append(traffic)
             else:
                 _, traffic.path = self.A_star(src, dest)
+        self.batch_RFT_path_finder(routed_traffics)
+        for traffic in self.traffics.values():
             if not traffic.path:
                 print('no path found for {}'.format(traffic))
+        self.mark('modified', *(
+                                plink for plink, traffic in traffics.items()
+                                if traffic != (plink.trafficSD, plink.trafficDS)
+                                ))
+        self.mark('modified', *(
+                                traffic for traffic, path in paths.items()
+                                if traffic.path != path
+                                ))
                 
     ## A) Ethernet switching table
     
     def ST_builder(self, source, excluded_plinks=None):
-        
-        if not excluded_plinks:
-            excluded_plinks = set()
-        
-        visited = set()
-        heap = [(source, [], [], None)]
-        
-        while heap:
-            node, path_node, path_plink, ex_int = heappop(heap)  
-            if node not in visited:
-                visited.add(node)
-                for neighbor, l2vc in self.gftr(node, 'l2link', 'l2vc'):
-                    adj_plink = l2vc('link', node)
+        # the switching table associates the MAC address of all interfaces
+        # reachable from the source to the source interface of the 
+        # shortest path (in number of hops) toward it
+        spt = ShortestPath(
+                           lambda node: self.gftr(node, 'l2link', 'l2vc'),
+                           lambda l2vc, node: 1,
+                           lambda l2vc, node: l2vc('link', node),
+                           excluded_links = excluded_plinks
+                           ).run(source)
+                           
+        # exit physical link of the source for all switches of the tree
+        exit_plink = {}
+        for node, l2vc, neighbor in spt.tree():
+            exit_plink[neighbor] = exit_plink.get(node, l2vc('link', source))
+            
+        for node in spt.settled:
+            for neighbor, l2vc in spt.adjacency(node):
+                adj_plink = l2vc('link', node)
+                ex_tk = exit_plink.get(node, adj_plink)
+                ex_int = ex_tk('interface', source)
+                if node == source:
                     remote_plink = l2vc('link', neighbor)
-                    if adj_plink in path_plink:
-                        continue
-                    if adj_plink in excluded_plinks: 
-                        continue
-                    if node == source:
-                        ex_int = adj_plink('interface', source)
-                        mac = remote_plink('mac_address', neighbor)
-                        source.st[mac] = ex_int
-                    heappush(heap, (neighbor, path_node + [neighbor], 
-                                            path_plink + [adj_plink], ex_int))
-                    
-            if path_plink:
-                plink, ex_tk = path_plink[-1], path_plink[0]
-                source.st[plink.interfaceS.mac_address] = ex_tk('interface', source)
-                source.st[plink.interfaceD.mac_address] = ex_tk('interface', source)
+                    mac = remote_plink('mac_address', neighbor)
+                    source.st[mac] = ex_int
+                for interface in (adj_plink.interfaceS, adj_plink.interfaceD):
+                    source.st.setdefault(interface.mac_address, ex_int)
     
     ## 1) RFT-based routing and dimensioning
     
-    def RFT_path_finder(self, traffic):
+    # the traffic is added to the traffic properties of the physical links
+    # of its path, or, if 'load' is a dictionary, to load[(plink, 'SD'/'DS')]
+    # the textual trace of the path (path_str) is only built if 'trace' is
+    # True: the batched routing below never builds it.
+    def RFT_path_finder(self, traffic, load=None, trace=False):
         source, destination = traffic.source, traffic.destination
         src_ip, dst_ip = traffic.source_IP, traffic.destination_IP
         valid = bool(src_ip) & bool(dst_ip)
         
         if valid:
-            dst_ntw = dst_ip.network
+            dst_address = toip(dst_ip.ip_addr)
         # (current node, physical link from which the data flow comes, dataflow)
         heap = [(source, None, None)]
         path = set()
@@ -455,25 +552,26 @@ class Network(Graph):
             if curr_node == destination:
                 continue
             if curr_node.subtype == 'router':
-                if dst_ntw in curr_node.rt:
-                    routes = curr_node.rt[dst_ntw]
-                # if we cannot find the destination address in the routing table, 
-                # and there is a default route, we use it.
-                elif '0.0.0.0' in curr_node.rt:
-                    routes = curr_node.rt['0.0.0.0']
-                else:
+                # longest prefix match of the destination address: if there
+                # is no route toward a subnetwork that contains it, the default
+                # route (0.0.0.0/0) is used if there is one.
+                routes = self.fib(curr_node).lookup(dst_address)
+                if routes is None:
+                    warnings.warn('Path not found for {}'.format(traffic))
+                    break
+                # we remove the routes whose exit physical link is in failure
+                # from the share, so that they are ignored for physical link
+                # dimensioning
+                routes = [r for r in routes if r[-1] not in self.failed_obj]
+                if not routes:
                     warnings.warn('Path not found for {}'.format(traffic))
                     break
-                # we count the number of physical links in failure
-                failed_plinks = sum(r[-1] in self.failed_obj for r in routes)
-                # and remove them from share so that they are ignored for 
-                # physical link dimensioning
                 for idx, route in enumerate(routes):
                     _, nh_ip, ex_int, _, router, ex_tk = route
                     # we create a new dataflow based on the old one
                     new_dataflow = copy(dataflow)
                     # the throughput depends on the number of ECMP routes
-                    new_dataflow.throughput /= len(routes) - failed_plinks
+                    new_dataflow.throughput /= len(routes)
                     # the source MAC address is the MAC address of the interface
                     # used to exit the current node
                     new_dataflow.src_mac = ex_int.mac_address
@@ -483,13 +581,17 @@ class Network(Graph):
                     # a mapping IP <-> (MAC, outgoing interface)
                     new_dataflow.dst_mac = curr_node.arpt[nh_ip][0]
                     sd = (curr_node == ex_tk.source)*'SD' or 'DS'
-                    ex_tk.__dict__['traffic' + sd] += new_dataflow.throughput
+                    if load is None:
+                        current = getattr(ex_tk, 'traffic' + sd)
+                        setattr(ex_tk, 'traffic' + sd, current + new_dataflow.throughput)
+                    else:
+                        load[(ex_tk, sd)] += new_dataflow.throughput
                     # add the exit physical link to the path
                     path.add(ex_tk)
                     # the next-hop is the node at the end of the exit physical link
                     next_hop = ex_tk.source if sd == 'DS' else ex_tk.destination
                     heap.append((next_hop, ex_tk, new_dataflow))
-                    if not idx:
+                    if trace and not idx:
                         path_str.append('''
                 Current_node: {curr_node}
                 Next-hop: {next_hop}
@@ -518,7 +620,8 @@ class Network(Graph):
                 else:
                     next_hop = ex_tk.source
                 heap.append((next_hop, ex_tk, dataflow))
-                path_str.append('''
+                if trace:
+                    path_str.append('''
                 Current_node: {curr_node}
                 Next-hop: {next_hop}
                 Outgoing physical link: {ex_tk}
@@ -532,6 +635,65 @@ class Network(Graph):
         traffic.path = path
         return path, path_str
         
+    # the traffics between routers are grouped by destination (router and 
+    # IP address): the forwarding DAG toward each destination is built once
+    # from the sources of all traffics of its group.
+    # Traffics without source or destination IP address are not routed.
+    def forwarding_DAGs(self, traffics):
+        DAGs, groups = {}, defaultdict(list)
+        for traffic in traffics:
+            if not (traffic.source_IP and traffic.destination_IP):
+                continue
+            key = (traffic.destination, traffic.destination_IP.ip_addr)
+            if key not in DAGs:
+                DAGs[key] = ForwardingDAG(
+                                          self, 
+                                          traffic.destination, 
+                                          traffic.destination_IP
+                                          )
+            DAGs[key].expand(traffic.source)
+            groups[key].append(traffic)
+        for key, DAG in DAGs.items():
+            if DAG.topological_order() is None:
+                warnings.warn('Forwarding loop toward {}'.format(key[1]))
+                continue
+            yield DAG, groups[key]
+    
+    # RFT-based routing of a set of traffics: same result as calling
+    # RFT_path_finder for each of them, with one forwarding walk per 
+    # destination instead of one per traffic and ECMP branch.
+    # The traffics whose forwarding DAG leads to a router without route are
+    # routed with RFT_path_finder, which warns and stops at that router.
+    def batch_RFT_path_finder(self, traffics):
+        for traffic in traffics:
+            traffic.path = set()
+        for DAG, group in self.forwarding_DAGs(traffics):
+            objects, dead_end = DAG.reach()
+            throughputs = defaultdict(float)
+            for traffic in group:
+                state = (traffic.source, None)
+                if dead_end[state]:
+                    self.RFT_path_finder(traffic)
+                    continue
+                traffic.path = set(objects[state])
+                throughputs[state] += traffic.throughput
+            for (plink, sd), throughput in DAG.spread(throughputs).items():
+                setattr(plink, 'traffic' + sd, getattr(plink, 'traffic' + sd) + throughput)
+                
+    # traffic load of each traffic, {traffic: {(plink, 'SD'/'DS'): load}}, 
+    # without altering the traffic properties of the physical links
+    def traffic_loads(self, traffics):
+        loads = {traffic: defaultdict(float) for traffic in traffics}
+        for DAG, group in self.forwarding_DAGs(traffics):
+            _, dead_end = DAG.reach()
+            for traffic in group:
+                state = (traffic.source, None)
+                if dead_end[state]:
+                    self.RFT_path_finder(traffic, loads[traffic])
+                else:
+                    loads[traffic] = DAG.spread({state: traffic.throughput})
+        return loads
+        
     ## 2) Add connected interfaces to the RFT
     
     def static_RFT_builder(self, source):
@@ -557,19 +719,163 @@ class Network(Graph):
         self.st_creation()
         
     def subnetwork_update(self):
+        self.subnetwork_prefixes.clear()
         for ip in self.ip_to_oip.values():
             ip.interface.link.subnetwork = ip.network
+            self.subnetwork_prefixes[ip.network] = int(ip.subnet)
+            
+    # prefix (integer) and prefix length of a key of a routing table: a 
+    # static route subnetwork ('a.b.c.d/length'), the default route or the
+    # subnetwork of a physical link
+    def prefix(self, key):
+        if '/' in key:
+            subnetwork, length = key.split('/')
+            return toip(subnetwork), int(length)
+        if key == '0.0.0.0':
+            return 0, 0
+        return toip(key), self.subnetwork_prefixes.get(key, 32)
+        
+    # the forwarding table of a router is built from its routing table the
+    # first time it is needed, and thrown away whenever its routing table is
+    # updated (routing_table_creation, update_plink and rollback_failures)
+    def fib(self, router):
+        if router not in self.fibs:
+            self.fibs[router] = FIB(
+                                    (*self.prefix(key), routes)
+                                    for key, routes in router.rt.items()
+                                    )
+        return self.fibs[router]
         
     def routing_table_creation(self):
         self.subnetwork_update()
+        self.fibs.clear()
         # clear the existing routing tables
         for node in self.ftr('node', 'router', 'host'):
             node.rt.clear()
         # we compute the routing table of all routers
-        for AS in self.ASftr('subtype', 'RIP', 'ISIS', 'OSPF'):
-            AS.build_RFT()
+        ASes = list(self.ASftr('subtype', 'RIP', 'ISIS', 'OSPF'))
+        if self.routing_processes > 1 and ASes:
+            parallel_RFT_creation(self, ASes, self.routing_processes)
+        else:
+            for AS in ASes:
+                AS.build_RFT()
         for router in self.ftr('node', 'router', 'host'):
             self.static_RFT_builder(router)
+        self.routing_versions = dict(self.versions)
+            
+    ## Incremental SPF
+    
+    # apply a change (function 'update') to the cost or the failure state
+    # of a single physical link, and update the routing tables: only the
+    # routers whose routing table may change are recomputed, and the 
+    # routers that only lose their routes toward the subnetwork of a failed
+    # link are pruned (see IP_AS.affected_routers). If the routing tables 
+    # were not up-to-date before the change, they are all recomputed.
+    # returns the routers whose routing table changed, with the keys of 
+    # the routes that changed, or None if all routing tables were recomputed
+    # if 'journal' is a list, the previous value of all updated routes and
+    # distances are recorded in it, so that the update can be rolled back
+    def update_plink(self, plink, update, journal=None):
+        ASes = list(self.ASftr('subtype', 'RIP', 'ISIS', 'OSPF'))
+        up_to_date = self.routing_versions == self.versions
+        old_costs = {
+                     AS: {
+                          node.id: plink('cost', node, AS=AS.name)
+                          for node in (plink.source, plink.destination)
+                          }
+                     for AS in ASes if plink in AS.links
+                     }
+        was_failed = plink in self.failed_obj
+        update()
+        if not up_to_date:
+            self.routing_table_creation()
+            if journal is not None:
+                journal.append(None)
+            return None
+        if journal is None:
+            journal = []
+        rebuild, prune, refresh = set(), set(), defaultdict(set)
+        for AS in old_costs:
+            AS_rebuild, AS_prune, refresh[AS] = AS.affected_routers(
+                                                          plink, 
+                                                          old_costs[AS], 
+                                                          was_failed
+                                                          )
+            rebuild |= AS_rebuild
+            prune |= AS_prune
+        # the routing table of a router that belongs to several AS depends
+        # on all of them: it is always recomputed
+        rebuild |= {
+                    router for AS in old_costs for router in AS.nodes
+                    if sum(router in other.nodes for other in ASes) > 1
+                    }
+        spts = {
+                AS: AS.shortest_path(AS.nodes, AS.links - self.failed_obj)
+                for AS in ASes
+                }
+        changes = defaultdict(set)
+        for router in rebuild:
+            old_rt = router.rt.copy()
+            router.rt.clear()
+            for AS in ASes:
+                if router in AS.nodes:
+                    journal.append((AS.distances, router, AS.distances.get(router)))
+                    AS.RFT_builder(router, spts[AS])
+                    AS.distances[router] = spts[AS].distances
+            self.static_RFT_builder(router)
+            for key in old_rt.keys() | router.rt.keys():
+                if old_rt.get(key) != router.rt.get(key):
+                    changes[router].add(key)
+                    journal.append((router.rt, key, old_rt.get(key)))
+        for router in prune - rebuild:
+            routes = router.rt.pop(plink.subnetwork, None)
+            if routes is not None:
+                changes[router].add(plink.subnetwork)
+                journal.append((router.rt, plink.subnetwork, routes))
+        for AS, routers in refresh.items():
+            for router in routers - rebuild:
+                journal.append((AS.distances, router, AS.distances.get(router)))
+                AS.distances[router] = spts[AS].run(router).settled
+        for router in changes:
+            self.fibs.pop(router, None)
+        self.routing_versions = dict(self.versions)
+        return dict(changes)
+        
+    def fail_plink(self, plink, journal=None):
+        return self.update_plink(
+                                 plink, 
+                                 lambda: self.simulate_failure(plink), 
+                                 journal
+                                 )
+                                 
+    # repair physical links that failed with fail_plink, and restore the
+    # routing tables recorded in the journal: this is faster than repairing
+    # them with repair_plink, as nothing needs to be recomputed.
+    def rollback_failures(self, journal, *plinks):
+        self.remove_failure(*plinks)
+        # the routing tables were recomputed from scratch at some point: 
+        # the journal is incomplete
+        if None in journal:
+            self.routing_table_creation()
+            return
+        for dictionary, key, value in reversed(journal):
+            if value is None:
+                dictionary.pop(key, None)
+            else:
+                dictionary[key] = value
+        self.fibs.clear()
+        self.routing_versions = dict(self.versions)
+        
+    def repair_plink(self, plink):
+        return self.update_plink(plink, lambda: self.remove_failure(plink))
+        
+    # set the per-AS cost of the interfaces of a physical link
+    def set_plink_cost(self, plink, AS, cost):
+        def update():
+            plink.interfaceS(AS.name, 'cost', cost)
+            plink.interfaceD(AS.name, 'cost', cost)
+            self.bump('cost')
+        return self.update_plink(plink, update)
             
     def route(self):
         self.routing_table_creation()
@@ -577,6 +883,23 @@ class Network(Graph):
       
     ## Shortest path(s) algorithms
     
+    # shortest path kernel on the physical links of the network
+    def shortest_path(
+                      self, 
+                      allowed_nodes = None, 
+                      allowed_plinks = None, 
+                      excluded_nodes = None, 
+                      excluded_plinks = None
+                      ):
+        return ShortestPath(
+                            lambda node: self.graph[node.id]['plink'],
+                            lambda plink, node: plink('cost', node),
+                            allowed_nodes = allowed_nodes,
+                            allowed_links = allowed_plinks,
+                            excluded_nodes = excluded_nodes,
+                            excluded_links = excluded_plinks
+                            )
+    
     ## 1) Dijkstra algorithm
         
     def dijkstra(
@@ -586,40 +909,37 @@ class Network(Graph):
                  allowed_plinks = None, 
                  allowed_nodes = None
                  ):
-        
-        if allowed_plinks is None:
-            allowed_plinks = set(self.plinks.values())
+
+        # if numpy is available, the search runs on the compiled (CSR) view
+        # of the graph, with the costs extracted once for all edges
+        compiled_graph = self.compile()
+        if compiled_graph:
+            dist, prec_node, prec_edge = compiled_graph.dijkstra(
+                                                                 source,
+                                                                 'plink',
+                                                                 'cost',
+                                                                 allowed_nodes,
+                                                                 allowed_plinks
+                                                                 )
+            path_plink = compiled_graph.path('plink', prec_node, prec_edge, target)
+            adj = compiled_graph.adjacency('plink')
+            if allowed_nodes is None:
+                allowed_nodes = compiled_graph.nodes
+            index = compiled_graph.index
+            return (
+                    {node: dist[index[node.id]] for node in allowed_nodes},
+                    path_plink,
+                    (adj.links[adj.edges[e]] for e in prec_edge if e != -1)
+                    )
+
         if allowed_nodes is None:
             allowed_nodes = set(self.nodes.values())
         
-        prec_node = {i: None for i in allowed_nodes}
-        prec_plink = {i: None for i in allowed_nodes}
-        visited = set()
-        dist = {i: float('inf') for i in allowed_nodes}
-        dist[source] = 0
-        heap = [(0, source)]
-        while heap:
-            dist_node, node = heappop(heap) 
-            if node not in visited:
-                visited.add(node)
-                for neighbor, adj_plink in self.graph[node.id]['plink']:
-                    # we ignore what's not allowed (not in the AS or in failure)
-                    if neighbor not in allowed_nodes:
-                        continue
-                    if adj_plink not in allowed_plinks:
-                        continue
-                    dist_neighbor = dist_node + adj_plink('cost', node)
-                    if dist_neighbor < dist[neighbor]:
-                        dist[neighbor] = dist_neighbor
-                        prec_node[neighbor] = node
-                        prec_plink[neighbor] = adj_plink
-                        heappush(heap, (dist_neighbor, neighbor))
-                        
-        # traceback the path from target to source
-        curr, path_plink = target, [prec_plink[target]]
-        while curr != source:
-            curr = prec_node[curr]
-            path_plink.append(prec_plink[curr])
+        spt = self.shortest_path(
+                                 allowed_nodes = allowed_nodes, 
+                                 allowed_plinks = allowed_plinks
+                                 ).run(source)
+        _, path_plink = spt.path(target)
                         
         # we return:
         # - the dist dictionnary, that contains the distance from the source
@@ -627,7 +947,8 @@ class Network(Graph):
         # - the shortest path from source to target
         # - all edges that belong to the Shortest Path Tree
         # we need all three variables for Suurbale algorithm below
-        return dist, path_plink[:-1][::-1], filter(None, prec_plink.values())
+        dist = {node: spt.dist.get(node, float('inf')) for node in allowed_nodes}
+        return dist, path_plink, (plink for _, plink, _ in spt.tree())
         
     ## 2) A* algorithm for CSPF modelization
             
@@ -642,47 +963,16 @@ class Network(Graph):
                allowed_nodes = None
                ):
                 
-        # initialize parameters
-        if excluded_nodes is None:
-            excluded_nodes = set()
-        if excluded_plinks is None:
-            excluded_plinks = set()
-        if path_constraints is None:
-            path_constraints = []
-        if allowed_plinks is None:
-            allowed_plinks = set(self.plinks.values())
-        if allowed_nodes is None:
-            allowed_nodes = set(self.nodes.values())
-            
-        pc = [target] + path_constraints[::-1]
-        visited = set()
-        heap = [(0, source, [source], [], pc)]
-        while heap:
-            dist, node, nodes, plinks, pc = heappop(heap)
-            if node not in visited:
-                visited.add(node)
-                if node == pc[-1]:
-                    visited.clear()
-                    heap.clear()
-                    pc.pop()
-                    if not pc:
-                        return nodes, plinks
-                for neighbor, adj_plink in self.graph[node.id]['plink']:
-                    # excluded and allowed nodes
-                    if neighbor not in allowed_nodes - excluded_nodes: 
-                        continue
-                    # excluded and allowed physical links
-                    if adj_plink not in allowed_plinks - excluded_plinks: 
-                        continue
-                    heappush(heap, (
-                                    dist + adj_plink('cost', node), 
-                                    neighbor,
-                                    nodes + [neighbor], 
-                                    plinks + [adj_plink], 
-                                    pc
-                                    )
-                            )
-        return [], []
+        return self.shortest_path(
+                                  allowed_nodes, 
+                                  allowed_plinks, 
+                                  excluded_nodes, 
+                                  excluded_plinks
+                                  ).constrained_path(
+                                                     source, 
+                                                     target, 
+                                                     path_constraints or []
+                                                     )
 
     ## 3) Bellman-Ford algorithm
         
@@ -952,6 +1242,8 @@ class Network(Graph):
             dir = 'SD' * (current_node == plink.source) or 'DS'
             setattr(plink, 'cost' + dir, float('inf'))
             current_node = plink.destination if dir == 'SD' else plink.source
+        # the costs of the compiled graph must be extracted again
+        self.bump('cost')
             
         _, second_path = self.A_star(
                               source, 
@@ -989,8 +1281,10 @@ class Network(Graph):
                                               visit
                                               )
                 if global_flow > 0:
-                    adj_plink.__dict__['flow' + sd] += global_flow
-                    adj_plink.__dict__['flow' + ds] -= global_flow
+                    flow = getattr(adj_plink, 'flow' + sd)
+                    setattr(adj_plink, 'flow' + sd, flow + global_flow)
+                    flow = getattr(adj_plink, 'flow' + ds)
+                    setattr(adj_plink, 'flow' + ds, flow - global_flow)
                     return global_flow
         return False
         
@@ -1045,8 +1339,8 @@ class Network(Graph):
                 # define sd and ds depending on how the physical link is defined
                 direction = curr_node == plink.source
                 sd, ds = direction*'SD' or 'DS', direction*'DS' or 'SD'
-                plink.__dict__['flow' + ds] += global_flow
-                plink.__dict__['flow' + sd] -= global_flow
+                setattr(plink, 'flow' + ds, getattr(plink, 'flow' + ds) + global_flow)
+                setattr(plink, 'flow' + sd, getattr(plink, 'flow' + sd) - global_flow)
                 curr_node = prec_node 
         return sum(
                    getattr(adj, 'flow' + ((source==adj.source)*'SD' or 'DS')) 
@@ -1070,8 +1364,8 @@ class Network(Graph):
             if level[neighbor] == level[curr_node] + 1 and residual > 0:
                 z = min(limit, residual)
                 aug = self.augment_di(level, flow, neighbor, dest, z)
-                adj_plink.__dict__['flow' + sd] += aug
-                adj_plink.__dict__['flow' + ds] -= aug
+                setattr(adj_plink, 'flow' + sd, getattr(adj_plink, 'flow' + sd) + aug)
+                setattr(adj_plink, 'flow' + ds, getattr(adj_plink, 'flow' + ds) - aug)
                 val += aug
                 limit -= aug
         if not val:
@@ -1126,6 +1420,7 @@ class Network(Graph):
     ## 1) Shortest path
     
     def LP_SP_formulation(self, s, t):
+        np, matrix, glpk = linear_programming()
 
         # Solves the MILP: minimize c'*x
         #         subject to G*x + s = h
@@ -1204,6 +1499,7 @@ class Network(Graph):
     ## 2) Single-source single-destination maximum flow
                
     def LP_MF_formulation(self, s, t):
+        np, matrix, glpk = linear_programming()
 
         # Solves the MILP: minimize c'*x
         #         subject to G*x + s = h
@@ -1270,6 +1566,7 @@ class Network(Graph):
     ## 3) Single-source single-destination minimum-cost flow
                
     def LP_MCF_formulation(self, s, t, flow):
+        np, matrix, glpk = linear_programming()
 
         # Solves the MILP: minimize c'*x
         #         subject to G*x + s = h
@@ -1336,6 +1633,7 @@ class Network(Graph):
     ## 4) K Link-disjoint shortest pair 
     
     def LP_LDSP_formulation(self, s, t, K):
+        np, matrix, glpk = linear_programming()
 
         # Solves the MILP: minimize c'*x
         #         subject to G*x + s = h
@@ -1552,7 +1850,8 @@ class Network(Graph):
                 # no longer use the congested physical link)
                 for k in range(5):
                     #print(k)
-                    AS_links[ct_id].__dict__['cost' + cd] += n // 5
+                    cost = getattr(AS_links[ct_id], 'cost' + cd)
+                    setattr(AS_links[ct_id], 'cost' + cd, cost + n // 5)
                     # we update the solution being evaluated and append
                     # it to the tabu list
                     curr_solution[ct_id*2 + (cd == 'DS')] += n // 5
@@ -1571,17 +1870,24 @@ class Network(Graph):
 
         for id, cost in enumerate(best_solution):
             setattr(AS_links[id//2], 'cost' + ('DS'*(id%2) or 'SD'), cost)
+        self.bump('cost')
         self.route()
         ncr, ct_id, cd = self.ncr_computation(AS_links)
         print(ncr)
         
     ## Optical networks: routing and wavelength assignment
     
+    # the transformed graph is created in a new project, or, for a network
+    # without view (headless), in a new network, which is returned instead
     def RWA_graph_transformation(self, name=None):
         
         # we compute the path of all traffic physical links
         self.path_finder()
-        graph_project = self.view.controller.add_project(name)
+        if self.view is None:
+            graph_project = graph_network = Network()
+        else:
+            graph_project = self.view.controller.add_project(name)
+            graph_network = graph_project.network
         
         # in the new graph, each node corresponds to a traffic path
         # we create one node per traffic physical link in the new view            
@@ -1593,12 +1899,12 @@ class Network(Graph):
                     if set(tlA.path) & set(tlB.path):
                         nA, nB = tlA.name, tlB.name
                         name = '{} - {}'.format(nA, nB)
-                        graph_project.network.lf(
-                                    source = graph_project.network.nf(
+                        graph_network.lf(
+                                    source = graph_network.nf(
                                                         name = nA,
                                                         node_type = 'oxc'
                                                         ),
-                                    destination = graph_project.network.nf(
+                                    destination = graph_network.nf(
                                                         name = nB,
                                                         node_type = 'oxc'
                                                         ),
@@ -1606,7 +1912,8 @@ class Network(Graph):
                                     )
             visited.add(tlA)
                             
-        graph_project.current_view.refresh_display()
+        if self.view is not None:
+            graph_project.current_view.refresh_display()
         return graph_project
         
     def largest_degree_first(self):
@@ -1639,6 +1946,7 @@ class Network(Graph):
         return number_lambda
         
     def LP_RWA_formulation(self, K=10):
+        np, matrix, glpk = linear_programming()
 
         # Solves the MILP: minimize c'*x
         #         subject to G*x + s = h
@@ -1730,77 +2038,68 @@ class Network(Graph):
         return int(sum(x[-K:]))
         
     ## Graph generation functions
+    
+    # the generated graphs are described by the names of the end nodes of 
+    # their links: the nodes, then the links, are created with the bulk 
+    # factories. A name that is already used refers to the existing node.
+    def generate(self, subtype, edges):
+        edges = list(edges)
+        names = list(dict.fromkeys(name for edge in edges for name in edge))
+        nodes = self.nodes_bulk(subtype, ({'name': name} for name in names))
+        ids = {name: node.id for name, node in zip(names, nodes)}
+        links = self.links_bulk(
+                                'ethernet link', 
+                                [ids[source] for source, _ in edges],
+                                [ids[destination] for _, destination in edges]
+                                )
+        yield from nodes
+        yield from links
                 
     ## 1) Tree generation
                 
     def tree(self, n, subtype):
-        for i in range(2**n-1):
-            n1, n2, n3 = str(i), str(2*i+1), str(2*i+2)
-            source = self.nf(name = n1, node_type = subtype)
-            destination = self.nf(name = n2, node_type = subtype)
-            yield source
-            yield destination
-            yield self.lf(source=source, destination=destination)
-            source = self.nf(name = n1, node_type = subtype)
-            destination = self.nf(name = n3, node_type = subtype)
-            yield source
-            yield destination
-            yield self.lf(source=source, destination=destination)
+        yield from self.generate(subtype, (
+                                 (str(i), str(2*i + k)) 
+                                 for i in range(2**n-1) for k in (1, 2)
+                                 ))
             
     ## 2) Star generation
             
     def star(self, n, subtype):
         nb_node = self.cpt_node + 1
-        for i in range(n):
-            n1, n2 = str(nb_node), str(nb_node+1+i)
-            source = self.nf(name = n1, node_type = subtype)
-            destination = self.nf(name = n2, node_type = subtype)
-            yield source
-            yield destination
-            yield self.lf(source=source, destination=destination)
+        yield from self.generate(subtype, (
+                                 (str(nb_node), str(nb_node+1+i)) 
+                                 for i in range(n)
+                                 ))
             
     ## 3) Full-meshed network generation
             
     def full_mesh(self, n, subtype):
         nb_node = self.cpt_node + 1
-        for i in range(n):
-            for j in range(i):
-                n1, n2 = str(nb_node+j), str(nb_node+i)
-                source = self.nf(name = n1, node_type = subtype)
-                destination = self.nf(name = n2, node_type = subtype)
-                yield source
-                yield destination
-                yield self.lf(source=source, destination=destination)
+        yield from self.generate(subtype, (
+                                 (str(nb_node+j), str(nb_node+i))
+                                 for i in range(n) for j in range(i)
+                                 ))
                 
     ## 4) Ring generation
                 
     def ring(self, n, subtype):
         nb_node = self.cpt_node + 1
-        for i in range(n):
-            n1, n2 = str(nb_node+i), str(nb_node+(1+i)%n)
-            source = self.nf(name = n1, node_type = subtype)
-            destination = self.nf(name = n2, node_type = subtype)
-            yield source
-            yield destination
-            yield self.lf(source=source, destination=destination)
+        yield from self.generate(subtype, (
+                                 (str(nb_node+i), str(nb_node+(1+i)%n))
+                                 for i in range(n)
+                                 ))
                     
     ## 5) Square tiling generation
             
     def square_tiling(self, n, subtype):
+        edges = []
         for i in range(n**2):
-            n1, n2, n3 = str(i), str(i-1), str(i+n)
             if i-1 > -1 and i%n:
-                source = self.nf(name = n1, node_type = subtype)
-                destination = self.nf(name = n2, node_type = subtype)
-                yield source
-                yield destination
-                yield self.lf(source=source, destination=destination)
+                edges.append((str(i), str(i-1)))
             if i+n < n**2:
-                source = self.nf(name = n1, node_type = subtype)
-                destination = self.nf(name = n3, node_type = subtype)
-                yield source
-                yield destination
-                yield self.lf(source=source, destination=destination)
+                edges.append((str(i), str(i+n)))
+        yield from self.generate(subtype, edges)
                     
     ## 6) Hypercube generation
             
@@ -1846,16 +2145,13 @@ class Network(Graph):
     def kneser(self, n, k, subtype):
         # we keep track of what set we've seen to avoid having
         # duplicated edges in the graph, with the 'already_done' set
-        already_done = set()
+        already_done, edges = set(), []
         for setA in map(set, combinations(range(1, n), k)):
             already_done.add(frozenset(setA))
             for setB in map(set, combinations(range(1, n), k)):
                 if setB not in already_done and not setA & setB:
-                    source = self.nf(name = str(setA), node_type = subtype)
-                    destination = self.nf(name = str(setB), node_type = subtype)
-                    yield source
-                    yield destination
-                    yield self.lf(source=source, destination=destination)
+                    edges.append((str(setA), str(setB)))
+        yield from self.generate(subtype, edges)
                             
     ## 8) Generalized Petersen graph
     
@@ -1863,39 +2159,37 @@ class Network(Graph):
         # the petersen graph is made of the vertices (u_i) and (v_i) for 
         # i in [0, n-1] and the edges (u_i, u_i+1), (u_i, v_i) and (v_i, v_i+k).
         # to build it, we consider that v_i = u_(i+n).
+        edges = []
         for i in range(n):
             # (u_i, u_i+1) edges
-            source = self.nf(name = str(i), node_type = subtype)
-            destination = self.nf(name = str((i + 1)%n), node_type = subtype)
-            yield source
-            yield destination
-            yield self.lf(source=source, destination=destination)
+            edges.append((str(i), str((i + 1)%n)))
             # (u_i, v_i) edges
-            source = self.nf(name = str(i), node_type = subtype)
-            destination = self.nf(name = str(i+n), node_type = subtype)
-            yield source
-            yield destination
-            yield self.lf(source=source, destination=destination)
+            edges.append((str(i), str(i+n)))
             # (v_i, v_i+k) edges
-            source = self.nf(name = str(i+n), node_type = subtype)
-            destination = self.nf(name = str((i+n+k)%n + n), node_type = subtype)
-            yield source
-            yield destination
-            yield self.lf(source=source, destination=destination)
+            edges.append((str(i+n), str((i+n+k)%n + n)))
+        yield from self.generate(subtype, edges)
                     
     ## Multiple object creation
     
     def multiple_nodes(self, n, subtype):
         nb_nodes = self.cpt_node + 1
-        for k in range(n):
-            yield self.nf(name = str(k + nb_nodes), node_type = subtype)
+        yield from self.nodes_bulk(subtype, (
+                                   {'name': str(k + nb_nodes)} for k in range(n)
+                                   ))
             
     def multiple_links(self, source_nodes, destination_nodes):
         # create a link between the destination node and all source nodes
-        for src_node in source_nodes:
-            for dest_node in destination_nodes:
-                if src_node != dest_node:
-                    yield self.lf(source=src_node, destination=dest_node)
+        pairs = [
+                 (src_node.id, dest_node.id) 
+                 for src_node in source_nodes 
+                 for dest_node in destination_nodes
+                 if src_node != dest_node
+                 ]
+        yield from self.links_bulk(
+                                   'ethernet link', 
+                                   [source for source, _ in pairs],
+                                   [destination for _, destination in pairs]
+                                   )
                 
     ## Configuration
     
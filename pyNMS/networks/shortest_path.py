@@ -0,0 +1,184 @@
+# Copyright (C) 2017 Antoine Fourmy <antoine dot fourmy at gmail dot com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from heapq import heappop, heappush
+from itertools import count
+
+# Shortest path kernel shared by the shortest path algorithms of the network
+# (dijkstra, A*), the routing table builders of the IP AS (RIP, OSPF, IS-IS)
+# and the Ethernet switching and spanning tree builders.
+# The kernel doesn't know about the type of graph it runs on: it is given
+# - 'neighbors', a function that returns the (neighbor, edge) pairs of a node
+# (e.g the physical links of a node, or its layer-3 virtual connections)
+# - 'cost', a function that returns the cost of an edge from a node
+# - 'link', a function that returns the link that must be checked against
+# the allowed / excluded links when an edge is crossed from a node (e.g the
+# physical link of a virtual connection). By default, the edge itself.
+# The allowed sets (allowed minus excluded) are computed once.
+# Heap entries are small tuples (distance, counter, ...): the counter breaks
+# ties between equal distances without comparing nodes, and no path is ever
+# copied: paths are rebuilt on demand from the predecessor map.
+
+class ShortestPath(object):
+
+    def __init__(
+                 self,
+                 neighbors,
+                 cost,
+                 link = None,
+                 allowed_nodes = None,
+                 allowed_links = None,
+                 excluded_nodes = None,
+                 excluded_links = None
+                 ):
+        self.neighbors = neighbors
+        self.cost = cost
+        self.link = link
+        self.allowed_nodes = self.allowed_set(allowed_nodes, excluded_nodes)
+        self.allowed_links = self.allowed_set(allowed_links, excluded_links)
+        # state -> distance from the source / (predecessor state, edge)
+        self.dist, self.pred = {}, {}
+        # settled states, in the order they were settled
+        self.settled = {}
+        # node -> distance from the source, as found by the last first hop
+        # search (complete once the search is exhausted)
+        self.distances = {}
+        self.source = None
+
+    # returns a function that tells whether an object is allowed: the
+    # 'allowed minus excluded' set is computed once, here.
+    @staticmethod
+    def allowed_set(allowed, excluded):
+        if allowed is None:
+            if not excluded:
+                return None
+            excluded = set(excluded)
+            return lambda obj: obj not in excluded
+        allowed = set(allowed)
+        if excluded:
+            allowed -= set(excluded)
+        return allowed.__contains__
+
+    # yields the allowed (neighbor, edge) pairs of a node
+    def adjacency(self, node):
+        for neighbor, edge in self.neighbors(node):
+            if self.allowed_nodes and not self.allowed_nodes(neighbor):
+                continue
+            if self.allowed_links:
+                link = self.link(edge, node) if self.link else edge
+                if not self.allowed_links(link):
+                    continue
+            yield neighbor, edge
+
+    ## Single shortest path tree
+
+    # Dijkstra algorithm: we stop as soon as the target is reached, if
+    # there is one.
+    def run(self, source, target=None):
+        self.source = source
+        self.dist, self.pred = {source: 0}, {source: None}
+        self.settled = {}
+        tie = count()
+        heap = [(0, next(tie), source)]
+        while heap:
+            dist_node, _, node = heappop(heap)
+            if node in self.settled:
+                continue
+            self.settled[node] = dist_node
+            if node == target:
+                break
+            for neighbor, edge in self.adjacency(node):
+                dist_neighbor = dist_node + self.cost(edge, node)
+                if dist_neighbor < self.dist.get(neighbor, float('inf')):
+                    self.dist[neighbor] = dist_neighbor
+                    self.pred[neighbor] = (node, edge)
+                    heappush(heap, (dist_neighbor, next(tie), neighbor))
+        return self
+
+    # traceback of the path from the source to the target, using the
+    # predecessor map built by 'run'.
+    # returns the list of nodes and the list of links of the path, or two
+    # empty lists if the target wasn't reached.
+    def path(self, target):
+        if target not in self.settled:
+            return [], []
+        nodes, links = [target], []
+        while self.pred[nodes[-1]]:
+            node, edge = self.pred[nodes[-1]]
+            links.append(self.link(edge, node) if self.link else edge)
+            nodes.append(node)
+        return nodes[::-1], links[::-1]
+
+    # all edges that belong to the shortest path tree, as
+    # (predecessor, edge, node) triplets, in increasing distance order
+    def tree(self):
+        for node in self.settled:
+            if self.pred[node]:
+                predecessor, edge = self.pred[node]
+                yield predecessor, edge, node
+
+    # shortest path from the source to the target, going through all nodes
+    # of path_constraints, in order: the path is the concatenation of the
+    # shortest paths between two successive constraints.
+    def constrained_path(self, source, target, path_constraints=()):
+        waypoints = [source] + list(path_constraints) + [target]
+        nodes, links = [source], []
+        for start, end in zip(waypoints, waypoints[1:]):
+            segment_nodes, segment_links = self.run(start, end).path(end)
+            if not segment_nodes:
+                return [], []
+            nodes += segment_nodes[1:]
+            links += segment_links
+        return nodes, links
+
+    ## Per-exit shortest path trees (equal-cost multipath)
+
+    # With ECMP routing, a router needs the distance to every node for each
+    # of its possible exit edges: the search state is (node, first edge of
+    # the path) instead of node, which amounts to one shortest path tree per
+    # first edge, all of them being explored at once.
+    # We yield every edge relaxation, in increasing distance order, as a
+    # (distance, node, first edge, last edge) tuple: routing table builders
+    # need all of them, not only the ones that settle a state, since the
+    # subnetwork a route leads to is the one of the last link crossed.
+    # The edge a state was reached from is never crossed backwards, and the
+    # source is never re-entered.
+    # Relaxations come in increasing distance order: the first one toward a
+    # node gives its distance from the source, recorded in 'distances'.
+    def first_hop_search(self, source):
+        self.source = source
+        self.distances = distances = {source: 0}
+        tie = count()
+        settled = set()
+        heap = []
+        for neighbor, edge in self.adjacency(source):
+            heappush(heap, (self.cost(edge, source), next(tie), neighbor, edge, edge))
+        while heap:
+            dist, _, node, first_edge, last_edge = heappop(heap)
+            if node not in distances:
+                distances[node] = dist
+            yield dist, node, first_edge, last_edge
+            if node == source or (node, first_edge) in settled:
+                continue
+            settled.add((node, first_edge))
+            for neighbor, edge in self.adjacency(node):
+                if edge == last_edge:
+                    continue
+                heappush(heap, (
+                                dist + self.cost(edge, node),
+                                next(tie),
+                                neighbor,
+                                first_edge,
+                                edge
+                                ))
@@ -0,0 +1,385 @@
+# Copyright (C) 2017 Antoine Fourmy <antoine dot fourmy at gmail dot com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import pickle
+import struct
+import zlib
+from collections import OrderedDict
+from io import BytesIO
+from networks.graph import gc_paused
+from networks.loader import ProjectLoader
+from objects.objects import *
+from objects.properties import property_classes
+
+# Snapshot of a project: a binary file with the same content as an Excel
+# or YAML export (nodes, links, interfaces, AS, areas, per-AS properties and
+# sites), made to be written and read fast.
+# The file starts with a header:
+# - the magic string and the version of the format
+# - the index of the sections: (name, size) of each section, in the order
+# in which they are loaded (the order of the project loader, see 
+# networks/loader.py, with all node subtypes first)
+# Each section is stored in columns: a dictionnary associating a column
+# (for objects, a property) to the list of its values, one per object. The
+# references to other objects are stored as names.
+# The sections are pickled (with builtin types only: they are unpickled
+# without allowing any class to be loaded) and compressed with zlib one by
+# one, so that a section is only read and decompressed when it is loaded.
+# When a snapshot is loaded, the objects are built from the columns and
+# registered in the network directly, without the node / link factories
+# and their name lookups.
+
+MAGIC = b'pyNMS-snapshot\n'
+VERSION = 1
+HEADER = struct.Struct('<HI')
+
+section_order = tuple(
+                      [subtype for subtype in object_ie if subtype in node_subtype]
+                      + [name for name in ProjectLoader.import_order 
+                         if name not in node_subtype]
+                      )
+
+interface_properties = OrderedDict([
+('ethernet interface', ('name', 'ip_address', 'subnet_mask', 'mac_address')),
+('optical interface', ('name',))
+])
+
+# value of a property with builtin types only: objects are replaced with
+# their name, and IP addresses with their string ('address/subnet')
+def plain(value):
+    if value is None or type(value) in (bool, int, float, str):
+        return value
+    if isinstance(value, NDobject):
+        return str(value.name)
+    if isinstance(value, int):
+        return int(value)
+    if isinstance(value, float):
+        return float(value)
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return list(map(plain, value))
+    if isinstance(value, dict):
+        return {plain(key): plain(item) for key, item in value.items()}
+    return str(value)
+
+# per-AS properties: the keys are either property names or property 
+# classes (Excel import), stored as (name, is a class, value)
+def plain_perAS(properties):
+    return [
+            (getattr(key, 'name', key), isinstance(key, MetaProperty), plain(value))
+            for key, value in properties.items()
+            ]
+
+def perAS(properties):
+    for name, is_class, value in properties:
+        yield property_classes[name] if is_class else name, value
+
+class RestrictedUnpickler(pickle.Unpickler):
+
+    def find_class(self, module, name):
+        raise pickle.UnpicklingError('forbidden class {}.{}'.format(module, name))
+
+def loads(data):
+    return RestrictedUnpickler(BytesIO(data)).load()
+
+## Export
+
+def snapshot_sections(network, sites=None):
+    for subtype, properties in object_ie.items():
+        if subtype == 'site':
+            if sites is None:
+                continue
+            objects = list(sites.nodes.values())
+        else:
+            objects = list(network.ftr(subtype_to_type[subtype], subtype))
+        if objects:
+            yield subtype, dict(
+                (property.name, [plain(getattr(obj, property.name)) for obj in objects])
+                for property in properties
+                )
+
+    for subtype, properties in interface_properties.items():
+        interfaces = list(network.ftr('interface', subtype))
+        if interfaces:
+            columns = dict((
+                                  ('link', [i.link.name for i in interfaces]),
+                                  ('node', [i.node.name for i in interfaces])
+                                  ))
+            for property in properties:
+                columns[property] = [
+                                     plain(getattr(i, property, None))
+                                     for i in interfaces
+                                     ]
+            yield subtype, columns
+
+    pool_AS = list(network.pnAS.values())
+    if pool_AS:
+        yield 'AS', dict((
+            ('name', [AS.name for AS in pool_AS]),
+            ('AS_type', [AS.AS_type for AS in pool_AS]),
+            ('id', [plain(AS.id) for AS in pool_AS]),
+            ('nodes', [plain(AS.pAS['node']) for AS in pool_AS]),
+            ('links', [plain(AS.pAS['link']) for AS in pool_AS])
+            ))
+
+        areas = [
+                 area for AS in pool_AS if AS.has_area
+                 for area in AS.areas.values()
+                 ]
+        if areas:
+            yield 'area', dict((
+                ('name', [area.name for area in areas]),
+                ('AS', [area.AS.name for area in areas]),
+                ('id', [plain(area.id) for area in areas]),
+                ('nodes', [plain(area.pa['node']) for area in areas]),
+                ('links', [plain(area.pa['link']) for area in areas])
+                ))
+
+        rows = [(AS, node) for AS in pool_AS for node in AS.nodes]
+        yield 'per-AS node properties', dict((
+            ('AS', [AS.name for AS, _ in rows]),
+            ('node', [node.name for _, node in rows]),
+            ('properties', [plain_perAS(node.AS_properties[AS.name]) for AS, node in rows])
+            ))
+
+        rows = [
+                (AS, interface) for AS in pool_AS if AS.AS_type != 'BGP'
+                for link in AS.links
+                for interface in (link.interfaceS, link.interfaceD)
+                ]
+        yield 'per-AS interface properties', dict((
+            ('AS', [AS.name for AS, _ in rows]),
+            ('link', [interface.link.name for _, interface in rows]),
+            ('node', [interface.node.name for _, interface in rows]),
+            ('properties', [
+                            plain_perAS(interface.AS_properties[AS.name])
+                            for AS, interface in rows
+                            ])
+            ))
+
+    if sites is not None and sites.nodes:
+        pool_site = list(sites.nodes.values())
+        yield 'sites', dict((
+            ('name', [site.name for site in pool_site]),
+            ('nodes', [plain(site.ps['node']) for site in pool_site]),
+            ('links', [plain(site.ps['link']) for site in pool_site])
+            ))
+
+def save_snapshot(filepath, network, sites=None, level=6):
+    sections = sorted(
+                      (
+                       (name, zlib.compress(pickle.dumps(columns, 4), level))
+                       for name, columns in snapshot_sections(network, sites)
+                       ),
+                      key = lambda section: section_order.index(section[0])
+                      )
+    index = pickle.dumps([(name, len(data)) for name, data in sections], 4)
+    with open(filepath, 'wb') as file:
+        file.write(MAGIC)
+        file.write(HEADER.pack(VERSION, len(index)))
+        file.write(index)
+        for _, data in sections:
+            file.write(data)
+
+## Import
+
+class Snapshot(object):
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        with open(filepath, 'rb') as file:
+            if file.read(len(MAGIC)) != MAGIC:
+                raise ValueError('{} is not a pyNMS snapshot'.format(filepath))
+            version, index_size = HEADER.unpack(file.read(HEADER.size))
+            if version > VERSION:
+                raise ValueError('unsupported snapshot version {}'.format(version))
+            self.version = version
+            # section name -> (offset, size)
+            self.index, offset = OrderedDict(), file.tell() + index_size
+            for name, size in loads(file.read(index_size)):
+                self.index[name] = (offset, size)
+                offset += size
+        # sections already read
+        self.sections = {}
+
+    # columns of a section, read and decompressed the first time it is used
+    def section(self, name):
+        if name not in self.sections:
+            offset, size = self.index[name]
+            with open(self.filepath, 'rb') as file:
+                file.seek(offset)
+                self.sections[name] = loads(zlib.decompress(file.read(size)))
+        return self.sections[name]
+
+    # rows of a section: one dictionnary (column -> value) per row
+    def rows(self, name):
+        columns = self.section(name)
+        return (dict(zip(columns, values)) for values in zip(*columns.values()))
+
+    # load the snapshot in a network (and its sites in the site network,
+    # if there is one). If 'sections' is given, only these sections are
+    # loaded: the sections they refer to must have been loaded already
+    def load(self, network, sites=None, sections=None):
+        SnapshotLoader(self, network, sites).load(sections)
+
+# the objects are created with an object builder (see objects/objects.py):
+# the values of a snapshot are already plain values of the right type, and
+# are not converted
+def samples(columns):
+    return {name: values[0] for name, values in columns.items() if values}
+
+class SnapshotLoader(object):
+
+    def __init__(self, snapshot, network, sites=None):
+        self.snapshot = snapshot
+        self.network = network
+        self.sites = sites
+        # links of the network, by name
+        self.links = {link.name: link for link in network.all_links()}
+
+    def node(self, name, network=None):
+        network = network or self.network
+        return network.nodes[network.name_to_id[name]]
+
+    # convert the value of a property to a pyNMS object, if needed
+    def converters(self, names):
+        converters = {}
+        for name in names:
+            property = property_classes.get(name)
+            if property is None or not property.conversion_needed:
+                continue
+            converters[name] = {
+                                'convert_node': self.node,
+                                'convert_link': self.links.__getitem__,
+                                'convert_IP': self.network.OIPf
+                                }[property.converter]
+        return converters
+
+    # the garbage collector is paused while the objects are created (see 
+    # networks/graph.py)
+    @gc_paused
+    def load(self, sections=None):
+        for name in self.snapshot.index:
+            if sections is None or name in sections:
+                self.load_section(name)
+                
+    def load_section(self, name):
+        if name in node_subtype:
+            self.load_nodes(name)
+        elif name in link_subtype:
+            self.load_links(name)
+        elif name in interface_properties:
+            self.load_interfaces(name)
+        else:
+            getattr(self, 'load_' + name.replace('-', '').replace(' ', '_'))()
+
+    def load_nodes(self, subtype):
+        network = self.network
+        if subtype == 'site':
+            if self.sites is None:
+                return
+            network = self.sites
+        columns = self.snapshot.section(subtype)
+        converters = self.converters(columns)
+        created, build = [], ObjectBuilder(node_class[subtype], samples(columns))
+        for values in zip(*columns.values()):
+            kwargs = dict(zip(columns, values))
+            for name, converter in converters.items():
+                if kwargs[name] is not None:
+                    kwargs[name] = converter(kwargs[name])
+            if kwargs['name'] in network.name_to_id:
+                self.node(kwargs['name'], network).update_properties(kwargs)
+                continue
+            kwargs['id'] = network.cpt_node
+            network.cpt_node += 1
+            node = build(kwargs)
+            network.register_node(node)
+            created.append(node)
+        self.created(network, created)
+
+    def load_links(self, subtype):
+        network, columns = self.network, self.snapshot.section(subtype)
+        converters = self.converters(columns)
+        created, build = [], ObjectBuilder(link_class_with_vc[subtype], samples(columns))
+        for values in zip(*columns.values()):
+            kwargs = dict(zip(columns, values))
+            for name, converter in converters.items():
+                if kwargs[name] is not None:
+                    kwargs[name] = converter(kwargs[name])
+            if kwargs['name'] in self.links:
+                self.links[kwargs['name']].update_properties(kwargs)
+                continue
+            kwargs['id'] = network.cpt_link
+            network.cpt_link += 1
+            link = build(kwargs)
+            network.register_link(link)
+            self.links[link.name] = link
+            created.append(link)
+        self.created(network, created)
+
+    def created(self, network, objects):
+        if objects:
+            network.compiled_graph = None
+            network.bump('topology')
+            network.mark('added', *objects)
+
+    # as in an Excel import, a string IP address ('address/subnet') is
+    # converted to an IP address attached to the interface
+    def load_interfaces(self, subtype):
+        for row in self.snapshot.rows(subtype):
+            link, node = self.links[row.pop('link')], self.node(row.pop('node'))
+            interface = link('interface', node)
+            for property, value in row.items():
+                if property == 'ip_address' and value and '/' in value:
+                    value = self.network.OIPf(value, interface)
+                setattr(interface, property, value)
+
+    def load_AS(self):
+        for row in self.snapshot.rows('AS'):
+            self.network.AS_factory(
+                                    row['AS_type'],
+                                    row['name'],
+                                    row['id'],
+                                    set(map(self.links.__getitem__, row['links'])),
+                                    set(map(self.node, row['nodes'])),
+                                    True
+                                    )
+
+    def load_area(self):
+        for row in self.snapshot.rows('area'):
+            self.network.pnAS[row['AS']].area_factory(
+                                    row['name'],
+                                    row['id'],
+                                    set(map(self.links.__getitem__, row['links'])),
+                                    set(map(self.node, row['nodes']))
+                                    )
+
+    def load_perAS_node_properties(self):
+        for row in self.snapshot.rows('per-AS node properties'):
+            node = self.node(row['node'])
+            for property, value in perAS(row['properties']):
+                node(row['AS'], property, value)
+
+    def load_perAS_interface_properties(self):
+        for row in self.snapshot.rows('per-AS interface properties'):
+            interface = self.links[row['link']]('interface', self.node(row['node']))
+            for property, value in perAS(row['properties']):
+                interface(row['AS'], property, value)
+
+    def load_sites(self):
+        if self.sites is None:
+            return
+        for row in self.snapshot.rows('sites'):
+            site = self.node(row['name'], self.sites)
+            site.add_to_site(*map(self.node, row['nodes']))
+            site.add_to_site(*map(self.links.__getitem__, row['links']))
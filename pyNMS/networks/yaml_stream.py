@@ -0,0 +1,168 @@
+# Copyright (C) 2017 Antoine Fourmy <antoine dot fourmy at gmail dot com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import warnings
+try:
+    import yaml
+    from yaml import (
+                      ScalarNode,
+                      SequenceNode,
+                      MappingNode,
+                      ScalarEvent,
+                      SequenceStartEvent,
+                      SequenceEndEvent,
+                      MappingStartEvent,
+                      MappingEndEvent,
+                      StreamStartEvent,
+                      StreamEndEvent,
+                      DocumentStartEvent,
+                      DocumentEndEvent
+                      )
+    # the libyaml (C) loader and dumper are several times faster than the
+    # pure Python ones, but they are not always available
+    SafeLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+    SafeDumper = getattr(yaml, 'CSafeDumper', yaml.SafeDumper)
+except ImportError:
+    warnings.warn('Excel/YAML libraries missing')
+
+# Streaming read and write of a YAML project, without building the whole
+# document in memory.
+# A project is a mapping of sections (one per subtype), each section being
+# a mapping of objects (name -> properties). The file is read and written
+# one object at a time, at the event level:
+# - 'read_sections' yields the sections in the order of the file, each
+# with a generator of its objects, which must be consumed before the next
+# section is read (the objects that were not read are skipped)
+# - 'SectionWriter' writes the sections one after the other, from any
+# iterable of objects
+
+str_tag = 'tag:yaml.org,2002:str'
+
+# the parser only gives events: a node is composed from the events of one
+# object, then constructed and forgotten
+def compose(loader):
+    event = loader.get_event()
+    if isinstance(event, ScalarEvent):
+        tag = event.tag
+        if tag is None or tag == '!':
+            tag = loader.resolve(ScalarNode, event.value, event.implicit)
+        return ScalarNode(
+                          tag,
+                          event.value,
+                          event.start_mark,
+                          event.end_mark,
+                          event.style
+                          )
+    if isinstance(event, SequenceStartEvent):
+        tag = event.tag
+        if tag is None or tag == '!':
+            tag = loader.resolve(SequenceNode, None, event.implicit)
+        node = SequenceNode(tag, [], event.start_mark, None, event.flow_style)
+        while not loader.check_event(SequenceEndEvent):
+            node.value.append(compose(loader))
+        node.end_mark = loader.get_event().end_mark
+        return node
+    if isinstance(event, MappingStartEvent):
+        tag = event.tag
+        if tag is None or tag == '!':
+            tag = loader.resolve(MappingNode, None, event.implicit)
+        node = MappingNode(tag, [], event.start_mark, None, event.flow_style)
+        while not loader.check_event(MappingEndEvent):
+            node.value.append((compose(loader), compose(loader)))
+        node.end_mark = loader.get_event().end_mark
+        return node
+    # a pyNMS project has no anchor: an alias cannot be resolved when the
+    # nodes it refers to have been forgotten
+    raise yaml.composer.ComposerError(
+                                      None,
+                                      None,
+                                      'aliases are not supported',
+                                      event.start_mark
+                                      )
+
+def construct(loader):
+    value = loader.construct_object(compose(loader), deep=True)
+    loader.constructed_objects.clear()
+    loader.recursive_objects.clear()
+    return value
+
+def read_objects(loader):
+    # an empty section can be a null value
+    if loader.check_event(ScalarEvent):
+        loader.get_event()
+        return
+    loader.get_event()
+    while not loader.check_event(MappingEndEvent):
+        yield construct(loader), construct(loader)
+    loader.get_event()
+
+def read_sections(file):
+    loader = SafeLoader(file)
+    try:
+        loader.get_event()
+        if loader.check_event(StreamEndEvent):
+            return
+        loader.get_event()
+        if not loader.check_event(MappingStartEvent):
+            raise ValueError('A YAML project must be a mapping of sections')
+        loader.get_event()
+        while not loader.check_event(MappingEndEvent):
+            objects = read_objects(loader)
+            yield construct(loader), objects
+            for _ in objects:
+                pass
+    finally:
+        loader.dispose()
+
+class SectionWriter(object):
+
+    def __init__(self, file):
+        self.dumper = SafeDumper(file, default_flow_style=False)
+
+    def __enter__(self):
+        self.dumper.emit(StreamStartEvent())
+        self.dumper.emit(DocumentStartEvent(explicit=False))
+        self.dumper.emit(MappingStartEvent(None, None, True, flow_style=False))
+        return self
+
+    def __exit__(self, *args):
+        # the document is not closed if an exception was raised
+        if args[0] is None:
+            self.dumper.emit(MappingEndEvent())
+            self.dumper.emit(DocumentEndEvent(explicit=False))
+            self.dumper.emit(StreamEndEvent())
+        self.dumper.dispose()
+
+    # a string is quoted when it would otherwise be read as another type
+    # (e.g '1.0' or 'True')
+    def scalar(self, value):
+        implicit = (
+                    self.dumper.resolve(ScalarNode, value, (True, False)) == str_tag,
+                    self.dumper.resolve(ScalarNode, value, (False, True)) == str_tag
+                    )
+        self.dumper.emit(ScalarEvent(None, None, implicit, value))
+
+    # 'objects' is an iterable of (name, properties), where properties is
+    # a dictionnary of strings
+    def section(self, name, objects):
+        self.scalar(name)
+        self.dumper.emit(MappingStartEvent(None, None, True, flow_style=False))
+        for obj, properties in objects:
+            self.scalar(obj)
+            self.dumper.emit(MappingStartEvent(None, None, True, flow_style=False))
+            for property, value in properties.items():
+                self.scalar(property)
+                self.scalar(value)
+            self.dumper.emit(MappingEndEvent())
+        self.dumper.emit(MappingEndEvent())
@@ -83,14 +83,20 @@ class InterfaceWindow(QWidget):
             line_edit.setText(self.interface(AS, property.name))
             
     def closeEvent(self, _):
+        edited = False
         for property, edit in self.dict_global_properties.items():
             value = self.network.objectizer(property.name, edit.text())
+            edited |= getattr(self.interface, property.name) != value
             setattr(self.interface, property.name, value)
             
         if self.interface.AS_properties:
             AS = self.AS_list.currentText()
             for property, edit in self.dict_perAS_properties.items():
                 value = self.network.objectizer(property.name, edit.text())
+                edited |= self.interface(AS, property.name) != value
                 self.interface(AS, property.name, value)
                 
+        if edited:
+            self.network.bump('cost')
+                
         self.close()
\ No newline at end of file
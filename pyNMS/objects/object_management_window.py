@@ -127,6 +127,10 @@ class ObjectManagementWindow(QWidget):
             entry.text = str(self.current_obj.AS_properties[AS][property])
         
     def closeEvent(self, _):
+        # the network versions are bumped only if a property was actually
+        # edited, so that closing the window does not invalidate the 
+        # routing and switching tables
+        edited = False
         for property, property_widget in self.dict_global_properties.items():
             try:
                 value = property_widget.text()
@@ -134,6 +138,7 @@ class ObjectManagementWindow(QWidget):
                 value = property_widget.text
             # convert 'None' to None if necessary
             value = None if value == 'None' else value              
+            edited |= str(getattr(self.current_obj, property.name)) != str(value)
             if property.name == 'sites':
                 value = filter(None, set(re.sub(r'\s+', '', value).split(',')))
                 value = set(map(self.site_network.convert_node, value))
@@ -153,6 +158,9 @@ class ObjectManagementWindow(QWidget):
                         self.network.name_to_id[value] = id
                     if property.is_editable:
                         setattr(self.current_obj, property.name, value)
+        if edited:
+            self.network.bump('cost')
+            self.network.mark('modified', self.current_obj)
              
         # if hasattr(self.current_obj, 'AS_properties'):
         #     if self.current_obj.AS_properties:
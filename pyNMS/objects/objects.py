@@ -14,10 +14,25 @@
 
 # ordered dicts are needed to have the same menu order 
 from collections import defaultdict, OrderedDict
+from functools import wraps
 from .properties import *
 
-# decorating __init__ to initialize properties
+# creates a property that is not an existing NetDim property (e.g a column
+# of an imported file), and adds it everywhere it is needed for the objects
+# of a subtype, so that it's properly added to the model and displayed. 
+# It is also automatically made exportable
+def add_property(subtype, name, base):
+    property = type(name, (base,), {'name': name, 'pretty_name': name})
+    property_classes[name] = property
+    for property_manager in (object_properties, object_ie, box_properties):
+        property_manager[subtype] += (property,)
+    return property
+
+# decorating __init__ to initialize properties. The undecorated __init__ 
+# is available as __init__.__wrapped__, for objects whose properties are
+# set directly (see networks/snapshot.py)
 def initializer(init):
+    @wraps(init)
     def wrapper(self, **properties):
         for property_name, value in properties.items():
             # if the imported property is not an existing NetDim property,
@@ -25,20 +40,11 @@ def initializer(init):
             # properly added to the model and displayed
             # it is also automatically made exportable
             if property_name not in property_classes:
-                property = type(
-                                property_name, 
-                                (class_to_property[type(value)],), 
-                                {
-                                'name': property_name, 
-                                'pretty_name': property_name
-                                })
-                property_classes[property_name] = property
-                for property_manager in (
-                                        object_properties,
-                                        object_ie,
-                                        box_properties,
-                                        ):
-                    property_manager[self.__class__.subtype] += (property,)
+                add_property(
+                             self.__class__.subtype, 
+                             property_name, 
+                             class_to_property[type(value)]
+                             )
                 setattr(self, property_name, value)
             else:
                 property = property_classes[property_name]
@@ -48,8 +54,11 @@ def initializer(init):
                     property.values.append(value)
                 setattr(self, property_name, property(value))
                 
-        for property in object_properties[self.__class__.subtype]:
-            if not hasattr(self, property.name):
+        # the immutable default values are class attributes (see 
+        # 'set_class_defaults'): they are not set on the object
+        cls = self.__class__
+        for property in object_properties[cls.subtype]:
+            if not hasattr(cls, property.name) and not hasattr(self, property.name):
                 # if the value should be an empty list / set, we make
                 # sure it refers to different objects in memory by using eval
                 try:
@@ -62,6 +71,68 @@ def initializer(init):
         init(self)
     return wrapper
 
+# default values that can be shared by several objects
+immutable_types = (type(None), bool, int, float, str, tuple, frozenset)
+
+# An object builder creates the objects of a class without going through
+# the initializer: the default values of the properties, and the properties
+# to create, are found once for all the objects instead of once per object.
+# The values of an object are set directly, then the undecorated __init__ 
+# creates its internal structures (e.g the interfaces of a physical link).
+# 'samples' associates the properties set by the objects to a value, used
+# to create the properties that do not exist yet. With 'convert', the 
+# values are converted by their property class, as in the initializer.
+class ObjectBuilder(object):
+    
+    def __init__(self, cls, samples, convert=False):
+        self.cls = cls
+        self.init = cls.__init__.__wrapped__
+        self.convert = convert
+        # properties created by the builder: their values are not converted
+        self.created = set()
+        for name, value in samples.items():
+            if name not in property_classes:
+                base = class_to_property.get(type(value), TextProperty)
+                add_property(cls.subtype, name, base)
+                self.created.add(name)
+        # as in the initializer, class attributes (e.g the subtype) are not
+        # set on the object. Immutable default values are shared by all
+        # objects, the others (e.g an empty set) are created for each object
+        self.constants, self.defaults = {}, []
+        for property in object_properties[cls.subtype]:
+            if hasattr(cls, property.name):
+                continue
+            # properties without default value (e.g the source of a link)
+            # must be set by the objects
+            try:
+                value = property()
+            except TypeError:
+                continue
+            if isinstance(value, immutable_types):
+                self.constants[property.name] = value
+            else:
+                self.defaults.append(property)
+        
+    def __call__(self, kwargs):
+        obj = self.cls.__new__(self.cls)
+        if self.convert:
+            for name, value in kwargs.items():
+                if name in self.created:
+                    continue
+                property = property_classes[name]
+                if property.multiple_values and value not in property.values:
+                    property.values.append(value)
+                kwargs[name] = property(value)
+        values = self.constants.copy()
+        for property in self.defaults:
+            if property.name not in kwargs:
+                values[property.name] = property()
+        values.update(kwargs)
+        for name, value in values.items():
+            setattr(obj, name, value)
+        self.init(obj)
+        return obj
+
     
 ## NetDim objects
 
@@ -507,12 +578,45 @@ name_to_type = {v: k for k, v in type_to_name.items()}
 
 ## NetDim objects
 
+# An attribute created the first time it is used (e.g the routing table of
+# a router, or the dictionnary of graphical items of an object displayed in
+# no view). The value is stored in the slot of the same name, prefixed with
+# an underscore.
+class LazyAttribute(object):
+    
+    def __init__(self, factory):
+        self.factory = factory
+        
+    def __set_name__(self, owner, name):
+        self.slot = getattr(owner, '_' + name)
+        
+    def __get__(self, obj, owner):
+        if obj is None:
+            return self
+        try:
+            return self.slot.__get__(obj, owner)
+        except AttributeError:
+            value = self.factory()
+            self.slot.__set__(obj, value)
+            return value
+            
+    def __set__(self, obj, value):
+        self.slot.__set__(obj, value)
+        
+# The attributes that all objects of a class have are slots, and the 
+# immutable default values of the properties are class attributes (see
+# 'set_class_defaults'). The other values (properties imported from a file, 
+# values that differ from the default value) are stored in the __dict__ of 
+# the object, which is only created when it is needed.
+
 class NDobject(object):
     
-    def __init__(self):
-        self.gobject = {}
-        # sites is the set of sites the object belongs to
-        self.sites = set()
+    __slots__ = ('__dict__', 'id', 'name', '_gobject', '_sites')
+    
+    # dictionnary that associates a graphical item to a view
+    gobject = LazyAttribute(dict)
+    # sites is the set of sites the object belongs to
+    sites = LazyAttribute(set)
         
     def update_properties(self, kwargs):
         for k in kwargs:
@@ -521,41 +625,33 @@ class NDobject(object):
             # properly added to the model and displayed
             # it is also automatically made exportable
             if k not in property_classes:
-                new_property = type(k, (TextProperty,), {'name':k,
-                                                    'pretty_name':k})
-                property_classes[k] = new_property
-                for property_manager in (
-                                            object_properties,
-                                            object_ie,
-                                            box_properties,
-                                            ):
-                    property_manager[self.__class__.subtype] += (new_property,) 
+                add_property(self.__class__.subtype, k, TextProperty)
             property = property_classes[k]
             setattr(self, k, property(kwargs[k]))
 
 ## Nodes
 class Node(NDobject):
     
+    __slots__ = ('_gnode', '_AS', '_AS_properties', '_napalm_data')
+    
     class_type = type = 'node'
 
-    def __init__(self):
-        # dictionnary that associates a graphical item to a view
-        self.gnode = {}
+    # dictionnary that associates a graphical item to a view
+    gnode = LazyAttribute(dict)
 
-        # list of AS to which the node belongs. AS is actually a dictionnary
-        # associating an AS to a set of area the node belongs to
-        self.AS = defaultdict(set)
+    # list of AS to which the node belongs. AS is actually a dictionnary
+    # associating an AS to a set of area the node belongs to
+    AS = LazyAttribute(lambda: defaultdict(set))
 
-        # AS_properties contains all per-AS properties: It is a dictionnary 
-        # which AS name are the keys (it is easier to store AS names rather 
-        # than AS itself: if we have the AS, AS.name is the name, while if we 
-        # have the name, it is more verbose to retrieve the AS itself)
-        self.AS_properties = defaultdict(dict)
-        
-        # NAPALM data
-        self.napalm_data = {}
-        super().__init__()
-        
+    # AS_properties contains all per-AS properties: It is a dictionnary 
+    # which AS name are the keys (it is easier to store AS names rather 
+    # than AS itself: if we have the AS, AS.name is the name, while if we 
+    # have the name, it is more verbose to retrieve the AS itself)
+    AS_properties = LazyAttribute(lambda: defaultdict(dict))
+    
+    # NAPALM data
+    napalm_data = LazyAttribute(dict)
+    
     def __repr__(self):
         return str(self.name)
         
@@ -608,34 +704,40 @@ class Site(Node):
         
 class Router(Node):
     
+    __slots__ = ('_rt', '_arpt', '_rarpt', '_bgpt')
+    
     color = 'magenta'
     subtype = 'router'
     layer = 3
     imagex, imagey = 33, 25
+    
+    # routing table: binds an IP address to a cost / next-hop
+    rt = LazyAttribute(dict)
+    # arp table: binds an IP to a tuple (MAC address, outgoing interface)
+    arpt = LazyAttribute(dict)
+    # reverse arp table: the other way around
+    rarpt = LazyAttribute(dict)
+    # bgp table
+    bgpt = LazyAttribute(lambda: defaultdict(set))
                     
     @initializer
     def __init__(self, **kwargs):
-        # routing table: binds an IP address to a cost / next-hop
-        self.rt = {}
-        # arp table: binds an IP to a tuple (MAC address, outgoing interface)
-        self.arpt = {}
-        # reverse arp table: the other way around
-        self.rarpt = {}
-        # bgp table
-        self.bgpt = defaultdict(set)
         super().__init__()
         
 class Switch(Node):
+    
+    __slots__ = ('_st',)
 
     color = 'black'
     subtype = 'switch'
     layer = 2
     imagex, imagey = 54, 36
     
+    # switching table: binds a MAC address to an outgoing interface
+    st = LazyAttribute(dict)
+    
     @initializer
     def __init__(self, **kwargs):
-        # switching table: binds a MAC address to an outgoing interface
-        self.st = {}
         super().__init__()
         
 class OXC(Node):
@@ -773,12 +875,13 @@ class Port(Node):
 ## Links
 class Link(NDobject):
     
+    __slots__ = ('_glink', 'source', 'destination')
+    
     class_type = 'link'
     
-    def __init__(self):
-        self.glink = {}
-        super().__init__()
-        
+    # dictionnary that associates a graphical item to a view
+    glink = LazyAttribute(dict)
+    
     def __repr__(self):
         return str(self.name)
         
@@ -793,22 +896,22 @@ class Link(NDobject):
 
 class PhysicalLink(Link):
     
+    __slots__ = ('_AS', 'interfaceS', 'interfaceD')
+    
     type = 'plink'
     layer = 1
     dash = ()
     
-    def __init__(self):
-        self.sntw = None
-        self.trafficSD = self.trafficDS = 0.
-        self.wctrafficSD = self.wctrafficDS = 0.
-        self.wcfailure = None
-        self.flowSD = self.flowDS = 0.
-        # list of AS to which the physical links belongs. AS is actually 
-        # a dictionnary associating an AS to a set of area the physical links 
-        # belongs to
-        self.AS = defaultdict(set)
-        super().__init__()
-        
+    sntw = None
+    trafficSD = trafficDS = 0.
+    wctrafficSD = wctrafficDS = 0.
+    wcfailure = None
+    flowSD = flowDS = 0.
+    # list of AS to which the physical links belongs. AS is actually 
+    # a dictionnary associating an AS to a set of area the physical links 
+    # belongs to
+    AS = LazyAttribute(lambda: defaultdict(set))
+    
     @property
     def bw(self):
         return {
@@ -884,17 +987,20 @@ class OpticalLink(PhysicalLink):
             
 class Interface(NDobject):
     
+    __slots__ = ('node', 'link', '_AS_properties')
+    
     type = 'interface'
+    
+    # AS_properties contains all per-AS properties: interface cost, 
+    # interface role. It is a dictionnary which AS name are the keys 
+    # (it is easier to store AS names rather than AS itself: if we have the
+    # AS, AS.name is the name, while if we have the name, it is more 
+    # verbose to retrieve the AS itself)
+    AS_properties = LazyAttribute(lambda: defaultdict(dict))
         
     @initializer
     def __init__(self, **kwargs):
         self.name = ''
-        # AS_properties contains all per-AS properties: interface cost, 
-        # interface role. It is a dictionnary which AS name are the keys 
-        # (it is easier to store AS names rather than AS itself: if we have the
-        # AS, AS.name is the name, while if we have the name, it is more 
-        # verbose to retrieve the AS itself)
-        self.AS_properties = defaultdict(dict)
         super().__init__()
         
     def __eq__(self, other):
@@ -1180,3 +1286,25 @@ type_to_subtype = {
 # per-type name to object association
 node_name_to_obj = OrderedDict((obj_to_name[node], node) for node in node_subtype)
 link_name_to_obj = OrderedDict((obj_to_name[link], link) for link in link_subtype)
+
+# the immutable default values of the properties of a class are set as 
+# class attributes: an object only stores the values that were set
+def set_class_defaults(cls):
+    for property in object_properties.get(cls.subtype, ()):
+        if hasattr(cls, property.name):
+            continue
+        # properties without default value (e.g the source of a link)
+        try:
+            value = property()
+        except TypeError:
+            continue
+        if isinstance(value, immutable_types):
+            setattr(cls, property.name, value)
+            
+for cls in (
+            *node_class.values(), 
+            *link_class_with_vc.values(), 
+            EthernetInterface, 
+            OpticalInterface
+            ):
+    set_class_defaults(cls)
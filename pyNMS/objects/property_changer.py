@@ -54,4 +54,6 @@ class PropertyChanger(QWidget):
         value = self.network.objectizer(selected_property.name, str_value)
         for object in objects:
             setattr(object, selected_property.name, value)
+        self.network.bump('cost')
+        self.network.mark('modified', *objects)
         self.close()
\ No newline at end of file
@@ -18,10 +18,12 @@ from views.main_network_view import MainNetworkView
 from views.site_view import SiteView
 from objects.objects import *
 from objects.properties import property_classes
+from networks.loader import ProjectLoader
+from networks.snapshot import save_snapshot
+from networks.yaml_stream import SectionWriter
 try:
     import xlrd
     import xlwt
-    from yaml import dump, load
 except ImportError:
     warnings.warn('Excel/YAML libraries missing')
 from PyQt5.QtWidgets import QWidget, QHBoxLayout, QFileDialog
@@ -29,43 +31,8 @@ from PyQt5.QtWidgets import QWidget, QHBoxLayout, QFileDialog
 
 class Project(QWidget):
     
-    # the order in which objects are imported is extremely important:
-    # - nodes must be imported first, before links
-    # - physical links must be imported second, before interface
-    # - interface must be imported third, for IP addresses to be created
-    # at interface import (the interface being specified at IP creation),
-    # else if a traffic link was imported before the interface, the IP
-    # address would be created via the ipS/D parameter and it would have
-    # no attached interface
-    # - then, the remaining links can be imported (routes, traffic)
-    # - AS and area can be imported
-    # - Finally, per-AS object properties can be imported
-    import_order = (
-                    'router',
-                    'switch',
-                    'oxc', 
-                    'host',
-                    'antenna',
-                    'regenerator',
-                    'splitter',
-                    'cloud',
-                    'site',
-                    'ethernet link',
-                    'ethernet interface',
-                    'optical link', 
-                    'optical interface',
-                    'etherchannel',
-                    'optical channel',
-                    'BGP peering',
-                    'pseudowire',
-                    'routed traffic',
-                    'static traffic',
-                    'AS',
-                    'area',
-                    'per-AS node properties',
-                    'per-AS interface properties',
-                    'sites'
-                    )
+    # the import order is the one of the project loader
+    import_order = ProjectLoader.import_order
     
     def __init__(self, controller, name):
         super().__init__(controller)
@@ -112,21 +79,25 @@ class Project(QWidget):
         self.controller.change_menu('innode')
         
     def refresh(self):
-        
-        commands = (
-                    self.current_view.network.update_AS_topology,
-                    self.current_view.network.vc_creation,
-                    self.current_view.network.interface_configuration,
-                    self.current_view.network.switching_table_creation,
-                    self.current_view.network.routing_table_creation,
-                    self.current_view.network.path_finder,
-                    self.current_view.refresh_display
-                    )
-        
-        for idx, boolean in enumerate(self.controller.routing_panel.checkboxes):
-            if boolean.isChecked():
-                commands[idx]()
+        network = self.current_view.network
+        # the stages of the refresh pipeline are run through the network
+        # stage cache: a stage is skipped if its inputs (topology, costs, 
+        # failures) did not change since its last run.
+        stages = tuple(network.stage_inputs)
+        checkboxes = self.controller.routing_panel.checkboxes
+        network.run_stages(*(
+                             stage for stage, boolean in zip(stages, checkboxes)
+                             if boolean.isChecked()
+                             ))
+        # the last checkbox is the display refresh
+        if checkboxes[len(stages)].isChecked():
+            self.current_view.refresh_display()
                 
+    # the import itself is done by the project loader, which doesn't depend
+    # on the GUI: the project only refreshes its views afterwards
+    def loader(self):
+        return ProjectLoader(self.network_view.network, self.site_view.network)
+        
     def yaml_import(self, filepath=None):
         if not filepath:
             filepath = QFileDialog.getOpenFileName(
@@ -134,27 +105,7 @@ class Project(QWidget):
                                             'Import project', 
                                             'Choose a project to import'
                                             )[0]
-                                
-        with open(filepath, 'r') as file:
-            yaml_project = load(file)
-            
-            for subtype in self.import_order:
-                if subtype not in yaml_project:
-                    continue
-                for obj, properties in yaml_project[subtype].items():
-                    kwargs = {}
-                    for property_name, value in properties.items():
-                        value = self.network.objectizer(property_name, value)
-                        kwargs[property_name] = value
-                    if subtype in node_subtype:
-                        if subtype == 'site':
-                            self.site_view.network.nf(subtype=subtype, **kwargs)
-                        else:
-
-                            self.network_view.network.nf(subtype=subtype, **kwargs)
-                    if subtype in link_subtype: 
-                        self.network_view.network.lf(subtype=subtype, **kwargs)
-                        
+        self.loader().yaml_import(filepath)
         self.network_view.refresh_display()
         self.network_view.move_to_geographical_coordinates()
         
@@ -172,22 +123,52 @@ class Project(QWidget):
         else:
             selected_file = open(filepath, 'w')
         
-        with open(filepath, 'w') as file:                                                            
-            project_objects = {
-            subtype: {
-                      str(obj.name):  {
-                                       property.name: str(getattr(obj, property.name))
-                                       for property in properties
-                                       }
-                      for obj in self.network_view.network.ftr(
-                                                subtype_to_type[subtype], 
-                                                subtype
-                                                )
+        # the sections are written in the import order of the loader, so
+        # that the objects can be created as they are read, and the objects
+        # one at a time, without building the whole project in memory
+        subtypes = [s for s in ProjectLoader.import_order if s in object_ie]
+        subtypes += [s for s in object_ie if s not in subtypes]
+        network = self.network_view.network
+        with open(filepath, 'w') as file, SectionWriter(file) as writer:
+            for subtype in subtypes:
+                writer.section(subtype, (
+                    (
+                     str(obj.name), 
+                     {
+                      property.name: str(getattr(obj, property.name))
+                      for property in object_ie[subtype]
                       }
-            for subtype, properties in object_ie.items()
-            }
-
-            dump(project_objects, file, default_flow_style=False)
+                     )
+                    for obj in network.ftr(subtype_to_type[subtype], subtype)
+                    ))
+    
+    def snapshot_import(self, filepath=None):
+        if not filepath:
+            filepath = QFileDialog.getOpenFileName(
+                                            self, 
+                                            'Import project', 
+                                            'Choose a snapshot to import'
+                                            )[0]
+        self.loader().snapshot_import(filepath)
+        self.network_view.refresh_display()
+        self.network_view.move_to_geographical_coordinates()
+        
+    # a snapshot (see networks/snapshot.py) contains the same objects as an
+    # Excel or YAML export, in a binary format made to be read fast
+    def snapshot_export(self, filepath=None):
+        if not filepath:
+            filepath = QFileDialog.getSaveFileName(
+                                                   self, 
+                                                   'Export project',
+                                                   self.name, 
+                                                   '.pnms'
+                                                   )
+            filepath = ''.join(filepath)
+        save_snapshot(
+                      filepath, 
+                      self.network_view.network, 
+                      self.site_view.network
+                      )
     
     def excel_import(self, filepath=None):
         if not filepath:
@@ -197,94 +178,7 @@ class Project(QWidget):
                                             'Import project', 
                                             'Choose a project to import'
                                             )[0]
-
-        book = xlrd.open_workbook(filepath)
-                                        
-        for name in self.import_order:
-            try:
-                sheet = book.sheet_by_name(name)
-            # if the sheet cannot be found, there's nothing to import
-            except xlrd.biffh.XLRDError:
-                continue
-            # nodes and links import
-            if name in all_subtypes:
-                properties = sheet.row_values(0)
-                for row in range(1, sheet.nrows):
-                    values = sheet.row_values(row)
-                    kwargs = self.network.mass_objectizer(properties, values)
-                    if name in node_subtype:
-                        if name == 'site':
-                            self.site_view.network.nf(subtype=name, **kwargs)
-                        else:
-                            self.network_view.network.nf(subtype=name, **kwargs)
-                    if name in link_subtype: 
-                        self.network_view.network.lf(subtype=name, **kwargs)
-                
-            # interface import
-            elif name in ('ethernet interface', 'optical interface'):
-                if_properties = sheet.row_values(0)
-                # creation of ethernet interfaces
-                for row_index in range(1, sheet.nrows):
-                    name, link, node, *args = sheet.row_values(row_index)
-                    link = self.network_view.network.convert_link(link)
-                    node = self.network_view.network.convert_node(node)
-                    interface = link('interface', node)
-                    for property, value in zip(if_properties[2:], args):
-                        # we convert all (valid) string IPs to an OIPs
-                        if property == 'ip_address' and value != 'none':
-                            value = self.network_view.network.OIPf(value, interface)
-                        setattr(interface, property, value)
-                        
-            # AS import
-            elif name == 'AS':
-                for row_index in range(1, sheet.nrows):
-                    name, AS_type, id, nodes, links = sheet.row_values(row_index)
-                    id = int(id)
-                    subtype = 'ethernet link' if AS_type != 'BGP' else 'BGP peering'
-                    nodes = self.network_view.network.convert_node_set(nodes)
-                    links = self.network_view.network.convert_link_set(links, subtype)
-                    self.network_view.network.AS_factory(AS_type, name, id, links, nodes, True)
-                
-            # area import
-            elif name == 'area':
-                for row_index in range(1, sheet.nrows):
-                    name, AS, id, nodes, links = sheet.row_values(row_index)
-                    AS = self.network_view.network.AS_factory(name=AS)
-                    nodes = self.network_view.network.convert_node_set(nodes)
-                    links = self.network_view.network.convert_link_set(links)
-                    new_area = AS.area_factory(name, int(id), links, nodes)
-                    
-            # per-AS node properties import
-            elif name == 'per-AS node properties':
-                for row_index in range(1, sheet.nrows):
-                    AS, node, *args = sheet.row_values(row_index)
-                    node = self.network_view.network.convert_node(node)
-                    for idx, property in enumerate(perAS_properties[node.subtype]):
-                        value = self.network.objectizer(property, args[idx])
-                        node(AS, property, value)
-                 
-            # import of site objects
-            elif name == 'sites':
-                for row_index in range(1, sheet.nrows):
-                    name, nodes, links = sheet.row_values(row_index)
-                    site = self.site_view.network.convert_node(name)
-                    links = set(self.network_view.network.convert_link_list(links))
-                    nodes = set(self.network_view.network.convert_node_list(nodes))
-                    site.add_to_site(*nodes)
-                    site.add_to_site(*links)
-                        
-            # per-AS interface properties import
-            else:
-                for row_index in range(1, sheet.nrows):
-                    AS, link, node, *args = sheet.row_values(row_index)
-                    AS = self.network_view.network.AS_factory(name=AS)
-                    link = self.network_view.network.convert_link(link)
-                    node = self.network_view.network.convert_node(node)
-                    interface = link('interface', node)
-                    for idx, property in enumerate(ethernet_interface_perAS_properties):
-                        value = self.network.objectizer(property, args[idx])
-                        interface(AS.name, property, value)   
-                        
+        self.loader().excel_import(filepath)
         self.network_view.refresh_display()
         self.network_view.move_to_geographical_coordinates()
         
@@ -0,0 +1,14 @@
+from PyQt5.QtWidgets import QApplication, QProgressDialog
+
+# progress dialog of an action run on many devices at once (see 
+# automation/device_actions.py): 'progress' is given to the action, and 
+# updates the dialog every time a device is done
+class QDevicesProgressDialog(QProgressDialog):
+    
+    def __init__(self, title, total):
+        super().__init__(title, None, 0, total)
+        self.show()
+        
+    def progress(self, done, total, node, error):
+        self.setValue(done)
+        QApplication.processEvents()
@@ -39,8 +39,5 @@ class BaseMenu(QMenu):
         self.view.node_selection = gnodes or set(self.view.all_gnodes())
         self.view.random_layout()
         if drawing != 'Random drawing':
-            self.view.drawing_algorithm = drawing
-            if hasattr(self.view, 'timer') and self.view.timer:
-                self.view.stop_timer()
-            self.view.timer = self.view.startTimer(1)
+            self.view.start_layout(drawing)
                         
\ No newline at end of file
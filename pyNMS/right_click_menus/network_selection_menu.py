@@ -13,6 +13,7 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import os
+import warnings
 from PyQt5.QtWidgets import QMenu, QAction
 from .selection_menu import SelectionMenu
 from automation.send_script_window import SendScriptWindow
@@ -29,9 +30,10 @@ import ip_networks.routing_table as ip_rt
 from ip_networks.troubleshooting import TroubleshootingWindow
 from sites.site_operations import SiteOperations
 from NAPALM.napalm_window import NapalmWindow
-from NAPALM.napalm_functions import standalone_napalm_update
+from NAPALM.napalm_functions import napalm_actions, NapalmCollector
 from collections import OrderedDict
 from objects.interface_window import InterfaceWindow
+from pyQT_widgets.Q_devices_progress_dialog import QDevicesProgressDialog
 from subprocess import Popen
                                 
 class NetworkSelectionMenu(SelectionMenu):
@@ -110,11 +112,11 @@ class NetworkSelectionMenu(SelectionMenu):
         if self.no_shape:
             
             simulate_failure = QAction('Simulate failure', self)        
-            simulate_failure.triggered.connect(lambda: self.simulate_failure(*self.items))
+            simulate_failure.triggered.connect(lambda: self.simulate_failure(*self.nodes, *self.links))
             self.addAction(simulate_failure)
             
             remove_failure = QAction('Remove failure', self)        
-            remove_failure.triggered.connect(lambda: self.remove_failure(*self.items))
+            remove_failure.triggered.connect(lambda: self.remove_failure(*self.nodes, *self.links))
             self.addAction(remove_failure)
             
             self.addSeparator()
@@ -262,8 +264,18 @@ class NetworkSelectionMenu(SelectionMenu):
         
     ## NAPALM operations:
     
+    # all nodes are updated concurrently, with a progress dialog updated
+    # every time a device is done
     def napalm_update(self, _):
-        standalone_napalm_update(*self.nodes)
+        nodes = list(self.nodes)
+        progress_dialog = QDevicesProgressDialog('NAPALM update', len(nodes))
+        with NapalmCollector(
+                             self.network.get_credentials, 
+                             progress = progress_dialog.progress
+                             ) as collector:
+            errors = collector.update(set(napalm_actions) | {'Logging'}, *nodes)
+        for node, error in errors.items():
+            warnings.warn('NAPALM update of {} failed: {}'.format(node, error))
     
     def napalm_data(self, _):
         node ,= self.nodes
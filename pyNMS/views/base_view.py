@@ -1,4 +1,5 @@
 from collections import defaultdict
+from contextlib import contextmanager
 from graphical_objects.graphical_node import GraphicalNode
 from graphical_objects.graphical_link import GraphicalLink
 from graphical_objects.graphical_text import GraphicalText
@@ -27,6 +28,8 @@ class BaseView(QGraphicsView):
     }
     
     selection_pen = QPen(QColor(Qt.red), 3)
+    
+    bsp_tree_depth = 10
         
     def __init__(self, controller):
         super().__init__()
@@ -43,6 +46,20 @@ class BaseView(QGraphicsView):
         self.selection = dict.fromkeys(self.controller.selection_panel.modes, True)
         # set of shapes
         self.shapes = set()
+        # True while nodes are moved in one batch (see bulk_update)
+        self.bulk_move = False
+        # level of detail: True when the view is in overview mode
+        self.overview = False
+        # parallel links hidden in overview mode
+        self.aggregated_glinks = set()
+        # the view only paints the items of the viewport, retrieved from the 
+        # BSP tree index of the scene. The depth of the tree is fixed: with 
+        # the default (automatic) depth, the whole tree is rebuilt as the 
+        # number of items grows, which takes seconds on large networks.
+        self.scene.setItemIndexMethod(QGraphicsScene.BspTreeIndex)
+        self.scene.setBspTreeDepth(self.bsp_tree_depth)
+        # no item restores the painter state it changes when it is painted
+        self.setOptimizationFlag(QGraphicsView.DontSavePainterState)
         
     ## Useful functions
     
@@ -89,9 +106,74 @@ class BaseView(QGraphicsView):
 
     def zoom_in(self):
         self.scale(1.25, 1.25)
+        self.update_level_of_detail()
         
     def zoom_out(self):
         self.scale(1/1.25, 1/1.25)
+        self.update_level_of_detail()
+        
+    ## Level of detail
+    
+    # below the overview scale, the view is in overview mode: nodes are drawn
+    # as points, labels are hidden, only one of the parallel links between 
+    # two nodes is drawn, and the view is not antialiased
+    overview_scale = 0.3
+    
+    # size (in pixels) and color of the points of the overview mode
+    point_size = 6
+    point_colors = {'default': QColor(40, 40, 40), 'red': QColor(Qt.red)}
+    point_pixmaps = {}
+    
+    @classmethod
+    def point_pixmap(cls, color):
+        if color not in cls.point_pixmaps:
+            pixmap = QPixmap(cls.point_size, cls.point_size)
+            pixmap.fill(Qt.transparent)
+            painter = QPainter(pixmap)
+            painter.setRenderHint(QPainter.Antialiasing)
+            painter.setPen(Qt.NoPen)
+            painter.setBrush(cls.point_colors[color])
+            painter.drawEllipse(pixmap.rect())
+            painter.end()
+            cls.point_pixmaps[color] = pixmap
+        return cls.point_pixmaps[color]
+    
+    def update_level_of_detail(self):
+        overview = self.transform().m11() < self.overview_scale
+        if overview != self.overview:
+            self.set_overview(overview)
+            
+    def set_overview(self, overview):
+        with self.bulk_update():
+            self.overview = overview
+            self.setRenderHint(QPainter.Antialiasing, not overview)
+            for gnode in self.all_gnodes():
+                gnode.set_level_of_detail(overview)
+            self.aggregate_links()
+            
+    # in overview mode, we hide all visible links between two nodes but one.
+    # An aggregated link is shown again only if its subtype is displayed
+    # and both its end nodes are still visible
+    def aggregate_links(self):
+        for glink in self.aggregated_glinks:
+            if (self.display[glink.link.subtype]
+                    and glink.source.isVisible()
+                    and glink.destination.isVisible()):
+                glink.show()
+        self.aggregated_glinks = set()
+        if not self.overview:
+            return
+        drawn = set()
+        for link in self.network.all_links():
+            glink = link.gobject.get(self)
+            if not glink or not glink.isVisible():
+                continue
+            ends = frozenset((glink.source, glink.destination))
+            if ends in drawn:
+                glink.hide()
+                self.aggregated_glinks.add(glink)
+            else:
+                drawn.add(ends)
         
     def wheelEvent(self, event):
         self.zoom_in() if event.angleDelta().y() > 0 else self.zoom_out()
@@ -189,6 +271,36 @@ class BaseView(QGraphicsView):
         for idx, node in enumerate(nodes):
             setattr(node, 'x'*horizontal or 'y', minimum + idx*offset)
             
+    ## Bulk updates
+    
+    # context in which many items are created or moved at once: the 
+    # viewport is not repainted until the end, and the links attached to a
+    # node are not updated when it moves (see move_gnodes)
+    @contextmanager
+    def bulk_update(self):
+        bulk_move, self.bulk_move = self.bulk_move, True
+        updates_enabled = self.viewport().updatesEnabled()
+        self.viewport().setUpdatesEnabled(False)
+        try:
+            yield
+        finally:
+            self.bulk_move = bulk_move
+            self.viewport().setUpdatesEnabled(updates_enabled)
+            self.viewport().update()
+    
+    # move the graphical nodes to the (xs, ys) positions in one batch: each
+    # node is moved with a single setPos call, and each attached link is 
+    # updated once, at the end, instead of once per move of each of its ends
+    def move_gnodes(self, gnodes, xs, ys):
+        with self.bulk_update():
+            for gnode, x, y in zip(gnodes, xs, ys):
+                gnode.setPos(x, y)
+        glinks = set()
+        for gnode in gnodes:
+            glinks.update(self.attached_glinks(gnode))
+        for glink in glinks:
+            glink.update_position()
+            
     ## Selection of objects
     
     def select(self, *objects):
@@ -16,17 +16,9 @@ from collections import OrderedDict
 from os.path import join
 from .base_view import BaseView
 from math import asin, cos, sin, sqrt
-try:
-    import shapefile
-    import shapely.geometry
-    from pyproj import Proj
-except ImportError as e:
-    import warnings
-    warnings.warn(str(e))
-    warnings.warn('SHP librairies missing: pyNMS will not start')
-    warnings.warn('please install "pyshp", "shapely", and "pyproj" with pip')
+import warnings
 from PyQt5 import QtCore, QtGui, QtWidgets
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtGui import (
                          QBrush,
                          QPen,
@@ -52,12 +44,23 @@ class GeographicalView(BaseView):
     def __init__(self, controller):
         super().__init__(controller)
         
-        # initialize the map 
+        # initialize the map: it is only drawn when the view is first shown
         self.world_map = Map(self)
+        
+    # the map is drawn once the view is displayed, so that the window 
+    # doesn't wait for the shapefile to be read
+    def showEvent(self, event):
+        super().showEvent(event)
+        QTimer.singleShot(0, self.world_map.draw_map)
                             
+    # the coordinates of all nodes are converted with a single projection 
+    # call, on numpy arrays, instead of one call per node
     def update_geographical_coordinates(self, *gnodes):
-        for gnode in gnodes:
-            lon, lat = self.world_map.to_geographical_coordinates(gnode.x, gnode.y)
+        import numpy as np
+        xs = np.fromiter((gnode.x for gnode in gnodes), float, len(gnodes))
+        ys = np.fromiter((gnode.y for gnode in gnodes), float, len(gnodes))
+        longitudes, latitudes = self.world_map.to_geographical_coordinates(xs, ys)
+        for gnode, lon, lat in zip(gnodes, longitudes.tolist(), latitudes.tolist()):
             gnode.node.longitude, gnode.node.latitude = lon, lat
             
     def update_logical_coordinates(self, *gnodes):
@@ -65,19 +68,28 @@ class GeographicalView(BaseView):
             gnode.node.logical_x, gnode.node.logical_y = gnode.x, gnode.y 
             
     def move_to_geographical_coordinates(self, *gnodes):
-        if not gnodes:
-            gnodes = self.all_gnodes()
-        for gnode in gnodes:
-            gnode.x, gnode.y = self.world_map.to_canvas_coordinates(
-                                    gnode.node.longitude, 
-                                    gnode.node.latitude
-                                    )
+        import numpy as np
+        gnodes = list(gnodes or self.all_gnodes())
+        longitudes = np.fromiter(
+                                 (gnode.node.longitude for gnode in gnodes), 
+                                 float, 
+                                 len(gnodes)
+                                 )
+        latitudes = np.fromiter(
+                                (gnode.node.latitude for gnode in gnodes), 
+                                float, 
+                                len(gnodes)
+                                )
+        xs, ys = self.world_map.to_canvas_coordinates(longitudes, latitudes)
+        self.move_gnodes(gnodes, xs.tolist(), ys.tolist())
         
     def move_to_logical_coordinates(self, *gnodes):
-        if not gnodes:
-            gnodes = self.all_gnodes()
-        for gnode in gnodes:
-            gnode.x, gnode.y = gnode.node.logical_x, gnode.node.logical_y
+        gnodes = list(gnodes or self.all_gnodes())
+        self.move_gnodes(
+                         gnodes,
+                         [gnode.node.logical_x for gnode in gnodes],
+                         [gnode.node.logical_y for gnode in gnodes]
+                         )
         
     def haversine_distance(self, s, d):
         coord = (s.longitude, s.latitude, d.longitude, d.latitude)
@@ -94,20 +106,43 @@ class GeographicalView(BaseView):
         
         return c*r
                 
+# build a QPolygonF from an (n, 2) array of coordinates: the array is copied
+# into the memory of the polygon, instead of appending the points one by one
+def polygon_from_array(points):
+    import numpy as np
+    polygon = QtGui.QPolygonF()
+    polygon.fill(QtCore.QPointF(), len(points))
+    buffer = polygon.data()
+    buffer.setsize(points.size * points.itemsize)
+    np.frombuffer(buffer, dtype=np.float64).reshape(-1, 2)[:] = points
+    return polygon
+        
+# pyproj, pyshp and numpy are imported the first time they are needed
+# (a coordinate conversion, drawing the map) instead of at startup.
 class Map():
 
+    # arguments of the pyproj projections: the projections themselves are
+    # created on first use, and shared by all maps
     projections = OrderedDict([
-    ('Spherical', Proj('+proj=ortho +lat_0=48 +lon_0=17')),
-    ('Mercator', Proj(init='epsg:3395')),
-    ('WGS84', Proj(init='epsg:3857')),
-    ('ETRS89 - LAEA Europe', Proj("+init=EPSG:3035"))
+    ('Spherical', {'projparams': '+proj=ortho +lat_0=48 +lon_0=17'}),
+    ('Mercator', {'init': 'epsg:3395'}),
+    ('WGS84', {'init': 'epsg:3857'}),
+    ('ETRS89 - LAEA Europe', {'projparams': '+init=EPSG:3035'})
     ])
     
+    projection_cache = {}
+    
+    # shapefile cache (see gis/shapefile_cache.py), created on first use,
+    # and the directory where it stores the projected shapefiles
+    cache = None
+    path_cache = None
+    
     def __init__(self, view):
         self.view = view
         self.proj = 'Spherical'
         self.ratio, self.offset = 1/1000, (0, 0)
         self.shapefile = join(self.view.controller.path_shapefiles, 'World countries (low resolution).shp')
+        Map.path_cache = self.view.controller.path_cache
         self.display = True
         
         # brush for water and lands
@@ -115,17 +150,44 @@ class Map():
         self.land_brush = QBrush(QColor(52, 165, 111))
         self.land_pen = QPen(QColor(52, 165, 111))
         
-        # draw the map 
-        self.polygons = self.view.scene.createItemGroup(self.draw_polygons())
-        self.draw_water()
+        # group of the graphical items of the map, created when the map 
+        # is drawn. Once deleted, the map is only drawn again by redraw_map.
+        self.polygons = None
+        self.drawn = False
         
+    @classmethod
+    def projection(cls, name):
+        if name not in cls.projection_cache:
+            from pyproj import Proj
+            cls.projection_cache[name] = Proj(**cls.projections[name])
+        return cls.projection_cache[name]
+        
+    # the conversion functions accept either numbers or numpy arrays of 
+    # coordinates (one projection call for all nodes)
     def to_geographical_coordinates(self, x, y):
         px, py = (x - self.offset[0])/self.ratio, (self.offset[1] - y)/self.ratio
-        return self.projections[self.proj](px, py, inverse=True)
+        return self.projection(self.proj)(px, py, inverse=True)
         
     def to_canvas_coordinates(self, longitude, latitude):
-        px, py = self.projections[self.proj](longitude, latitude)
+        px, py = self.projection(self.proj)(longitude, latitude)
         return px*self.ratio + self.offset[0], -py*self.ratio + self.offset[1]
+        
+    # draw the map if it isn't drawn yet
+    def draw_map(self):
+        if self.drawn:
+            return
+        self.drawn = True
+        try:
+            polygons = list(self.draw_polygons())
+        except ImportError as e:
+            warnings.warn(str(e))
+            warnings.warn('SHP librairies missing: the map cannot be drawn')
+            warnings.warn('please install "pyshp", "numpy", and "pyproj" with pip')
+            polygons = []
+        self.polygons = self.view.scene.createItemGroup(polygons)
+        self.draw_water()
+        if not self.display:
+            self.polygons.hide()
                 
     def draw_water(self):
         if self.proj in ('Spherical', 'ETRS89 - LAEA Europe'):
@@ -149,41 +211,48 @@ class Map():
             earth_water.setBrush(self.water_brush)
             self.polygons.addToGroup(earth_water)
             
+    # the projected geometry of the shapefile comes from the shapefile 
+    # cache, shared by all maps: the Qt polygons are built from its arrays
     def draw_polygons(self):
-        sf = shapefile.Reader(self.shapefile)       
-        polygons = sf.shapes() 
-        for polygon in polygons:
-            # convert shapefile geometries into shapely geometries
-            # to extract the polygons of a multipolygon
-            polygon = shapely.geometry.shape(polygon)
-            # if it is a polygon, we use a list to make it iterable
-            if polygon.geom_type == 'Polygon':
-                polygon = [polygon]
-            for land in polygon:
-                qt_polygon = QtGui.QPolygonF() 
-                land = str(land)[10:-2].replace(', ', ',').replace(' ', ',')
-                coords = land.replace('(', '').replace(')', '').split(',')
-                for lon, lat in zip(coords[0::2], coords[1::2]):
-                    px, py = self.to_canvas_coordinates(lon, lat)
-                    if px > 1e+10:
-                        continue
-                    qt_polygon.append(QtCore.QPointF(px, py))
-                polygon_item = QtWidgets.QGraphicsPolygonItem(qt_polygon)
-                polygon_item.setBrush(self.land_brush)
-                polygon_item.setPen(self.land_pen)
-                polygon_item.setZValue(1)
-                yield polygon_item
+        points, offsets = self.shapefile_cache().polygons(
+                                                    self.shapefile,
+                                                    self.proj,
+                                                    self.projection(self.proj),
+                                                    self.ratio
+                                                    )
+        if any(self.offset):
+            points = points + self.offset
+        for start, end in zip(offsets[:-1], offsets[1:]):
+            if start == end:
+                continue
+            polygon_item = QtWidgets.QGraphicsPolygonItem(
+                                            polygon_from_array(points[start:end])
+                                            )
+            polygon_item.setBrush(self.land_brush)
+            polygon_item.setPen(self.land_pen)
+            polygon_item.setZValue(1)
+            yield polygon_item
+            
+    @classmethod
+    def shapefile_cache(cls):
+        if cls.cache is None:
+            from gis.shapefile_cache import ShapefileCache
+            cls.cache = ShapefileCache(cls.path_cache)
+        return cls.cache
                 
     def show_hide_map(self):
         self.display = not self.display
-        self.polygons.show() if self.display else self.polygons.hide()
+        if self.polygons is not None:
+            self.polygons.show() if self.display else self.polygons.hide()
         
     def delete_map(self):
-        self.view.scene.removeItem(self.polygons)
+        if self.polygons is not None:
+            self.view.scene.removeItem(self.polygons)
+            self.polygons = None
             
     def redraw_map(self):
         self.delete_map()
-        self.polygons = self.view.scene.createItemGroup(self.draw_polygons())
-        self.draw_water()
+        self.drawn = False
+        self.draw_map()
         # replace the nodes at their geographical location
         self.view.move_to_geographical_coordinates()
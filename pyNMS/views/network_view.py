@@ -15,8 +15,8 @@
 from .base_view import BaseView
 from graphical_objects.graphical_link import GraphicalLink
 from right_click_menus.network_general_menu import NetworkGeneralMenu
-from math import sqrt
 from miscellaneous.decorators import overrider
+from miscellaneous.graph_drawing import LayoutWorker
 from objects.objects import *
 from PyQt5.QtCore import *
 from PyQt5.QtGui import *
@@ -27,14 +27,51 @@ class NetworkView(BaseView):
 
     def __init__(self, controller):
         super().__init__(controller)
+        # worker thread of the force-directed layout, if one is running
+        self.layout_worker = None
+        QApplication.instance().aboutToQuit.connect(self.stop_layout)
         
     ## Drawing functions
         
+    # only the objects created, deleted or modified since the last refresh
+    # are redrawn (see the 'dirty' sets of the network), in one batch
     def refresh_display(self):
-        # we draw everything except interface
-        for type in set(self.network.pn) - {'interface'}:
-            self.draw_objects(*self.network.pn[type].values())
+        dirty = self.network.dirty
+        with self.bulk_update():
+            self.erase_objects(*dirty['removed'])
+            # we draw everything except interface
+            self.draw_objects(*(
+                                obj for obj in dirty['added'] 
+                                if obj.type != 'interface'
+                                ))
+            self.refresh_labels(*dirty['modified'])
+            if dirty['added'] or dirty['removed']:
+                self.aggregate_links()
+        for objects in dirty.values():
+            objects.clear()
             
+    # remove the graphical objects of objects deleted from the network 
+    # (the objects deleted from the view are already removed from the scene)
+    def erase_objects(self, *objects):
+        for obj in objects:
+            gobject = obj.gobject.get(self)
+            if gobject and gobject.scene() is self.scene:
+                # the layout must not move deleted nodes
+                if self.is_node(gobject):
+                    self.stop_layout()
+                gobject.self_destruction()
+
+    ## Failure simulation
+
+    def simulate_failure(self, *objects):
+        self.network.simulate_failure(*objects)
+
+    def remove_failure(self, *objects):
+        self.network.remove_failure(*objects)
+
+    def remove_failures(self):
+        self.network.remove_failures()
+
     @overrider(BaseView)
     def mousePressEvent(self, event):
         item = self.itemAt(event.pos())
@@ -71,6 +108,8 @@ class NetworkView(BaseView):
     ## Object deletion
     
     def remove_objects(self, *items):
+        # the layout must not move deleted nodes
+        self.stop_layout()
         for item in items:
             obj = item.object
             item.self_destruction()
@@ -90,104 +129,110 @@ class NetworkView(BaseView):
                 
     ## Change display
     
+    # the per-subtype display and label changes apply to all objects of the
+    # subtype, retrieved from the per-subtype index of the network
+    
     def per_subtype_display(self, subtype):
         self.display[subtype] = not self.display[subtype]
         type = subtype_to_type[subtype]
-        for item in self.filter(type, subtype):
-            item.show() if self.display[subtype] else item.hide()
-            if subtype in node_subtype:
-                for glink in self.attached_glinks(item):
-                    glink.show() if self.display[subtype] else glink.hide()
+        with self.bulk_update():
+            for item in self.filter(type, subtype):
+                item.show() if self.display[subtype] else item.hide()
+                if subtype in node_subtype:
+                    for glink in self.attached_glinks(item):
+                        glink.show() if self.display[subtype] else glink.hide()
+            self.aggregate_links()
+            
+    def label_text(self, obj):
+        property = self.subtypes[obj.subtype]
+        return str(getattr(obj, property.name)) if property else ''
             
     def refresh_label(self, subtype, property):
-        type = subtype_to_type[subtype]
-        for item in self.filter(type, subtype):
-            value = getattr(item.object, property.name) if property else ''
-            item.label.setText(value)
         self.subtypes[subtype] = property
+        type = subtype_to_type[subtype]
+        with self.bulk_update():
+            for item in self.filter(type, subtype):
+                item.label.setText(self.label_text(item.object))
+            
+    # update the label of modified nodes (links have no label)
+    def refresh_labels(self, *objects):
+        for obj in objects:
+            if obj.class_type == 'node' and self in obj.gnode:
+                obj.gnode[self].label.setText(self.label_text(obj))
         
     ## Force-directed layout algorithms
     
-    def distance(self, p, q): 
-        return sqrt(p*p + q*q)
-    
-    ## 1) Eades algorithm (spring layout)
-    
-    # We use the following constants:
-    # - k is the spring constant (stiffness of the spring)
-    # - L0 is the equilibrium length
-    # - cf is the Coulomb factor (repulsive force factor)
-    # - sf is the speed factor
-    
-    def coulomb_force(self, dx, dy, distance, cf):
-        c = distance and cf/distance**3
-        return (-c*dx, -c*dy)
+    # the layout is computed by a worker thread, on numpy arrays: the nodes
+    # are moved in one batch every time the worker sends new positions.
+    # The algorithm ('Spring-based layout' or 'Fruchterman-Reingold layout')
+    # is applied to the selected nodes (node_selection), and the physical
+    # links between them.
+    def start_layout(self, drawing):
+        from miscellaneous.force_layout import ForceDirectedLayout
+        self.stop_layout()
+        self.layout_gnodes = list(self.node_selection)
+        # positions of the nodes as last set by the layout
+        self.layout_positions = [(gnode.x, gnode.y) for gnode in self.layout_gnodes]
+        index = {gnode.node: i for i, gnode in enumerate(self.layout_gnodes)}
+        edges = [
+                 (index[plink.source], index[plink.destination])
+                 for plink in self.network.plinks.values()
+                 if plink.source in index and plink.destination in index
+                 ]
+        layout = ForceDirectedLayout(self.layout_positions, edges)
+        if drawing == 'Spring-based layout':
+            self.layout_worker = LayoutWorker(
+                                              self,
+                                              layout, 
+                                              'spring_layout',
+                                              self.spring_parameters()
+                                              )
+        else:
+            self.layout_worker = LayoutWorker(
+                                              self,
+                                              layout, 
+                                              'fruchterman_reingold_layout'
+                                              )
+        self.layout_worker.moved.connect(self.apply_layout)
+        self.layout_worker.start()
         
-    def hooke_force(self, dx, dy, distance, L0, k):
-        const = distance and k*(distance - L0)/distance
-        return (const*dx, const*dy)
-            
-    def spring_layout(self, cf, k, sf, L0):
-        for nodeA in self.node_selection:
-            Fx = Fy = 0
-            for nodeB in self.node_selection:
-                if nodeA != nodeB:
-                    dx, dy = nodeB.x - nodeA.x, nodeB.y - nodeA.y
-                    distance = self.distance(dx, dy)
-                    F_hooke = (0,)*2
-                    if self.network.is_connected(nodeA.node, nodeB.node, 'plink'):
-                        F_hooke = self.hooke_force(dx, dy, distance, L0, k)
-                    F_coulomb = self.coulomb_force(dx, dy, distance, cf)
-                    Fx += F_hooke[0] + F_coulomb[0]
-                    Fy += F_hooke[1] + F_coulomb[1]
-            nodeA.vx = max(-100, min(100, 0.5 * nodeA.vx + 0.2 * Fx))
-            nodeA.vy = max(-100, min(100, 0.5 * nodeA.vy + 0.2 * Fy))
-    
-        for node in self.node_selection:
-            node.x, node.y = node.x + node.vx*sf, node.y + node.vy*sf
-            
-    ## 2) Fruchterman-Reingold algorithm
-    
-    def fa(self, d, k):
-        return (d**2)/k
-    
-    def fr(self, d, k):
-        return -(k**2)/d
+    def spring_parameters(self):
+        return tuple(self.controller.spring_layout_parameters_window.get_values())
         
-    def fruchterman_reingold_layout(self, limit=False, opd=0):
-        t = 1
-        if not opd:
-            try:
-                opd = sqrt(500*500/len(self.node_selection))
-            except ZeroDivisionError:
-                return
-        for nodeA in self.node_selection:
-            nodeA.vx, nodeA.vy = 0, 0
-            for nodeB in self.node_selection:
-                if nodeA != nodeB:
-                    dx, dy = nodeA.x - nodeB.x, nodeA.y - nodeB.y
-                    distance = self.distance(dx, dy)
-                    if distance:
-                        nodeA.vx += (dx*opd**2)/distance**2
-                        nodeA.vy += (dy*opd**2)/distance**2
-                    
-        for link in self.network.plinks.values():
-            source, destination = link.source.gnode[self], link.destination.gnode[self]
-            dx, dy = source.x - destination.x, source.y - destination.y
-            distance = self.distance(dx, dy)
-            if distance:
-                link.source.gnode[self].vx -= distance*dx/opd
-                link.source.gnode[self].vy -= distance*dy/opd
-                link.destination.gnode[self].vx += distance*dx/opd
-                link.destination.gnode[self].vy += distance*dy/opd
-            
-        for node in self.node_selection:
-            distance = self.distance(node.vx, node.vy)
-            node.x += node.vx/sqrt(distance)
-            node.y += node.vy/sqrt(distance)
-            
-        t *= 0.95
+    # the nodes moved by the user since the last batch (and the selected 
+    # nodes while the user drags one of them) keep their position, which
+    # is sent back to the worker
+    def apply_layout(self, positions):
+        # positions sent by a worker that has since been stopped are ignored
+        if self.sender() is not self.layout_worker:
+            return
+        positions = list(map(tuple, positions.tolist()))
+        dragging = self.is_node(self.scene.mouseGrabberItem())
+        moved = []
+        for index, gnode in enumerate(self.layout_gnodes):
+            position = (gnode.x, gnode.y)
+            if (dragging and gnode.isSelected() 
+                    or position != self.layout_positions[index]):
+                moved.append(index)
+                positions[index] = position
+        if moved:
+            self.layout_worker.moves.append((
+                                             moved, 
+                                             [positions[i] for i in moved]
+                                             ))
+        self.layout_positions = positions
+        xs, ys = zip(*positions) if positions else ((), ())
+        self.move_gnodes(self.layout_gnodes, xs, ys)
+        # the spring parameters can be changed while the layout runs
+        if self.layout_worker.parameters:
+            self.layout_worker.parameters = self.spring_parameters()
+        self.layout_worker.pending = False
         
+    def stop_layout(self):
+        if self.layout_worker:
+            self.layout_worker.stop()
+            self.layout_worker = None
+            
     def igraph_test(self):
         pass
         #TODO later: networkx + igraph drawing algorithms
@@ -198,17 +243,6 @@ class NetworkView(BaseView):
         # for row in layout:
         #     print(row)
         
-    def timerEvent(self, event):
-        if self.drawing_algorithm =='Spring-based layout':
-            parameters = self.controller.spring_layout_parameters_window.get_values()
-            self.spring_layout(*parameters)
-        else:
-            self.fruchterman_reingold_layout()
-
-    def stop_timer(self):
-        self.killTimer(self.timer)
-        self.timer = None
-        
     ## Drawing functions
         
     def random_layout(self):